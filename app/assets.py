@@ -0,0 +1,126 @@
+from __future__ import annotations
+from dataclasses import dataclass, replace
+import io
+import logging
+import os
+from pathlib import Path
+import threading
+from typing import Optional
+
+import fitz  # PyMuPDF
+from PIL import Image, features
+
+logger = logging.getLogger("market_lense.assets")
+
+FORMATS = ("webp", "jpeg", "png")
+EXTENSIONS = {"webp": ".webp", "jpeg": ".jpg", "png": ".png"}
+_HAS_WEBP = features.check("webp")
+
+
+@dataclass(frozen=True)
+class Encoding:
+    """How images written to OUTPUT_DIR are encoded; `max_px` caps the longer side (None = as rendered)."""
+    fmt: str = "webp"
+    quality: int = 80
+    max_px: Optional[int] = None
+
+    def __post_init__(self):
+        if self.fmt not in FORMATS:
+            raise ValueError(f"Unknown asset format {self.fmt!r} (expected one of {', '.join(FORMATS)})")
+
+    def limit(self, max_px: Optional[int]) -> "Encoding":
+        return replace(self, max_px=max_px)
+
+    @property
+    def codec(self) -> str:
+        """The format actually written (WebP falls back to JPEG if Pillow lacks WebP support)."""
+        return self.fmt if self.fmt != "webp" or _HAS_WEBP else "jpeg"
+
+    @property
+    def ext(self) -> str:
+        return EXTENSIONS[self.codec]
+
+
+ASSET = Encoding(max_px=1600)   # figures, crops, previews
+THUMB = Encoding(max_px=480)    # candidate thumbnails
+
+
+def write_atomic(path: Path, data: bytes) -> None:
+    """Write via a temp file in the same directory and rename, so readers never see a partial file."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f".{path.name}.{os.getpid()}-{threading.get_ident()}.tmp")
+    try:
+        with open(tmp, "wb") as fh:
+            fh.write(data)
+        os.replace(tmp, path)
+    except BaseException:
+        tmp.unlink(missing_ok=True)
+        raise
+
+
+def fit_zoom(rect: fitz.Rect, zoom: float, max_px: Optional[int]) -> float:
+    """Render zoom for `rect`, lowered so the longer side stays within `max_px` (render small, don't shrink later)."""
+    if not max_px:
+        return zoom
+    return min(zoom, max_px / max(1.0, rect.width, rect.height))
+
+
+def _rgb(pix: fitz.Pixmap) -> fitz.Pixmap:
+    if pix.colorspace and pix.colorspace != fitz.csRGB:
+        pix = fitz.Pixmap(fitz.csRGB, pix)
+    if pix.alpha:
+        pix = fitz.Pixmap(pix, 0)   # drop alpha
+    return pix
+
+
+def encode(pix: fitz.Pixmap, enc: Encoding) -> bytes:
+    """Encoded bytes of `pix`, downsampled from its samples buffer when it exceeds `enc.max_px`."""
+    pix = _rgb(pix)
+    big = enc.max_px and max(pix.width, pix.height) > enc.max_px
+    if enc.codec == "png" and not big:
+        return pix.tobytes("png")
+    mode = "L" if pix.n == 1 else "RGB"
+    # A view on the pixmap's memory; the first copy made is the (smaller) resized image.
+    img = Image.frombuffer(mode, (pix.width, pix.height), pix.samples_mv, "raw", mode, pix.stride, 1)
+    return encode_image(img, enc)
+
+
+def encode_image(img: Image.Image, enc: Encoding) -> bytes:
+    """Encoded bytes of a Pillow image, downsampled when it exceeds `enc.max_px`."""
+    if img.mode not in ("RGB", "L"):
+        img = img.convert("RGB")
+    if enc.max_px and max(img.size) > enc.max_px:
+        scale = enc.max_px / max(img.size)
+        size = (max(1, round(img.width * scale)), max(1, round(img.height * scale)))
+        img = img.resize(size, Image.LANCZOS, reducing_gap=2.0)
+    buf = io.BytesIO()
+    if enc.codec == "webp":
+        img.save(buf, format="WEBP", quality=enc.quality, method=2)   # ~same size as the default 4 at half the CPU
+    elif enc.codec == "jpeg":
+        img.save(buf, format="JPEG", quality=enc.quality, optimize=True)
+    else:
+        img.save(buf, format="PNG", compress_level=6)
+    return buf.getvalue()
+
+
+def save_pixmap(pix: fitz.Pixmap, stem: Path, enc: Encoding) -> Path:
+    """Encode `pix` to `<stem><ext>` atomically; returns the path written."""
+    path = stem.with_name(stem.name + enc.ext)
+    write_atomic(path, encode(pix, enc))
+    return path
+
+
+def owned_by(path: str, file_id: str) -> bool:
+    """Whether an asset path belongs to one report: `<kind>/<file_id>/<name>` or `<dir>/<file_id>_<name>`."""
+    p = Path(path)
+    return p.parent.name == file_id or p.name.startswith(f"{file_id}_")
+
+
+def save_image(img: Image.Image, stem: Path, enc: Encoding) -> Path:
+    """save_pixmap for a Pillow image."""
+    path = stem.with_name(stem.name + enc.ext)
+    write_atomic(path, encode_image(img, enc))
+    return path
+
+
+__all__ = ["Encoding", "ASSET", "THUMB", "FORMATS", "encode", "encode_image", "fit_zoom", "owned_by", "save_image", "save_pixmap", "write_atomic"]
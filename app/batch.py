@@ -0,0 +1,105 @@
+from __future__ import annotations
+import json
+import logging
+from pathlib import Path
+import threading
+from typing import Any, Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+logger = logging.getLogger("market_lense.batch")
+
+ENDPOINT = "/v1/chat/completions"
+# OpenAI Batch API input limits: 50,000 requests and 200 MB per file.
+MAX_LINES = 50_000
+MAX_BYTES = 190 * 1024 * 1024
+
+
+def custom_id(kind: str, file_id: str, md5: str) -> str:
+    """Stable request ID: the same report revision always maps to the same ID."""
+    return f"{kind}:{file_id}:{md5}"
+
+
+def parse_custom_id(cid: str) -> Tuple[str, str, str]:
+    kind, file_id, md5 = cid.split(":", 2)
+    return kind, file_id, md5
+
+
+class BatchWriter:
+    """
+    Appends Batch API request lines to `<stem>.jsonl`, rolling over to `<stem>-2.jsonl`, ... before
+    a file hits the API's line/size limits. Safe to share between pipeline threads.
+    """
+
+    def __init__(self, path: str):
+        self.base = Path(path)
+        self.base.parent.mkdir(parents=True, exist_ok=True)
+        self.paths: List[Path] = []
+        self.count = 0
+        self._lines = self._bytes = 0
+        self._fh = None
+        self._lock = threading.Lock()
+
+    def _roll(self) -> None:
+        if self._fh is not None:
+            self._fh.close()
+        n = len(self.paths) + 1
+        p = self.base if n == 1 else self.base.with_name(f"{self.base.stem}-{n}{self.base.suffix}")
+        self._fh = open(p, "w", encoding="utf-8")
+        self.paths.append(p)
+        self._lines = self._bytes = 0
+
+    def add(self, cid: str, body: Dict[str, Any]) -> None:
+        line = json.dumps({"custom_id": cid, "method": "POST", "url": ENDPOINT, "body": body},
+                          ensure_ascii=False) + "\n"
+        size = len(line.encode("utf-8"))
+        with self._lock:
+            if self._fh is None or self._lines >= MAX_LINES or self._bytes + size > MAX_BYTES:
+                self._roll()
+            self._fh.write(line)
+            self._lines += 1
+            self._bytes += size
+            self.count += 1
+
+    def close(self) -> None:
+        with self._lock:
+            if self._fh is not None:
+                self._fh.close()
+                self._fh = None
+
+
+class BatchResult(NamedTuple):
+    custom_id: str
+    content: Optional[str]       # assistant message content, if the request succeeded
+    error: Optional[str]
+    usage: Dict[str, Any]
+
+
+def read_results(path: str) -> Iterator[BatchResult]:
+    """Parse a Batch API output (or error) JSONL file, or a local stand-in in the same format."""
+    with open(path, encoding="utf-8") as fh:
+        for n, raw in enumerate(fh, start=1):
+            if not raw.strip():
+                continue
+            try:
+                row = json.loads(raw)
+                cid = row["custom_id"]
+            except (ValueError, KeyError):
+                logger.warning("%s:%d: not a batch result line, skipped", path, n)
+                continue
+            resp = row.get("response") or {}
+            body = resp.get("body") or {}
+            err = row.get("error")
+            if err:
+                yield BatchResult(cid, None, json.dumps(err) if not isinstance(err, str) else err, {})
+            elif resp.get("status_code", 200) != 200:
+                msg = (body.get("error") or {}).get("message") if isinstance(body, dict) else None
+                yield BatchResult(cid, None, f"HTTP {resp.get('status_code')}: {msg or body}", {})
+            else:
+                try:
+                    content = body["choices"][0]["message"]["content"]
+                except (KeyError, IndexError, TypeError):
+                    yield BatchResult(cid, None, "response has no message content", {})
+                    continue
+                yield BatchResult(cid, content, None, body.get("usage") or {})
+
+
+__all__ = ["BatchWriter", "BatchResult", "custom_id", "parse_custom_id", "read_results"]
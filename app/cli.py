@@ -1,25 +1,30 @@
 # app/cli.py
+from dataclasses import replace
+from pathlib import Path
+from typing import Dict, List
+import os
+import time
+
 import typer
 from rich.console import Console
 from rich.table import Table
 from rich import box
 
+# Only light modules at import time: the Drive, OpenAI, PDF and template stacks are imported
+# inside the commands that use them, so `--help` and `status` start quickly.
+from .batch import BatchWriter, parse_custom_id, read_results
+from .candidates import Candidate
 from .config import load_settings
-from .drive import drive_client, list_pdfs, ensure_download, effective_md5
-from .openai_client import analyze_pdf
-from .render import jinja_env, render_html
-from .state import State
-from .preview import first_page_png
-from .figure import extract_best_figure_png
-
-from .extract import collect_candidates
-from .rank import rank_candidates_text_only
-from .crop import crop_regions
-
+from .metrics import Recorder, peak_rss_bytes
 from .normalize import normalize_report_payload
+from .state import State
+from .pdf_cache import PdfCache
+from .response_cache import ResponseCache
 
 
 app = typer.Typer(add_completion=False, help="PDF → Structured HTML digests")
+cache_app = typer.Typer(add_completion=False, help="Inspect and prune local caches")
+app.add_typer(cache_app, name="cache")
 console = Console()
 import logging
 
@@ -29,122 +34,379 @@ logger = logging.getLogger("market_lense.cli")
 def ingest(
     folder: str = typer.Option(None, help="Override Drive folder ID"),
     limit: int = typer.Option(None, help="Max PDFs to process this run"),
+    workers: int = typer.Option(None, help="Default concurrency for every pipeline stage (env INGEST_WORKERS)"),
+    download_workers: int = typer.Option(None, help="Concurrent Drive downloads (default: --workers)"),
+    extract_workers: int = typer.Option(None, help="Concurrent PDF extraction jobs (default: --workers)"),
+    llm_workers: int = typer.Option(None, help="Concurrent analyze/rank model calls (default: --workers)"),
+    render_workers: int = typer.Option(None, help="Concurrent crop/render jobs (default: --workers)"),
+    extract_processes: int = typer.Option(None, help="Processes for page-parallel chart/table detection (env EXTRACT_PROCESSES)"),
+    response_cache: bool = typer.Option(True, help="Reuse cached analyze/rank completions (--no-response-cache always calls the model)"),
+    incremental: bool = typer.Option(True, help="List only files changed since the last complete run (Drive Changes API); --no-incremental re-lists the folder"),
+    resume: bool = typer.Option(True, help="Continue unfinished reports from their last checkpointed stage (--no-resume redoes every stage)"),
+    profile: bool = typer.Option(False, help="Write per-stage spans to METRICS_DIR/ingest-<run>.jsonl and print a timing summary"),
+    prom_file: str = typer.Option(None, help="Also write run metrics as a Prometheus textfile here (env PROM_TEXTFILE)"),
+    batch: bool = typer.Option(False, help="Run the local stages only and write analyze/rank requests as Batch API JSONL under BATCH_DIR; finish with import-batch"),
 ):
+    from .drive import drive_client, incremental_listing, list_pdfs
+    from .index import CorpusIndex
+    from .pipeline import IngestPipeline, StageWorkers
+    from .render import jinja_env
+
     console.print("[cyan]Loading settings...[/cyan]")
     logger.info("Loading settings")
     s = load_settings()
+    if extract_processes is not None:
+        s = replace(s, extract_processes=extract_processes)
 
     gdrive_folder_id = folder or s.gdrive_folder_id
     max_n = limit if limit is not None else s.batch_limit
 
     console.print("[cyan]Connecting to Google Drive...[/cyan]")
     logger.info("Connecting to Google Drive")
-    drive = drive_client(s.google_sa_path)
+    drive = drive_client(s.google_sa_path, endpoint=s.drive_api_endpoint)
 
     console.print(f"[cyan]Listing PDFs in folder {gdrive_folder_id}...[/cyan]")
     logger.info("Listing PDFs in folder %s", gdrive_folder_id)
     state = State(s.state_db)
-    env = jinja_env()
+    env = jinja_env(_jinja_cache(s))
+    pdf_cache = _pdf_cache(s, state)
+    pdf_cache.scan()
+
+    recorder = Recorder()
+    if profile:
+        recorder = Recorder(jsonl_path=str(Path(s.metrics_dir) / f"ingest-{recorder.run_id}.jsonl"))
+
+    writer = BatchWriter(str(Path(s.batch_dir) / f"requests-{recorder.run_id}.jsonl")) if batch else None
+
+    stage_workers = StageWorkers.uniform(
+        workers or s.ingest_workers, download=download_workers, extract=extract_workers, llm=llm_workers, render=render_workers,
+    )
+    pipeline = IngestPipeline(
+        s, state, env, drive_factory=lambda: drive_client(s.google_sa_path, endpoint=s.drive_api_endpoint),
+        workers=stage_workers, limit=max_n, console=console,
+        cache=_response_cache(s) if response_cache else None,
+        pdf_cache=pdf_cache, resume=resume, recorder=recorder, batch=writer,
+        index=CorpusIndex(state, s.output_dir, env),
+    )
+    new_token = None
+    if incremental:
+        files, new_token = incremental_listing(drive, gdrive_folder_id, state.get_page_token(gdrive_folder_id))
+    else:
+        files = list_pdfs(drive, gdrive_folder_id)
+    rows = pipeline.run(files)
+    # Only move the token forward once nothing listed is left over (limit cut-off or failures retry next run).
+    if new_token and pipeline.complete:
+        state.set_page_token(gdrive_folder_id, new_token)
+    state.close()
+    recorder.close()
+
+    _print_reports(rows)
+    if writer is not None:
+        writer.close()
+        if writer.count:
+            console.print(f"[cyan]Wrote {writer.count} batch request(s) to {', '.join(map(str, writer.paths))}.[/cyan]")
+            console.print("[cyan]Submit them to the Batch API (endpoint /v1/chat/completions), then run "
+                          "`import-batch <results.jsonl>` to finish the reports.[/cyan]")
+
+    if profile:
+        _print_profile(recorder)
+        console.print(f"[cyan]Spans written to {recorder.jsonl_path}[/cyan]")
+    prom_file = prom_file or s.prom_textfile
+    if prom_file:
+        recorder.write_prometheus(prom_file, extra={
+            "reports_processed": ("Reports rendered by the last ingest run.", len(rows) - pipeline.batched),
+            "reports_failed": ("Reports that failed in the last ingest run.", pipeline.failed),
+        })
+
+@app.command("watch")
+def watch(
+    folder: str = typer.Option(None, help="Override Drive folder ID"),
+    interval: float = typer.Option(None, help="Seconds between Drive polls (env WATCH_INTERVAL_S)"),
+    batch_size: int = typer.Option(None, "--batch", help="Jobs handed to the pipeline at a time (env WATCH_BATCH)"),
+    workers: int = typer.Option(None, help="Default concurrency for every pipeline stage (env INGEST_WORKERS)"),
+    response_cache: bool = typer.Option(True, help="Reuse cached analyze/rank completions"),
+):
+    """Stay resident: poll Drive, queue new or changed PDFs in the state DB and process them as they arrive."""
+    from .drive import drive_client, drive_credentials
+    from .index import CorpusIndex
+    from .llm import LLMClient
+    from .pipeline import StageWorkers
+    from .render import jinja_env
+    from .watch import Watcher
 
-    processed = 0
+    s = load_settings()
+    state = State(s.state_db)
+    # Built once and shared by every cycle.
+    creds = None if s.drive_api_endpoint else drive_credentials(s.google_sa_path)
+    env = jinja_env(_jinja_cache(s))
+    llm = LLMClient.from_settings(s)
+    cache = _response_cache(s) if response_cache else None
+    pdf_cache = _pdf_cache(s, state)
+    pdf_cache.scan()
+    index = CorpusIndex(state, s.output_dir, env)
+    watcher = Watcher(
+        s, state, drive_client(s.google_sa_path, creds, s.drive_api_endpoint), folder or s.gdrive_folder_id, env,
+        drive_factory=lambda: drive_client(s.google_sa_path, creds, s.drive_api_endpoint),
+        workers=StageWorkers.uniform(workers or s.ingest_workers),
+        interval=interval or s.watch_interval_s, batch=batch_size or s.watch_batch, queue_max=s.watch_queue_max,
+        max_attempts=s.watch_max_attempts, retry_s=s.watch_retry_s, console=console, prom_file=s.prom_textfile,
+        llm=llm, cache=cache, pdf_cache=pdf_cache, index=index,
+    )
+    try:
+        watcher.run()
+    finally:
+        state.close()
+
+def _print_reports(rows) -> None:
     table = Table(title="Processed Reports", box=box.SIMPLE_HEAVY)
     table.add_column("File")
     table.add_column("ID")
     table.add_column("MD5")
     table.add_column("HTML")
+    for row in rows:
+        table.add_row(*row)
 
-    for idx, f in enumerate(list_pdfs(drive, gdrive_folder_id), start=1):
-        console.print(f"[cyan]Found file {idx}: {f['name']} ({f['id']})[/cyan]")
-        logger.info("Found file %s (%s) index=%d", f.get("name"), f.get("id"), idx)
-
-        if processed >= max_n:
-            break
-        try:
-            console.print("[cyan]  -> downloading PDF...[/cyan]")
-            logger.info("Downloading PDF %s", f.get("id"))
-            pdf_path = ensure_download(drive, f, s.cache_dir)
-
-            console.print("[cyan]  -> computing md5...[/cyan]")
-            logger.info("Computing MD5 for %s", pdf_path)
-            md5 = effective_md5(f, pdf_path)
+    console.print(table)
+    console.print(f"[green]Done: {len(rows)} file(s).[/green]")
 
-            if state.already_processed(f["id"], md5):
-                console.print("[yellow]  -> already processed, skipping[/yellow]")
-                logger.info("Skipping already processed file %s", f.get("id"))
+@app.command("import-batch")
+def import_batch(
+    results: List[Path] = typer.Argument(..., exists=True, dir_okay=False, help="Batch API output JSONL file(s)"),
+    workers: int = typer.Option(None, help="Concurrency for the crop/render pipeline (env INGEST_WORKERS)"),
+    response_cache: bool = typer.Option(True, help="Also store the imported completions in the response cache"),
+):
+    """
+    Record Batch API results as stage checkpoints, then crop, render and record the finished reports.
+    Runs offline: reports whose PDF is no longer in CACHE_DIR are left for `ingest` to finish.
+    """
+    from .drive import cache_path
+    from .index import CorpusIndex
+    from .openai_client import analyze_cache_key, analyze_request, parse_analysis
+    from .pipeline import IngestPipeline, StageWorkers
+    from .rank import parse_ranking, rank_cache_key, rank_request
+    from .render import jinja_env
+
+    s = load_settings(require_credentials=False)
+    state = State(s.state_db)
+    cache = _response_cache(s) if response_cache else None
+    names: Dict[tuple, str] = {}
+    imported = failed = 0
+    for path in results:
+        for r in read_results(str(path)):
+            try:
+                kind, file_id, md5 = parse_custom_id(r.custom_id)
+                stage = {"analyze": "analysis", "rank": "ranks"}[kind]
+            except (ValueError, KeyError):
+                console.print(f"[yellow]Skipping unknown custom_id {r.custom_id!r}[/yellow]")
                 continue
+            stages = state.stages(file_id, md5)
+            status, info = stages.get(stage, (None, None))
+            if status == "pending" and isinstance(info, dict):
+                names[(file_id, md5)] = info.get("name") or file_id
+            else:
+                names.setdefault((file_id, md5), file_id)
+            if status == "done":
+                continue  # already imported
+            try:
+                if r.error:
+                    raise ValueError(r.error)
+                if stage == "analysis":
+                    output = normalize_report_payload(parse_analysis(r.content))
+                    body = analyze_request(stages.get("text", (None, ""))[1] or "", s.openai_model, s.temperature)
+                    key = analyze_cache_key(body)
+                else:
+                    output = parse_ranking(r.content)
+                    cands = [Candidate(**{**c, "bbox": tuple(c["bbox"])}) for c in stages.get("candidates", (None, []))[1] or []]
+                    key = rank_cache_key(rank_request(cands, s.openai_model))
+            except Exception as e:
+                failed += 1
+                state.stage_failed(file_id, md5, stage, f"batch: {e}")
+                console.print(f"[red]{r.custom_id}: {e}[/red]")
+                continue
+            state.stage_done(file_id, md5, stage, output)
+            if cache is not None:
+                cache.put(key, r.content, kind=kind, model=s.openai_model)
+            imported += 1
+    state.flush()
+    console.print(f"[cyan]Imported {imported} result(s), {failed} failed.[/cyan]")
+
+    # Finish every revision whose analysis is in; a missing ranking just means no crops.
+    files, uncached = [], []
+    for (file_id, md5), name in sorted(names.items()):
+        if state.stages(file_id, md5).get("analysis", (None,))[0] == "done":
+            f = {"id": file_id, "name": name, "md5Checksum": md5}
+            (files if cache_path(s.cache_dir, f).exists() else uncached).append(f)
+    if uncached:
+        console.print(f"[yellow]{len(uncached)} report(s) have results but their PDF is not in {s.cache_dir} "
+                      f"({', '.join(f['name'] for f in uncached)}); run `ingest` to fetch and finish them "
+                      "from the imported checkpoints.[/yellow]")
+
+    def no_drive():
+        raise RuntimeError(f"import-batch does not download; the PDF is not in {s.cache_dir} (run `ingest`)")
+
+    pdf_cache = _pdf_cache(s, state)
+    env = jinja_env(_jinja_cache(s))
+    pipeline = IngestPipeline(
+        s, state, env, drive_factory=no_drive,
+        workers=StageWorkers.uniform(workers or s.ingest_workers), limit=len(files) or 1, console=console,
+        pdf_cache=pdf_cache, offline=True, index=CorpusIndex(state, s.output_dir, env),
+    )
+    rows = pipeline.run(files)
+    state.close()
+    _print_reports(rows)
+
+@app.command("render-all")
+def render_all(
+    workers: int = typer.Option(None, help="Render processes (default: CPU count)"),
+    force: bool = typer.Option(False, help="Re-render even reports whose payload and templates are unchanged"),
+):
+    """Rebuild every stored report's HTML from the state DB (no downloads, no model calls)."""
+    from .index import CorpusIndex
+    from .render import jinja_env, render_many, template_hash
 
-            console.print("[cyan]  -> sending to OpenAI...[/cyan]")
-            logger.info("Sending %s to model %s (temp=%s)", pdf_path, s.openai_model, s.temperature)
-            raw = analyze_pdf(pdf_path, s.openai_model, s.temperature, s.openai_api_key)
-            data = normalize_report_payload(raw)
-
-            fig_png, fig_caption = extract_best_figure_png(pdf_path, s.output_dir, f["id"])
-            if fig_png:
-                data["_figure_image"] = fig_png
-                if fig_caption and not (data["figure"].get("evidence") or "").strip():
-                    data["figure"]["evidence"] = fig_caption
-
-            console.print("[cyan]  -> finding tables/charts...[/cyan]")
-            logger.info("Finding tables/charts in %s", pdf_path)
-            cands = collect_candidates(pdf_path, s.output_dir)
-
-            if cands:
-                console.print(f"[cyan]  -> ranking {len(cands)} candidates...[/cyan]")
-                logger.info("Ranking %d candidate regions", len(cands))
-                try:
-                    ranked = rank_candidates_text_only(cands, model=s.openai_model, api_key=s.openai_api_key)
-                except Exception:
-                    logger.exception("Ranking failed for %s; continuing without ranks", f.get("id"))
-                    ranked = []
-
-            # Join back coords for top-N (N=3)
-            id2cand = {c.id: c for c in cands}
-            top_items = []
-            for row in sorted(ranked, key=lambda r: r.get("score",0), reverse=True)[:3]:
-                c = id2cand.get(row["id"])
-                if not c: continue
-                top_items.append({"id":c.id,"type":c.kind,"score":row.get("score",0),"page":c.page,"bbox":c.bbox})
-
-            console.print("[cyan]  -> cropping top candidates...[/cyan]")
-            logger.info("Cropping top candidates: %s", [i.get("id") for i in top_items])
-            sliced_paths = crop_regions(pdf_path, s.output_dir, top_items)
-
-            # Put into the data dict for the template
-            # First image (if chart) → primary "Figure" image
-            if sliced_paths:
-                data["_figure_gallery"] = sliced_paths  # full gallery
-                data["_figure_top"] = sliced_paths[0]   # first as main
-
-
-            console.print("[cyan]  -> generating preview (page 1)...[/cyan]")
-            logger.info("Generating preview for %s", pdf_path)
-            preview = first_page_png(pdf_path, s.output_dir, f["id"])
-
-            console.print("[cyan]  -> extracting best figure...[/cyan]")
-            logger.info("Extracting best figure for %s", pdf_path)
-            fig_png, fig_caption = extract_best_figure_png(pdf_path, s.output_dir, f["id"])
-            if fig_png:
-                data["_figure_image"] = fig_png
-                if fig_caption and not (data["figure"].get("evidence") or "").strip():
-                    data["figure"]["evidence"] = fig_caption
-
-            console.print("[cyan]  -> rendering HTML...[/cyan]")
-            logger.info("Rendering HTML for %s", f.get("id"))
-            out_html = render_html(env, data, f["name"], f["id"], s.output_dir, preview_png=preview)
-
-            state.record(f["id"], md5, data.get("_openai_file_id"))
-            table.add_row(f["name"], f["id"], md5[:10] + "…", out_html)
-
-            console.print(f"[green]  -> done {f['name']}[/green]")
-            logger.info("Done processing %s", f.get("name"))
-            processed += 1
-
-        except Exception as e:
-            console.print(f"[red]Error processing {f.get('name')}: {e}[/red]")
-            logger.exception("Error processing %s", f.get("name"))
-
+    s = load_settings(require_credentials=False)
+    state = State(s.state_db)
+    th = template_hash()
+    todo, skipped = [], 0
+    keys = {}
+    for file_id, md5, name, payload, ph, render_key, html_path in state.reports():
+        key = f"{ph}:{th}"
+        if not force and render_key == key and html_path and Path(html_path).exists():
+            skipped += 1
+            continue
+        todo.append((file_id, payload))
+        keys[file_id] = key
+    console.print(f"[cyan]{len(todo)} report(s) to render, {skipped} unchanged.[/cyan]")
+
+    t0 = time.perf_counter()
+    done = failed = 0
+    for file_id, html_path, error in render_many(todo, s.output_dir, processes=workers or os.cpu_count() or 1,
+                                                 bytecode_cache=_jinja_cache(s)):
+        if error:
+            failed += 1
+            console.print(f"[red]{file_id}: {error}[/red]")
+            continue
+        state.report_rendered(file_id, keys[file_id], html_path)
+        done += 1
+    # The index pages use the same templates, so they are refreshed alongside.
+    indexed = CorpusIndex(state, s.output_dir, jinja_env(_jinja_cache(s))).rebuild()
+    state.close()
+    console.print(f"[green]Rendered {done} report(s) in {time.perf_counter() - t0:.1f}s[/green]"
+                  + (f", [red]{failed} failed[/red]" if failed else "") + f"; index lists {indexed}")
+    if failed:
+        raise typer.Exit(1)
+
+@app.command("build-index")
+def build_index():
+    """Rebuild out/index.html, its pages and the search manifest from the state DB."""
+    from .index import CorpusIndex
+    from .render import jinja_env
+
+    s = load_settings(require_credentials=False)
+    state = State(s.state_db)
+    t0 = time.perf_counter()
+    n = CorpusIndex(state, s.output_dir, jinja_env(_jinja_cache(s))).rebuild()
+    state.close()
+    console.print(f"[green]Indexed {n} report(s) in {time.perf_counter() - t0:.1f}s[/green]")
+
+@app.command("status")
+def status():
+    """Processed, pending and failed counts from the state DB (no Drive or model calls)."""
+    s = load_settings(require_credentials=False)
+    state = State(s.state_db)
+    c = state.status_counts()
+    jobs = state.job_counts()
+    state.close()
+    last = time.strftime("%Y-%m-%d %H:%M", time.localtime(c["last_processed_at"])) if c["last_processed_at"] else "never"
+    console.print(f"Processed: {c['processed']} file(s), last at {last}; {c['reports']} stored report(s)")
+    console.print(f"Pending: {c['awaiting_batch'] + c['interrupted']} "
+                  f"({c['awaiting_batch']} awaiting Batch API results, {c['interrupted']} interrupted)")
+    console.print(f"Failed: {c['failed']}", style="red" if c["failed"] else None)
+    if any(jobs.values()):
+        console.print(f"Watch queue: {jobs['queued']} queued, {jobs['running']} running, {jobs['failed']} failed")
+
+def _print_profile(recorder: Recorder) -> None:
+    table = Table(title="Stage timings", box=box.SIMPLE_HEAVY)
+    for col in ("Stage", "Calls", "Errors", "Wall s", "p50 s", "p95 s", "CPU s", "RSS +MB", "MB in", "MB out",
+                "Prompt tok", "Compl. tok"):
+        table.add_column(col, justify="left" if col == "Stage" else "right")
+    for r in recorder.summary():
+        table.add_row(
+            r["stage"], str(r["calls"]), str(r["errors"]), f"{r['wall_s']:.2f}", f"{r['p50_s']:.2f}",
+            f"{r['p95_s']:.2f}", f"{r['cpu_s']:.2f}", f"{r['rss_grew'] / 1e6:.1f}",
+            f"{r.get('bytes_in', 0) / 1e6:.1f}", f"{r.get('bytes_out', 0) / 1e6:.1f}",
+            str(r.get("prompt_tokens", 0)), str(r.get("completion_tokens", 0)),
+        )
     console.print(table)
-    console.print(f"[green]Done: {processed} file(s).[/green]")
+    peak = peak_rss_bytes()
+    if peak is not None:
+        console.print(f"Peak RSS: {peak / 1e6:.0f} MB")
+
+def _response_cache(s) -> ResponseCache:
+    return ResponseCache(
+        s.response_cache_dir,
+        max_bytes=s.response_cache_max_mb * 1024 * 1024,
+        max_age_s=s.response_cache_max_age_days * 86400,
+    )
+
+def _jinja_cache(s) -> str:
+    return os.path.join(s.cache_dir, "jinja")
+
+def _pdf_cache(s, state: State) -> PdfCache:
+    return PdfCache(state, s.cache_dir, max_bytes=s.pdf_cache_max_mb * 1024 * 1024)
+
+@cache_app.command("show")
+def cache_show(top: int = typer.Option(10, help="List this many least recently used PDFs")):
+    """Summarise the PDF cache manifest and the response cache."""
+    s = load_settings(require_credentials=False)
+    state = State(s.state_db)
+    try:
+        pc = _pdf_cache(s, state)
+        pc.scan()
+        st = pc.stats()
+        budget = f"{s.pdf_cache_max_mb} MB" if s.pdf_cache_max_mb else "unbounded"
+        console.print(f"PDF cache: {st['files']} file(s), {st['bytes'] / 1e6:.1f} MB (budget {budget}), {st['pinned']} pinned")
+        rs = _response_cache(s).stats()
+        console.print(f"Response cache: {rs['entries']} entr(y/ies), {rs['bytes'] / 1e6:.1f} MB")
+
+        table = Table(title="Least recently used PDFs", box=box.SIMPLE_HEAVY)
+        table.add_column("File ID")
+        table.add_column("MD5")
+        table.add_column("Size (MB)", justify="right")
+        table.add_column("Last access")
+        for path, file_id, md5, size, last_access in pc.state.cache_entries()[:top]:
+            table.add_row(file_id, (md5 or "")[:10], f"{size / 1e6:.1f}",
+                          time.strftime("%Y-%m-%d %H:%M", time.localtime(last_access)))
+        console.print(table)
+    finally:
+        state.close()
+
+@cache_app.command("prune")
+def cache_prune(
+    max_mb: int = typer.Option(None, help="Target size in MB (default: PDF_CACHE_MAX_MB)"),
+    all_: bool = typer.Option(False, "--all", help="Evict every PDF not in use by a running ingest"),
+    responses: bool = typer.Option(True, help="Also expire/trim the response cache"),
+):
+    """Evict least recently used PDFs (never ones a running ingest has pinned)."""
+    s = load_settings(require_credentials=False)
+    state = State(s.state_db)
+    try:
+        pc = _pdf_cache(s, state)
+        pc.scan()
+        target = 0 if all_ else (max_mb * 1024 * 1024 if max_mb is not None else None)
+        removed = pc.evict(target)
+    finally:
+        state.close()
+    console.print(f"[green]Evicted {len(removed)} PDF(s).[/green]")
+    if responses:
+        n = _response_cache(s).prune()
+        console.print(f"[green]Pruned {n} cached response(s).[/green]")
+
+@cache_app.command("clear-responses")
+def cache_clear_responses():
+    """Delete every cached analyze/rank completion."""
+    n = _response_cache(load_settings(require_credentials=False)).clear()
+    console.print(f"[green]Removed {n} cached response(s).[/green]")
 
 def main():
     app()
@@ -1,8 +1,9 @@
 from dataclasses import dataclass
 import os
 from pathlib import Path
-from dotenv import load_dotenv, find_dotenv
-load_dotenv(find_dotenv(filename=".env", usecwd=True))
+from typing import Optional
+
+ANALYZE_TOKEN_BUDGET = 4000   # default prompt budget for a report's extracted text
 
 
 @dataclass(frozen=True)
@@ -16,12 +17,56 @@ class Settings:
     cache_dir: str
     state_db: str
     temperature: float
+    ingest_workers: int
+    extract_processes: int
+    response_cache_dir: str
+    response_cache_max_mb: int
+    response_cache_max_age_days: float
+    openai_base_url: Optional[str]
+    drive_api_endpoint: Optional[str]
+    openai_max_in_flight: int
+    openai_rpm: int
+    openai_tpm: int
+    openai_max_retries: int
+    download_chunk_mb: int
+    pdf_cache_max_mb: int
+    metrics_dir: str
+    table_backend: str
+    analyze_token_budget: int
+    batch_dir: str
+    rank_token_budget: int
+    rank_linger_s: float
+    rank_debug_dir: Optional[str]
+    image_repeat_pages: int
+    image_memory_mb: int
+    asset_format: str
+    asset_quality: int
+    asset_max_px: int
+    thumb_max_px: int
+    watch_interval_s: float
+    watch_batch: int
+    watch_queue_max: int
+    watch_max_attempts: int
+    watch_retry_s: float
+    prom_textfile: Optional[str]
+
+_env_loaded = False
+
+def _load_env() -> None:
+    # Done on first use rather than at import, so importing the package stays cheap.
+    global _env_loaded
+    if not _env_loaded:
+        from dotenv import load_dotenv, find_dotenv
+        load_dotenv(find_dotenv(filename=".env", usecwd=True))
+        _env_loaded = True
 
-def load_settings() -> Settings:
+def load_settings(require_credentials: bool = True) -> Settings:
+    """Settings from the environment (and `.env`); commands that only read local state skip the credential check."""
+    _load_env()
     missing = []
     def need(k): 
         v = os.getenv(k)
-        if not v: missing.append(k)
+        if not v and require_credentials: missing.append(k)
         return v
     s = Settings(
         google_sa_path = need("GOOGLE_SERVICE_ACCOUNT_JSON"),
@@ -33,6 +78,38 @@ def load_settings() -> Settings:
         cache_dir = os.getenv("CACHE_DIR", "./cache"),
         state_db = os.getenv("STATE_DB", "./state/index.sqlite"),
         temperature = float(os.getenv("TEMPERATURE", "1")),
+        ingest_workers = int(os.getenv("INGEST_WORKERS", "1")),
+        extract_processes = int(os.getenv("EXTRACT_PROCESSES", "1")),
+        response_cache_dir = os.getenv("RESPONSE_CACHE_DIR", "./cache/responses"),
+        response_cache_max_mb = int(os.getenv("RESPONSE_CACHE_MAX_MB", "200")),
+        response_cache_max_age_days = float(os.getenv("RESPONSE_CACHE_MAX_AGE_DAYS", "30")),
+        openai_base_url = os.getenv("OPENAI_BASE_URL") or None,
+        drive_api_endpoint = os.getenv("DRIVE_API_ENDPOINT") or None,     # e.g. a local stand-in: http://127.0.0.1:8001/drive/v3/
+        openai_max_in_flight = int(os.getenv("OPENAI_MAX_IN_FLIGHT", "4")),
+        openai_rpm = int(os.getenv("OPENAI_RPM", "0")),
+        openai_tpm = int(os.getenv("OPENAI_TPM", "0")),
+        openai_max_retries = int(os.getenv("OPENAI_MAX_RETRIES", "6")),
+        download_chunk_mb = int(os.getenv("DOWNLOAD_CHUNK_MB", "8")),
+        pdf_cache_max_mb = int(os.getenv("PDF_CACHE_MAX_MB", "10240")),  # 0 = unbounded
+        metrics_dir = os.getenv("METRICS_DIR", "./metrics"),
+        table_backend = os.getenv("TABLE_BACKEND", "pymupdf"),   # pymupdf | pdfplumber
+        analyze_token_budget = int(os.getenv("ANALYZE_TOKEN_BUDGET", str(ANALYZE_TOKEN_BUDGET))),
+        batch_dir = os.getenv("BATCH_DIR", "./batch"),
+        rank_token_budget = int(os.getenv("RANK_TOKEN_BUDGET", "6000")),   # per ranking request, several reports packed
+        rank_linger_s = float(os.getenv("RANK_LINGER_S", "2")),            # wait for more reports before ranking
+        rank_debug_dir = os.getenv("RANK_DEBUG_DIR") or None,              # save raw ranking responses here
+        image_repeat_pages = int(os.getenv("IMAGE_REPEAT_PAGES", "3")),    # images on more pages are boilerplate
+        image_memory_mb = int(os.getenv("IMAGE_MEMORY_MB", "256")),        # per-document ceiling on decoded images
+        asset_format = os.getenv("ASSET_FORMAT", "webp"),                  # webp | jpeg | png
+        asset_quality = int(os.getenv("ASSET_QUALITY", "80")),
+        asset_max_px = int(os.getenv("ASSET_MAX_PX", "1600")),             # longer side of figures/crops/previews; 0 = no cap
+        thumb_max_px = int(os.getenv("THUMB_MAX_PX", "480")),
+        watch_interval_s = float(os.getenv("WATCH_INTERVAL_S", "30")),      # `watch`: seconds between Drive polls
+        watch_batch = int(os.getenv("WATCH_BATCH", "10")),                  # jobs handed to the pipeline at a time
+        watch_queue_max = int(os.getenv("WATCH_QUEUE_MAX", "500")),         # stop polling while this many are queued
+        watch_max_attempts = int(os.getenv("WATCH_MAX_ATTEMPTS", "3")),
+        watch_retry_s = float(os.getenv("WATCH_RETRY_S", "60")),            # first retry delay, doubled per attempt
+        prom_textfile = os.getenv("PROM_TEXTFILE") or None,
     )
     if missing:
         raise RuntimeError(f"Missing required env vars: {', '.join(missing)}")
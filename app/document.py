@@ -0,0 +1,148 @@
+from __future__ import annotations
+from contextlib import contextmanager
+import threading
+from typing import Dict, Iterator, Optional, Set, Union
+import fitz  # PyMuPDF
+from .images import IMAGE_MEMORY_MB, REPEAT_PAGES, ImageRegistry
+from .layout import PageLayout
+
+# MuPDF is not safe to drive from several threads at once (even on different documents),
+# so threaded callers such as the ingest pipeline hold this around PyMuPDF work.
+PDF_LOCK = threading.RLock()
+
+
+class DocumentSession:
+    """
+    One parsed PDF shared by every ingest stage.
+    Opens the file once with PyMuPDF and lazily caches page objects, page text and layouts;
+    pdfplumber is only opened if a stage actually asks for it. Use as a context manager
+    (or call close()) so handles are released deterministically.
+
+    Reading or drawing a page makes MuPDF decode its images into a process-wide store that
+    PyMuPDF can neither size nor cap. The session counts them per page (decoded size, CMYK worst
+    case) together with the image registry's renders, and empties the store before a page would
+    take it past `image_memory_mb`; `image_peak_bytes` is the high-water mark of that count.
+    """
+
+    def __init__(self, pdf_path: str, image_repeat_pages: int = REPEAT_PAGES, image_memory_mb: int = IMAGE_MEMORY_MB):
+        self.pdf_path = pdf_path
+        self.doc = fitz.open(pdf_path)
+        self.image_repeat_pages = image_repeat_pages
+        self.image_memory_mb = image_memory_mb
+        self.image_peak_bytes = 0
+        self._store_bytes = 0                # images of the pages in _loaded, as counted on load
+        self._loaded: Set[int] = set()
+        self._pages: Dict[int, fitz.Page] = {}
+        self._text: Dict[int, str] = {}
+        self._layouts: Dict[int, PageLayout] = {}
+        self._images: Optional[ImageRegistry] = None
+        self._plumber = None
+
+    def __enter__(self) -> "DocumentSession":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def __len__(self) -> int:
+        return self.doc.page_count
+
+    @property
+    def page_count(self) -> int:
+        return self.doc.page_count
+
+    def page(self, pno: int) -> fitz.Page:
+        if pno not in self._loaded:
+            self._make_room(pno)
+        p = self._pages.get(pno)
+        if p is None:
+            p = self._pages[pno] = self.doc.load_page(pno)
+        return p
+
+    def pages(self) -> Iterator[fitz.Page]:
+        for pno in range(self.page_count):
+            yield self.page(pno)
+
+    def _make_room(self, pno: int) -> None:
+        need = sum(w * h * 4 for _xref, _smask, w, h, *_ in self.doc.get_page_images(pno))
+        self._loaded.add(pno)
+        if not need:
+            return
+        if self._store_bytes and self.image_bytes + need > self.image_memory_mb * 1024 * 1024:
+            fitz.TOOLS.store_shrink(100)
+            self._store_bytes = 0
+            self._loaded = {pno}
+        self._store_bytes += need
+        self.note_image_bytes()
+
+    @property
+    def image_bytes(self) -> int:
+        """Decoded image data this session is holding, as far as it can tell."""
+        return self._store_bytes + (self._images.rendered_bytes if self._images is not None else 0)
+
+    def note_image_bytes(self) -> None:
+        self.image_peak_bytes = max(self.image_peak_bytes, self.image_bytes)
+
+    def page_text(self, pno: int) -> str:
+        t = self._text.get(pno)
+        if t is None:
+            t = self._text[pno] = self.page(pno).get_text("text") or ""
+        return t
+
+    def layout(self, pno: int) -> PageLayout:
+        lay = self._layouts.get(pno)
+        if lay is None:
+            lay = self._layouts[pno] = PageLayout(self.page(pno))
+        return lay
+
+    @property
+    def images(self) -> ImageRegistry:
+        """Image index shared by the extractors, so repeated images are listed, judged and rendered once."""
+        if self._images is None:
+            self._images = ImageRegistry(self, self.image_repeat_pages)
+        return self._images
+
+    @property
+    def plumber(self):
+        # pdfplumber keeps its own parse; open it only for stages that need it.
+        if self._plumber is None:
+            import pdfplumber
+            self._plumber = pdfplumber.open(self.pdf_path)
+        return self._plumber
+
+    def close(self) -> None:
+        self._pages.clear()
+        self._text.clear()
+        self._layouts.clear()
+        if self._images is not None:
+            self._images.close()
+            self._images = None
+        if self._plumber is not None:
+            self._plumber.close()
+            self._plumber = None
+        if self._store_bytes:
+            fitz.TOOLS.store_shrink(100)
+            self._store_bytes = 0
+        self._loaded.clear()
+        if not self.doc.is_closed:
+            self.doc.close()
+
+
+PdfSource = Union[str, DocumentSession]
+
+
+@contextmanager
+def borrow(src: PdfSource) -> Iterator[DocumentSession]:
+    """Yield a session for `src`; paths get a private session closed on exit, sessions are reused."""
+    if isinstance(src, DocumentSession):
+        yield src
+        return
+    with DocumentSession(src) as s:
+        yield s
+
+
+def source_path(src: PdfSource) -> str:
+    return src.pdf_path if isinstance(src, DocumentSession) else src
+
+
+__all__ = ["DocumentSession", "PDF_LOCK", "PdfSource", "borrow", "source_path"]
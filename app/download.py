@@ -0,0 +1,182 @@
+from __future__ import annotations
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+import hashlib
+import logging
+import os
+from pathlib import Path
+import re
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+from googleapiclient.errors import HttpError
+
+from . import metrics
+from .drive import cache_path, md5_for_file, stale_copies
+
+logger = logging.getLogger("market_lense.download")
+
+_RANGE_TOTAL_RX = re.compile(r"/(\d+)\s*$")
+_RETRY_STATUS = {429, 500, 502, 503, 504}
+
+
+class ChecksumMismatch(Exception):
+    pass
+
+
+class IncompleteDownload(Exception):
+    pass
+
+
+class DownloadManager:
+    """
+    Fetches Drive PDFs into the revision-keyed cache.
+    - Drive clients are lent to one thread at a time (googleapiclient objects are not thread-safe) and
+      kept after it exits, so a long-lived manager reuses warm connections across thread pools
+    - ranged requests of `chunk_size` bytes, appended to "<final>.part" and renamed atomically
+    - an existing .part is resumed from its current size
+    - MD5 is computed while streaming and checked against Drive's md5Checksum
+    """
+
+    def __init__(self, client_factory: Callable[[], Any], cache_dir: str,
+                 chunk_size: int = 8 * 1024 * 1024, workers: int = 4, num_retries: int = 5):
+        self.client_factory = client_factory
+        self.cache_dir = cache_dir
+        self.chunk_size = chunk_size
+        self.workers = max(1, workers)
+        self.num_retries = num_retries
+        self._idle: List[Any] = []
+        self._idle_lock = threading.Lock()
+        self._path_locks: Dict[str, threading.Lock] = {}
+        self._locks_guard = threading.Lock()
+
+    @classmethod
+    def from_settings(cls, s, client_factory: Callable[[], Any], workers: int) -> "DownloadManager":
+        return cls(client_factory, s.cache_dir, chunk_size=s.download_chunk_mb * 1024 * 1024, workers=workers)
+
+    @contextmanager
+    def _drive(self) -> Iterator[Any]:
+        with self._idle_lock:
+            d = self._idle.pop() if self._idle else None
+        if d is None:
+            d = self.client_factory()
+        try:
+            yield d
+        finally:
+            with self._idle_lock:
+                self._idle.append(d)
+
+    def _lock_for(self, path: Path) -> threading.Lock:
+        with self._locks_guard:
+            return self._path_locks.setdefault(str(path), threading.Lock())
+
+    def fetch(self, file_meta: Dict[str, Any]) -> Tuple[str, str]:
+        """Download (or reuse) the file; returns (local_path, md5)."""
+        path = cache_path(self.cache_dir, file_meta)
+        want = file_meta.get("md5Checksum")
+        with self._lock_for(path):
+            if path.exists():
+                return str(path), want or self._md5(path)
+
+            stale = stale_copies(self.cache_dir, file_meta["id"], path)
+            # Adopt a copy cached under the old id-only name if it is this exact revision.
+            legacy = next((p for p in stale if p.name == f"{file_meta['id']}.pdf"), None)
+            if want and legacy is not None and self._md5(legacy) == want:
+                legacy.replace(path)
+                md5 = want
+            else:
+                with self._drive() as drive:
+                    md5 = self._stream(drive, file_meta, path)
+            for p in stale:
+                p.unlink(missing_ok=True)
+            return str(path), md5
+
+    @staticmethod
+    def _md5(path: Path) -> str:
+        with metrics.child("md5"):
+            metrics.add_file("bytes_in", str(path))
+            return md5_for_file(str(path))
+
+    def _stream(self, drive, file_meta: Dict[str, Any], path: Path) -> str:
+        part = path.with_name(path.name + ".part")
+        h = hashlib.md5()
+        offset = 0
+        if part.exists():
+            # Resume: fold the bytes we already have into the running hash.
+            with open(part, "rb") as fh:
+                for chunk in iter(lambda: fh.read(1024 * 1024), b""):
+                    h.update(chunk)
+                    offset += len(chunk)
+            logger.info("Resuming download of %s at %d bytes", file_meta["id"], offset)
+
+        req = drive.files().get_media(fileId=file_meta["id"])
+        total: Optional[int] = None
+        with open(part, "ab") as fh:
+            while total is None or offset < total:
+                headers = dict(req.headers)
+                headers["range"] = f"bytes={offset}-{offset + self.chunk_size - 1}"
+                resp, content = self._request(req, headers)
+                if resp.status == 416:  # nothing left past `offset`: the .part is already complete
+                    break
+                if resp.status == 200 and offset:
+                    # Server ignored the range and sent the whole file: start over.
+                    fh.seek(0); fh.truncate()
+                    h, offset = hashlib.md5(), 0
+                fh.write(content)
+                h.update(content)
+                metrics.add(bytes_in=len(content))
+                offset += len(content)
+                if resp.status == 200:
+                    total = offset
+                else:
+                    m = _RANGE_TOTAL_RX.search(resp.get("content-range", ""))
+                    total = int(m.group(1)) if m else offset
+                if not content:
+                    break
+        if total is not None and offset < total:
+            # Without a Drive md5 nothing else would catch it; the .part is kept for the next attempt to resume.
+            raise IncompleteDownload(f"{file_meta['id']}: got {offset} of {total} bytes")
+
+        md5 = h.hexdigest()
+        want = file_meta.get("md5Checksum")
+        if want and md5 != want:
+            part.unlink(missing_ok=True)
+            raise ChecksumMismatch(f"{file_meta['id']}: downloaded md5 {md5} != Drive md5Checksum {want}")
+        os.replace(part, path)
+        logger.info("Downloaded %s (%d bytes)", file_meta["id"], offset)
+        return md5
+
+    def _request(self, req, headers: Dict[str, str]):
+        for attempt in range(self.num_retries + 1):
+            try:
+                resp, content = req.http.request(req.uri, method="GET", headers=headers)
+            except (ConnectionError, TimeoutError, OSError):
+                if attempt == self.num_retries:
+                    raise
+            else:
+                if resp.status in (200, 206, 416):
+                    return resp, content
+                if resp.status not in _RETRY_STATUS or attempt == self.num_retries:
+                    raise HttpError(resp, content, uri=req.uri)
+            metrics.add(retries=1)
+            time.sleep(min(32, 2 ** attempt))
+        raise RuntimeError("unreachable")
+
+    def fetch_many(self, metas: Iterable[Dict[str, Any]]) -> Iterator[Tuple[Dict[str, Any], Union[Tuple[str, str], Exception]]]:
+        """Fetch concurrently; yields (meta, (path, md5)) or (meta, exception) in input order."""
+        with ThreadPoolExecutor(self.workers, thread_name_prefix="download") as pool:
+            futs = [(m, pool.submit(self.fetch, m)) for m in metas]
+            for m, f in futs:
+                try:
+                    yield m, f.result()
+                except Exception as e:
+                    yield m, e
+
+
+def ensure_download(drive, file_meta: Dict[str, Any], cache_dir: str) -> str:
+    """Single-file convenience wrapper around DownloadManager.fetch for an existing Drive client."""
+    return DownloadManager(lambda: drive, cache_dir, workers=1).fetch(file_meta)[0]
+
+
+__all__ = ["DownloadManager", "ChecksumMismatch", "IncompleteDownload", "ensure_download"]
@@ -1,48 +1,130 @@
-from typing import Dict, Any, Iterable, Optional
+from typing import Dict, Any, Iterable, List, Optional, Tuple
 from pathlib import Path
 from googleapiclient.discovery import build
+from googleapiclient.errors import HttpError
 from google.oauth2.service_account import Credentials
-from googleapiclient.http import MediaIoBaseDownload
-import io
 import hashlib
+import logging
 
-def drive_client(sa_path: str):
-    scopes = ["https://www.googleapis.com/auth/drive.readonly"]
-    creds = Credentials.from_service_account_file(sa_path, scopes=scopes)
-    return build("drive", "v3", credentials=creds, cache_discovery=False)
+logger = logging.getLogger("market_lense.drive")
+
+PDF_MIME = "application/pdf"
+FILE_FIELDS = "id,name,modifiedTime,md5Checksum,version"
+MAX_PAGE_SIZE = 1000  # Drive's ceiling for files.list / changes.list
+NUM_RETRIES = 5       # listing calls: retried on 429/5xx with exponential backoff
+
+SCOPES = ["https://www.googleapis.com/auth/drive.readonly"]
+
+def drive_credentials(sa_path: str) -> Credentials:
+    return Credentials.from_service_account_file(sa_path, scopes=SCOPES)
+
+def drive_client(sa_path: str, creds: Optional[Credentials] = None, endpoint: Optional[str] = None):
+    """
+    A Drive v3 service (not thread-safe: one per thread). Pass shared `creds` so clients built
+    later reuse the access token instead of fetching their own. `endpoint` (DRIVE_API_ENDPOINT)
+    points the client at a local stand-in server, which is called without credentials.
+    """
+    if endpoint:
+        from google.auth.credentials import AnonymousCredentials
+        return build("drive", "v3", credentials=AnonymousCredentials(), cache_discovery=False,
+                     client_options={"api_endpoint": endpoint})
+    return build("drive", "v3", credentials=creds or drive_credentials(sa_path), cache_discovery=False)
 
 def list_pdfs(drive, folder_id: str) -> Iterable[Dict[str, Any]]:
-    q = f"'{folder_id}' in parents and mimeType='application/pdf' and trashed=false"
+    q = f"'{folder_id}' in parents and mimeType='{PDF_MIME}' and trashed=false"
     page_token: Optional[str] = None
     while True:
         resp = drive.files().list(
             q=q,
-            fields="files(id,name,modifiedTime,md5Checksum,version),nextPageToken",
+            fields=f"files({FILE_FIELDS}),nextPageToken",
             pageToken=page_token,
+            pageSize=MAX_PAGE_SIZE,
             supportsAllDrives=True,
             includeItemsFromAllDrives=True
-        ).execute()
+        ).execute(num_retries=NUM_RETRIES)
         for f in resp.get("files", []):
             yield f
         page_token = resp.get("nextPageToken")
         if not page_token:
             break
 
-def ensure_download(drive, file_meta: Dict[str, Any], cache_dir: str) -> str:
-    path = Path(cache_dir) / f"{file_meta['id']}.pdf"
-    if not path.exists():
-        req = drive.files().get_media(fileId=file_meta["id"])
-        with open(path, "wb") as fh:
-            downloader = MediaIoBaseDownload(fh, req)
-            done = False
-            while not done:
-                status, done = downloader.next_chunk()
-    return str(path)
+class PageTokenExpired(Exception):
+    """The stored Changes API token is no longer accepted; a full listing is needed."""
+
+def start_page_token(drive) -> str:
+    return drive.changes().getStartPageToken(supportsAllDrives=True).execute(num_retries=NUM_RETRIES)["startPageToken"]
+
+def list_changed_pdfs(drive, folder_id: str, page_token: str) -> Tuple[List[Dict[str, Any]], str]:
+    """
+    PDFs in `folder_id` added or modified since `page_token` (Changes API), plus the token for next time.
+    Raises PageTokenExpired when Drive rejects the token.
+    """
+    found: Dict[str, Dict[str, Any]] = {}
+    token = page_token
+    while True:
+        try:
+            resp = drive.changes().list(
+                pageToken=token,
+                pageSize=MAX_PAGE_SIZE,
+                spaces="drive",
+                includeRemoved=False,
+                supportsAllDrives=True,
+                includeItemsFromAllDrives=True,
+                fields=f"nextPageToken,newStartPageToken,changes(fileId,removed,file({FILE_FIELDS},mimeType,parents,trashed))",
+            ).execute(num_retries=NUM_RETRIES)
+        except HttpError as e:
+            if getattr(e.resp, "status", None) in (400, 404, 410):
+                raise PageTokenExpired(str(e)) from e
+            raise
+        for ch in resp.get("changes", []):
+            f = ch.get("file") or {}
+            # Keep the latest change per file, in change order; a later trash/removal/move drops it.
+            found.pop(ch.get("fileId") or f.get("id"), None)
+            if ch.get("removed") or f.get("trashed") or f.get("mimeType") != PDF_MIME:
+                continue
+            if folder_id not in (f.get("parents") or []):
+                continue
+            found[f["id"]] = {k: f[k] for k in FILE_FIELDS.split(",") if k in f}
+        if resp.get("nextPageToken"):
+            token = resp["nextPageToken"]
+            continue
+        return list(found.values()), resp["newStartPageToken"]
+
+def incremental_listing(drive, folder_id: str, page_token: Optional[str]) -> Tuple[Iterable[Dict[str, Any]], str]:
+    """
+    Files to consider this run and the page token to store once they are all handled.
+    Uses the Changes API when a token is stored; otherwise (first run, expired token) a full listing.
+    """
+    if page_token:
+        try:
+            files, new_token = list_changed_pdfs(drive, folder_id, page_token)
+            logger.info("Incremental listing: %d changed PDF(s) in %s", len(files), folder_id)
+            return files, new_token
+        except PageTokenExpired:
+            logger.warning("Drive page token for %s expired; falling back to a full listing", folder_id)
+    # Take the token before listing so changes made during the listing show up next run.
+    new_token = start_page_token(drive)
+    return list_pdfs(drive, folder_id), new_token
+
+def cache_path(cache_dir: str, file_meta: Dict[str, Any]) -> Path:
+    """
+    Cache file for this revision: ./cache/<id>.<md5>.pdf (or <id>.v<version>.pdf when Drive gives no md5).
+    Keying on the revision means an edited file is fetched again instead of reusing stale bytes.
+    """
+    tag = file_meta.get("md5Checksum") or (f"v{file_meta['version']}" if file_meta.get("version") else "")
+    name = f"{file_meta['id']}.{tag}.pdf" if tag else f"{file_meta['id']}.pdf"
+    return Path(cache_dir) / name
+
+def stale_copies(cache_dir: str, file_id: str, keep: Path) -> List[Path]:
+    # Drive IDs never contain ".", so "<id>.*.pdf" only matches revisions of this file.
+    olds = (list(Path(cache_dir).glob(f"{file_id}.*.pdf")) + list(Path(cache_dir).glob(f"{file_id}.*.pdf.part"))
+            + [Path(cache_dir) / f"{file_id}.pdf"])
+    return [p for p in olds if p != keep and p.exists()]
 
 def md5_for_file(path: str) -> str:
     h = hashlib.md5()
     with open(path, "rb") as f:
-        for chunk in iter(lambda: f.read(8192), b""):
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
             h.update(chunk)
     return h.hexdigest()
 
@@ -1,130 +1,221 @@
 from __future__ import annotations
+import logging
 from pathlib import Path
-from typing import List
-import fitz, pdfplumber
-from PIL import Image
-import io
+from typing import Dict, Iterable, List, Set, Tuple
+import fitz
+from .assets import THUMB, Encoding, save_pixmap
 from .candidates import Candidate
+from .document import PDF_LOCK, DocumentSession, PdfSource, borrow
+from .images import IMAGE_MEMORY_MB, REPEAT_PAGES, ImageRegistry
+from .parallel import iter_shards, map_shards, page_shards
+
+logger = logging.getLogger("market_lense.extract")
 
 CAPTION_HINTS = ("figure","fig.","exhibit","chart","graph","source")
 
-def _save_thumb(pix: fitz.Pixmap, out_dir: str, name: str, max_w: int = 480) -> str:
-    # Ensure RGB (no alpha / no CMYK)
-    if pix.alpha:                       # has alpha channel
-        pix = fitz.Pixmap(fitz.csRGB, pix)
-    elif pix.colorspace and pix.colorspace != fitz.csRGB:
-        pix = fitz.Pixmap(fitz.csRGB, pix)
-
-    # Get PNG bytes directly from PyMuPDF (robust vs. colorspaces)
-    png_bytes = pix.tobytes("png")
-    img = Image.open(io.BytesIO(png_bytes)).convert("RGB")
-
-    if img.width > max_w:
-        new_h = int(img.height * max_w / img.width)
-        img = img.resize((max_w, new_h), Image.LANCZOS)
-
-    Path(out_dir).mkdir(parents=True, exist_ok=True)
-    p = Path(out_dir) / f"{name}.png"
-    img.save(p.as_posix(), format="PNG")
-    return p.as_posix()
-
-def _nearby_text(page: fitz.Page, rect: fitz.Rect, max_dist: float = 90) -> str:
-    best = ("", 1e9)
-    for x0,y0,x1,y1,text,*_ in page.get_text("blocks"):
-        if not text: continue
-        r = fitz.Rect(x0,y0,x1,y1)
-        dy = r.y0 - rect.y1
-        dist = (dy if dy >= 0 else abs(dy) + 24)
-        if dist <= max_dist and dist < best[1]:
-            best = (text.strip(), dist)
-    return best[0]
-
-def extract_charts(pdf_path: str, thumbs_dir: str) -> List[Candidate]:
-    out: List[Candidate] = []
-    with fitz.open(pdf_path) as doc:
-        for pno in range(len(doc)):
-            page = doc[pno]; rect = page.rect
-            top_cut = rect.y0 + rect.height * 0.12
-            bot_cut = rect.y1 - rect.height * 0.12
-            local = 0
-            for xref,*_ in page.get_images(full=True):
-                rects = page.get_image_rects(xref)
-                if not rects: continue
-                r = rects[0]
-                if r.y0 < top_cut or r.y1 > bot_cut: continue
-                area_frac = r.get_area()/rect.get_area()
-                aspect = r.width/max(1,r.height)
-                if area_frac < 0.05 or not (0.55 <= aspect <= 2.5): continue
-                cap = _nearby_text(page, r)
-                if not any(k in (cap or "").lower() for k in CAPTION_HINTS) and area_frac < 0.08:
-                    continue
-                pix = fitz.Pixmap(doc, xref)
-                if pix.alpha or (pix.colorspace and pix.colorspace != fitz.csRGB):
-                    pix = fitz.Pixmap(fitz.csRGB, pix)
-                cid = f"chart-{pno}-{local}"
-                thumb = _save_thumb(pix, thumbs_dir, cid)
-                out.append(Candidate(
-                    id=cid, kind="chart", page=pno,
-                    bbox=(r.x0,r.y0,r.x1,r.y1),
-                    preview_text=cap or "", caption=cap, thumb_path=thumb,
-                    meta={"area_frac": round(area_frac,3), "aspect": round(aspect,2)}
-                ))
-                local += 1
+def _chart_hits(session: DocumentSession, pages: Iterable[int], thumbs_dir: str,
+                images: ImageRegistry, thumb: Encoding = THUMB) -> List[Tuple[Candidate, int]]:
+    out: List[Tuple[Candidate, int]] = []
+    seen = set()   # copies of one picture become a single candidate
+    for pno in pages:
+        rect = session.page(pno).rect
+        top_cut = rect.y0 + rect.height * 0.12
+        bot_cut = rect.y1 - rect.height * 0.12
+        local = 0
+        layout = None
+        for xref in images.images(pno):
+            r = images.rect(pno, xref)
+            if r is None: continue
+            if r.y0 < top_cut or r.y1 > bot_cut: continue
+            area_frac = r.get_area()/rect.get_area()
+            aspect = r.width/max(1,r.height)
+            if area_frac < 0.05 or not (0.55 <= aspect <= 2.5): continue
+            if images.is_boilerplate(xref) or images.group_key(xref) in seen: continue
+            layout = layout or session.layout(pno)
+            cap = layout.nearest_text(r)
+            if not any(k in (cap or "").lower() for k in CAPTION_HINTS) and area_frac < 0.08:
+                continue
+            pix = images.render(pno, xref, thumb.max_px)
+            seen.add(images.group_key(xref))
+            cid = f"chart-{pno}-{local}"
+            thumb_path = save_pixmap(pix, Path(thumbs_dir) / cid, thumb).as_posix()
+            out.append((Candidate(
+                id=cid, kind="chart", page=pno,
+                bbox=(r.x0,r.y0,r.x1,r.y1),
+                preview_text=cap or "", caption=cap, thumb_path=thumb_path,
+                meta={"area_frac": round(area_frac,3), "aspect": round(aspect,2)}
+            ), xref))
+            local += 1
     return out
 
-def extract_tables(pdf_path: str, max_candidates: int = 10) -> List[Candidate]:
+def _keep_charts(images: ImageRegistry, hits: List[Tuple[Candidate, int]]) -> List[Candidate]:
+    # Re-encoded copies of one picture are only recognisable once several of them have been decoded,
+    # and shards can't see each other's copies, so the final verdict is taken over all hits.
+    # IDs are numbered per page only after that, so a copy a shard kept doesn't leave a gap.
+    # Hits come in page order and a kept thumb only ever moves down to a freed index.
+    keep, seen, local = [], set(), {}
+    for c, xref in hits:
+        key = images.group_key(xref)
+        if images.is_boilerplate(xref) or key in seen:
+            Path(c.thumb_path).unlink(missing_ok=True)
+            continue
+        seen.add(key)
+        n = local.get(c.page, 0); local[c.page] = n + 1
+        cid = f"chart-{c.page}-{n}"
+        if cid != c.id:
+            src = Path(c.thumb_path)
+            c.thumb_path = src.replace(src.with_name(cid + src.suffix)).as_posix()
+            c.id = cid
+        keep.append(c)
+    return keep
+
+def _charts_shard(pdf_path: str, start: int, stop: int, thumbs_dir: str, thumb: Encoding,
+                  boilerplate: Set[int], repeat_pages: int = REPEAT_PAGES,
+                  memory_mb: int = IMAGE_MEMORY_MB) -> Tuple[List[Tuple[Candidate, int]], Dict[int, int]]:
+    # Process-pool entry point: each worker opens its own copy of the file.
+    with DocumentSession(pdf_path, image_memory_mb=memory_mb) as session:
+        images = ImageRegistry(session, repeat_pages, known_boilerplate=boilerplate)
+        hits = _chart_hits(session, range(start, stop), thumbs_dir, images, thumb)
+        return hits, images.phashes()
+
+def extract_charts(pdf: PdfSource, thumbs_dir: str, processes: int = 1, shard_pages: int = 16,
+                   thumb: Encoding = THUMB) -> List[Candidate]:
+    """
+    Chart-like images with captions. With processes > 1, page shards run in a process pool
+    and results are merged in page order; IDs are per page, so they match the serial path.
+    """
+    with borrow(pdf) as session:
+        shards = page_shards(session.page_count, processes, shard_pages) if processes > 1 else []
+        if len(shards) > 1:
+            with PDF_LOCK:
+                boilerplate = session.images.boilerplate_xrefs()
+            parts = map_shards(_charts_shard, session.pdf_path, shards, processes, thumbs_dir, thumb,
+                               boilerplate, session.image_repeat_pages, session.image_memory_mb)
+            with PDF_LOCK:
+                for _, phashes in parts:
+                    session.images.add_phashes(phashes)
+                return _keep_charts(session.images, [h for hits, _ in parts for h in hits])
+        with PDF_LOCK:
+            hits = _chart_hits(session, range(session.page_count), thumbs_dir, session.images, thumb)
+            return _keep_charts(session.images, hits)
+
+def _cell(v) -> str:  # normalize any cell to string (avoid None in join)
+    if v is None:
+        return ""
+    try:
+        return str(v)
+    except Exception:
+        return ""
+
+TABLE_BACKENDS = ("pymupdf", "pdfplumber")
+_TABLE_SETTINGS = {"vertical_strategy": "lines", "horizontal_strategy": "lines"}
+_HAS_FITZ_TABLES = hasattr(fitz.Page, "find_tables")   # PyMuPDF >= 1.23
+if hasattr(fitz, "no_recommend_layout"):
+    fitz.no_recommend_layout()   # find_tables otherwise prints an install hint to stdout
+
+def _ruling_counts(page: fitz.Page) -> Tuple[int, int]:
+    """(horizontal, vertical) line/rect edges drawn on the page, from the cheap drawing list."""
+    get = getattr(page, "get_cdrawings", None) or page.get_drawings
+    h = v = 0
+    for path in get():
+        for item in path["items"]:
+            op = item[0]
+            if op == "l":
+                (x0, y0), (x1, y1) = item[1], item[2]
+                if abs(y1 - y0) < 1: h += 1
+                elif abs(x1 - x0) < 1: v += 1
+            elif op == "re":
+                r = fitz.Rect(item[1])
+                if r.height < 2: h += 1          # hairline rects are how many generators draw rules
+                elif r.width < 2: v += 1
+                else: h += 2; v += 2
+            elif op == "qu":
+                h += 2; v += 2
+    return h, v
+
+def _has_rulings(page: fitz.Page) -> bool:
+    # The "lines" strategy needs at least two horizontal and two vertical edges to form a cell.
+    h, v = _ruling_counts(page)
+    return h >= 2 and v >= 2
+
+def _preview(rows) -> str:
+    # Compact preview: first 3 rows, first 6 cols, cells coerced to str
+    lines = [" | ".join(_cell(c) for c in row[:6]) for row in (rows or [])[:3] if row]
+    return "\n".join(lines)[:400]
+
+def _table_candidate(pno: int, i: int, bbox, extract) -> Candidate:
+    # bbox values can be Decimals; cast to float
+    x0, y0, x1, y1 = map(float, bbox)
+    # extract() may return None or mixed types (None cells)
+    try:
+        rows = (extract() or [])[:3]
+    except Exception:
+        rows = []
+    return Candidate(
+        id=f"table-{pno}-{i}", kind="table", page=pno, bbox=(x0, y0, x1, y1),
+        preview_text=_preview(rows), caption=None, thumb_path=None,
+        meta={"rows_peek": len(rows)},
+    )
+
+def _plumber_tables(session: DocumentSession, pno: int, room: int) -> List[Candidate]:
+    tables = session.plumber.pages[pno].find_tables(table_settings=_TABLE_SETTINGS) or []
+    return [_table_candidate(pno, i, t.bbox, t.extract) for i, t in enumerate(tables[:room])]
+
+def _fitz_tables(session: DocumentSession, pno: int, room: int) -> List[Candidate]:
+    with PDF_LOCK:
+        tables = session.page(pno).find_tables(strategy="lines").tables
+        return [_table_candidate(pno, i, t.bbox, t.extract) for i, t in enumerate(tables[:room])]
+
+def _tables_for_pages(session: DocumentSession, pages: Iterable[int], max_candidates: int,
+                      backend: str = "pymupdf") -> List[Candidate]:
+    if backend not in TABLE_BACKENDS:
+        raise ValueError(f"Unknown table backend {backend!r} (expected one of {', '.join(TABLE_BACKENDS)})")
+    use_fitz = backend == "pymupdf" and _HAS_FITZ_TABLES
     out: List[Candidate] = []
-
-    def _s(v):  # normalize any cell to string (avoid None in join)
-        if v is None:
-            return ""
-        try:
-            return str(v)
-        except Exception:
-            return ""
-
-    with pdfplumber.open(pdf_path) as pdf:
-        for pno, p in enumerate(pdf.pages):
-            tables = p.find_tables(table_settings={
-                "vertical_strategy": "lines",
-                "horizontal_strategy": "lines"
-            })
-
-            for i, t in enumerate(tables or []):
-                # bbox values can be Decimals; cast to float
-                x0, y0, x1, y1 = map(float, t.bbox)
-
-                # t.extract() may return None or mixed types (None cells)
-                try:
-                    rows = (t.extract() or [])[:3]
-                except Exception:
-                    rows = []
-
-                # Build a compact preview (first 3 rows, first 6 cols), coercing cells to str
-                preview_lines = []
-                for row in rows:
-                    if not row:
-                        continue
-                    preview_lines.append(" | ".join(_s(c) for c in row[:6]))
-                preview = "\n".join(preview_lines)[:400]
-
-                cid = f"table-{pno}-{i}"
-                out.append(Candidate(
-                    id=cid,
-                    kind="table",
-                    page=pno,
-                    bbox=(x0, y0, x1, y1),
-                    preview_text=preview,
-                    caption=None,
-                    thumb_path=None,
-                    meta={"rows_peek": len(rows)}
-                ))
-
-            if len(out) >= max_candidates:
-                break
-
+    for pno in pages:
+        room = max_candidates - len(out)
+        if room <= 0:
+            break
+        with PDF_LOCK:
+            if not _has_rulings(session.page(pno)):
+                continue  # nothing for a lines/lines table finder to work with
+        if use_fitz:
+            try:
+                out.extend(_fitz_tables(session, pno, room))
+                continue
+            except Exception:
+                logger.warning("PyMuPDF table finder failed on page %d; falling back to pdfplumber", pno, exc_info=True)
+        out.extend(_plumber_tables(session, pno, room))
     return out
 
-def collect_candidates(pdf_path: str, work_dir: str):
-    thumbs = Path(work_dir)/"thumbs"
-    return extract_charts(pdf_path, thumbs.as_posix()) + extract_tables(pdf_path)
+def _tables_shard(pdf_path: str, start: int, stop: int, max_candidates: int, backend: str) -> List[Candidate]:
+    with DocumentSession(pdf_path) as session:
+        return _tables_for_pages(session, range(start, stop), max_candidates, backend)
+
+def extract_tables(pdf: PdfSource, max_candidates: int = 10, processes: int = 1, shard_pages: int = 16,
+                   backend: str = "pymupdf") -> List[Candidate]:
+    """
+    Ruled tables, at most `max_candidates` (in page order). Pages without enough line/rect drawings
+    to form a grid are skipped before any table finding. `backend` "pymupdf" uses page.find_tables,
+    falling back to pdfplumber where it is unavailable or fails.
+    """
+    with borrow(pdf) as session:
+        shards = page_shards(session.page_count, processes, shard_pages) if processes > 1 else []
+        if len(shards) > 1:
+            merged: List[Candidate] = []
+            parts = iter_shards(_tables_shard, session.pdf_path, shards, processes, max_candidates, backend)
+            for part in parts:
+                merged.extend(part)
+                if len(merged) >= max_candidates:
+                    parts.close()  # later shards can't contribute; cancel the ones not yet running
+                    break
+            return merged[:max_candidates]
+        return _tables_for_pages(session, range(session.page_count), max_candidates, backend)
+
+def collect_candidates(pdf: PdfSource, work_dir: str, file_id: str, processes: int = 1,
+                       table_backend: str = "pymupdf", thumb: Encoding = THUMB):
+    # Candidate IDs repeat across reports, so each report keeps its thumbnails in its own directory.
+    thumbs = Path(work_dir)/"thumbs"/file_id
+    with borrow(pdf) as session:
+        return (extract_charts(session, thumbs.as_posix(), processes=processes, thumb=thumb)
+                + extract_tables(session, processes=processes, backend=table_backend))
@@ -0,0 +1,219 @@
+from __future__ import annotations
+from collections import OrderedDict, defaultdict
+import hashlib
+import logging
+import math
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+import fitz  # PyMuPDF
+from PIL import Image
+
+from .assets import fit_zoom
+
+logger = logging.getLogger("market_lense.images")
+
+REPEAT_PAGES = 3                 # an image on more pages than this is branding/background art, not content
+PHASH_BITS = 4                   # dHash bits that may differ between re-encoded copies of one picture
+IMAGE_MEMORY_MB = 256            # per-document ceiling on decoded image data (renders kept + MuPDF's store)
+
+
+class ImageInfo:
+    __slots__ = ("xref", "width", "height", "bpc", "colorspace", "filter", "pages", "digest", "phash")
+
+    def __init__(self, xref: int, width: int, height: int, bpc: int, colorspace: str, filter_: str):
+        self.xref, self.width, self.height = xref, width, height
+        self.bpc, self.colorspace, self.filter = bpc, colorspace, filter_
+        self.pages: Set[int] = set()
+        self.digest: Optional[str] = None
+        self.phash: Optional[int] = None
+
+    @property
+    def pixels(self) -> int:
+        return self.width * self.height
+
+
+def dhash(pix: fitz.Pixmap) -> int:
+    """64-bit difference hash of an RGB or grey pixmap; survives re-encoding and rescaling."""
+    mode = "L" if pix.n == 1 else "RGB"
+    img = Image.frombuffer(mode, (pix.width, pix.height), pix.samples_mv, "raw", mode, pix.stride, 1)
+    px = img.convert("L").resize((9, 8), Image.BILINEAR).tobytes()
+    bits = 0
+    for row in range(8):
+        for col in range(8):
+            bits = bits << 1 | (px[row * 9 + col] > px[row * 9 + col + 1])
+    return bits
+
+
+class ImageRegistry:
+    """
+    Per-document index of the raster images drawn on each page, shared by the chart and figure extractors.
+    Copies of one image are grouped by xref, by a hash of the raw stream (the same bytes embedded
+    again) and, once rendered, by a perceptual hash (re-encoded copies). A group drawn on more than
+    `repeat_pages` pages is boilerplate.
+
+    Images are never decoded at native size into Python: `render` rasterizes the page area an image
+    covers at the resolution the output needs, and keeps renders in an LRU of a quarter of the
+    session's image memory ceiling. Callers hold PDF_LOCK.
+    """
+
+    def __init__(self, session, repeat_pages: int = REPEAT_PAGES, known_boilerplate: Optional[Iterable[int]] = None):
+        self.session = session
+        self.repeat_pages = repeat_pages
+        self.info: Dict[int, ImageInfo] = {}
+        self.renders = 0
+        self.rendered_bytes = 0
+        self._page_images: Dict[int, List[int]] = {}
+        self._items: Dict[Tuple[int, int], tuple] = {}                # (pno, xref) -> page.get_images item
+        self._rects: Dict[Tuple[int, int], Optional[fitz.Rect]] = {}
+        self._group_pages: Optional[Dict[int, Set[int]]] = None    # xref -> pages its content is drawn on
+        self._group_key: Dict[int, str] = {}
+        # Page shards get the verdicts of a whole-document scan instead of scanning again.
+        self._known = set(known_boilerplate) if known_boilerplate is not None else None
+        self._rendered: "OrderedDict[tuple, fitz.Pixmap]" = OrderedDict()
+
+    # ---------- listing ----------
+
+    def images(self, pno: int) -> List[int]:
+        """Distinct image xrefs drawn on page `pno`, in page.get_images order."""
+        xrefs = self._page_images.get(pno)
+        if xrefs is None:
+            xrefs = []
+            for item in self.session.doc.get_page_images(pno, full=True):
+                xref, _smask, w, h, bpc, cs, _alt, _name, filt, *_ = item
+                if xref in xrefs:
+                    continue
+                xrefs.append(xref)
+                self._items[(pno, xref)] = item
+                inf = self.info.get(xref)
+                if inf is None:
+                    inf = self.info[xref] = ImageInfo(xref, w, h, bpc, cs, filt)
+                inf.pages.add(pno)
+            self._page_images[pno] = xrefs
+        return xrefs
+
+    def rect(self, pno: int, xref: int) -> Optional[fitz.Rect]:
+        """Where the image is drawn on the page (one placement if several), or None."""
+        # get_image_rects decodes the image and every other image on the page to match them by
+        # hash; get_image_bbox finds the placement from the content stream alone.
+        key = (pno, xref)
+        if key not in self._rects:
+            item = self._items.get(key)
+            r = self.session.page(pno).get_image_bbox(item) if item else None
+            self._rects[key] = None if r is None or r.is_empty or r.is_infinite else r
+        return self._rects[key]
+
+    # ---------- grouping ----------
+
+    def _digest(self, inf: ImageInfo) -> str:
+        if inf.digest is None:
+            inf.digest = hashlib.blake2b(self.session.doc.xref_stream_raw(inf.xref) or b"", digest_size=16).hexdigest()
+        return inf.digest
+
+    def _scan(self) -> Dict[int, Set[int]]:
+        if self._group_pages is not None:
+            return self._group_pages
+        for pno in range(self.session.page_count):
+            self.images(pno)
+        # Only images that could be byte-identical (same size, format and stream length) get hashed.
+        doc = self.session.doc
+        buckets: Dict[tuple, List[ImageInfo]] = defaultdict(list)
+        for inf in self.info.values():
+            length = doc.xref_get_key(inf.xref, "Length")[1]
+            buckets[(inf.width, inf.height, inf.bpc, inf.colorspace, inf.filter, length)].append(inf)
+        groups: Dict[int, Set[int]] = {}
+        for infos in buckets.values():
+            by_content: Dict[str, List[ImageInfo]] = defaultdict(list)
+            for inf in infos:
+                by_content[self._digest(inf) if len(infos) > 1 else str(inf.xref)].append(inf)
+            for same in by_content.values():
+                pages = set().union(*(i.pages for i in same))
+                key = str(min(i.xref for i in same))
+                for i in same:
+                    groups[i.xref] = pages
+                    self._group_key[i.xref] = key
+        self._group_pages = groups
+        return groups
+
+    def pages_of(self, xref: int) -> Set[int]:
+        """Pages showing this image or a byte-identical copy."""
+        return self._scan().get(xref, set())
+
+    def _phash_pages(self, inf: ImageInfo) -> Set[int]:
+        pages = set(inf.pages)
+        for other in self.info.values():
+            if other.phash is not None and other is not inf and bin(other.phash ^ inf.phash).count("1") <= PHASH_BITS:
+                pages |= other.pages
+        return pages
+
+    def is_boilerplate(self, xref: int) -> bool:
+        if self._known is not None:
+            if xref in self._known:
+                return True
+        elif len(self.pages_of(xref)) > self.repeat_pages:
+            return True
+        inf = self.info.get(xref)
+        return inf is not None and inf.phash is not None and len(self._phash_pages(inf)) > self.repeat_pages
+
+    def boilerplate_xrefs(self) -> Set[int]:
+        """Xrefs repeated on too many pages, for handing to page shards in other processes."""
+        return {x for x in self._scan() if self.is_boilerplate(x)}
+
+    def group_key(self, xref: int) -> str:
+        """Same value for copies of one picture (within this registry's knowledge)."""
+        if self._known is None:
+            self._scan()
+        return self._group_key.get(xref, str(xref))
+
+    def phashes(self) -> Dict[int, int]:
+        return {x: inf.phash for x, inf in self.info.items() if inf.phash is not None}
+
+    def add_phashes(self, phashes: Dict[int, int]) -> None:
+        """Merge perceptual hashes computed by page shards in other processes."""
+        for xref, ph in phashes.items():
+            inf = self.info.get(xref)
+            if inf is not None and inf.phash is None:
+                inf.phash = ph
+
+    # ---------- rendering ----------
+
+    def _budget(self) -> int:
+        return self.session.image_memory_mb * 1024 * 1024 // 4
+
+    def render(self, pno: int, xref: int, max_px: Optional[int] = None) -> fitz.Pixmap:
+        """
+        RGB pixmap of image `xref` as drawn on page `pno`: a clipped page render at the image's native
+        resolution, lowered so the longer side fits `max_px` and the pixmap fits the LRU.
+        """
+        key = (pno, xref, max_px)
+        pix = self._rendered.get(key)
+        if pix is not None:
+            self._rendered.move_to_end(key)
+            return pix
+        page = self.session.page(pno)
+        rect = self.rect(pno, xref)
+        clip = rect & page.rect
+        if clip.is_empty:
+            clip = rect
+        inf = self.info[xref]
+        zoom = fit_zoom(clip, max(inf.width, inf.height) / max(1.0, rect.width, rect.height), max_px)
+        zoom = min(zoom, math.sqrt(self._budget() / 3 / max(1.0, clip.width * clip.height)))
+        pix = page.get_pixmap(matrix=fitz.Matrix(zoom, zoom), clip=clip, alpha=False)
+        self.renders += 1
+        if inf.phash is None:
+            inf.phash = dhash(pix)
+        self._rendered[key] = pix
+        self.rendered_bytes += len(pix.samples_mv)
+        while self.rendered_bytes > self._budget() and len(self._rendered) > 1:
+            _, old = self._rendered.popitem(last=False)
+            self.rendered_bytes -= len(old.samples_mv)
+        self.session.note_image_bytes()
+        return pix
+
+    def close(self) -> None:
+        self._rendered.clear()
+        self.rendered_bytes = 0
+        self._rects.clear()
+        self._items.clear()
+
+
+__all__ = ["ImageRegistry", "ImageInfo", "dhash", "IMAGE_MEMORY_MB", "REPEAT_PAGES"]
@@ -0,0 +1,149 @@
+from __future__ import annotations
+import json
+import logging
+from pathlib import Path
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+from PIL import Image
+
+from .assets import Encoding, save_image, write_atomic
+from .render import own_images
+from .state import State
+
+logger = logging.getLogger("market_lense.index")
+
+SHARD_SIZE = 500              # reports per manifest shard and per index page
+INDEX_DIR = "index"           # under OUTPUT_DIR
+THUMB = Encoding("webp", 70, 240)
+
+
+class CorpusIndex:
+    """
+    `out/index.html` plus paged `out/index/page-NNNN.html` and a sharded JSON search manifest
+    (`out/index/manifest.json` -> `shard-NNNN.json`), kept current from the state DB.
+
+    Reports are sharded by the order they were first indexed, so updating one report rewrites
+    only its own shard and page (plus the small root files when the newest shard changes);
+    nothing is rebuilt from the report HTML.
+    """
+
+    def __init__(self, state: State, out_dir: str, env, shard_size: int = SHARD_SIZE):
+        self.state, self.env, self.shard_size = state, env, shard_size
+        self.out = Path(out_dir)
+        self.dir = self.out / INDEX_DIR
+        self._lock = threading.Lock()
+
+    # ---------- entries ----------
+
+    def _thumb(self, file_id: str, src: Optional[str], refresh: bool) -> str:
+        if not src:
+            return ""
+        # thumbs/<file_id>/<source name>: a report whose figure moved gets a new card image even
+        # when thumbnails aren't refreshed, and no two reports ever share one.
+        folder = self.dir / "thumbs" / file_id
+        stem = folder / Path(src).stem
+        path = stem.with_name(stem.name + THUMB.ext)
+        if refresh or not path.exists():
+            try:
+                with Image.open(self.out / src) as img:
+                    img.draft("RGB", (THUMB.max_px * 2, THUMB.max_px * 2))   # JPEG: decode at reduced size
+                    save_image(img, stem, THUMB)
+            except (OSError, ValueError) as e:
+                logger.warning("No index thumbnail for %s: %s", file_id, e)
+                return ""
+            for old in [*folder.iterdir(), folder.with_name(file_id + THUMB.ext)]:
+                if old != path:
+                    old.unlink(missing_ok=True)
+        return path.relative_to(self.out).as_posix()
+
+    def entry(self, file_id: str, payload: Dict[str, Any], html_path: str, processed_at: int,
+              refresh_thumb: bool = True) -> Dict[str, Any]:
+        """Compact search-manifest entry: title, TL;DR, insights, thumbnail, link and processed_at."""
+        data = own_images(file_id, payload.get("data") or {})
+        fig = data.get("_figure_top") or data.get("_figure_image") or payload.get("preview_png")
+        return {
+            "id": file_id,
+            "t": payload.get("doc_name") or file_id,
+            "u": Path(html_path).name,
+            "s": (data.get("tldr") or "")[:400],
+            "i": [i[:200] for i in data.get("insights") or [] if i],
+            "f": self._thumb(file_id, fig, refresh_thumb),
+            "p": int(processed_at),
+        }
+
+    # ---------- writing ----------
+
+    def _shard_count(self, size: int) -> int:
+        return (size + self.shard_size - 1) // self.shard_size
+
+    def _pages(self, size: int) -> List[Dict[str, Any]]:
+        out = []
+        for k in reversed(range(self._shard_count(size))):
+            count = min(self.shard_size, size - k * self.shard_size)
+            out.append({"k": k, "page": f"page-{k:04d}.html", "shard": f"shard-{k:04d}.json", "count": count})
+        return out
+
+    def _render(self, path: Path, entries: List[Dict[str, Any]], pages: List[Dict[str, Any]], k: int,
+                base: str, total: int) -> None:
+        html = self.env.get_template("index.html.j2").render(
+            entries=entries, pages=pages, current=k, base=base, index_dir=INDEX_DIR, total=total,
+            updated=time.strftime("%Y-%m-%d %H:%M"),
+        )
+        write_atomic(path, html.encode("utf-8"))
+
+    def _write_shard(self, k: int, size: int) -> List[Dict[str, Any]]:
+        entries = self.state.index_range(k * self.shard_size, (k + 1) * self.shard_size)
+        write_atomic(self.dir / f"shard-{k:04d}.json",
+                     json.dumps(entries, ensure_ascii=False, separators=(",", ":")).encode("utf-8"))
+        self._render(self.dir / f"page-{k:04d}.html", entries, self._pages(size), k, "../", size)
+        return entries
+
+    def _write_root(self, size: int, newest: Optional[List[Dict[str, Any]]] = None) -> None:
+        pages = self._pages(size)
+        manifest = {"version": 1, "updated": int(time.time()), "count": size, "shard_size": self.shard_size,
+                    "shards": [{"file": p["shard"], "page": p["page"], "count": p["count"]} for p in pages]}
+        write_atomic(self.dir / "manifest.json", json.dumps(manifest, separators=(",", ":")).encode("utf-8"))
+        last = self._shard_count(size) - 1
+        if newest is None:
+            newest = self.state.index_range(last * self.shard_size, size) if last >= 0 else []
+        self._render(self.out / "index.html", newest, pages, last, "", size)
+
+    def update(self, file_id: str, payload: Dict[str, Any], html_path: str,
+               processed_at: Optional[int] = None) -> None:
+        """Add or refresh one report and rewrite the files that show it."""
+        entry = self.entry(file_id, payload, html_path, processed_at or time.time())
+        with self._lock:
+            seq, is_new = self.state.index_put(file_id, entry)
+            size = self.state.index_size()
+            k = seq // self.shard_size
+            entries = self._write_shard(k, size)
+            if k == self._shard_count(size) - 1:
+                self._write_root(size, entries)
+            elif is_new:
+                self._write_root(size)
+            if is_new and k > 0 and seq % self.shard_size == 0:
+                # A new page appeared: older pages need it in their navigation.
+                for old in range(k):
+                    self._write_shard(old, size)
+
+    def rebuild(self) -> int:
+        """Re-index every stored report and rewrite all pages (after template changes, or to backfill)."""
+        with self._lock:
+            for file_id, md5, name, payload, ph, render_key, html_path in self.state.reports():
+                if not html_path:
+                    continue
+                row = self.state.get(file_id)
+                entry = self.entry(file_id, json.loads(payload), html_path, row[2] if row else time.time(),
+                                   refresh_thumb=False)
+                self.state.index_put(file_id, entry)
+            size = self.state.index_size()
+            for k in range(self._shard_count(size)):
+                self._write_shard(k, size)
+            self._write_root(size)
+            self.state.flush()
+            return size
+
+
+__all__ = ["CorpusIndex", "SHARD_SIZE"]
@@ -0,0 +1,82 @@
+from __future__ import annotations
+from bisect import bisect_left, bisect_right
+from dataclasses import dataclass
+import re
+from typing import List
+import fitz  # PyMuPDF
+
+# Keywords & scoring (shared by the chart extractor and the best-figure picker)
+CAPTION_HINTS = {"figure", "fig.", "exhibit", "chart", "graph", "source", "panel", "table"}
+METRIC_HINTS  = {"%", "$", "€", "£", "growth", "share", "yoy", "cagr", "roi", "roas", "ctr", "conversion", "revenue", "impressions", "spend", "units"}
+FIGURE_LINE_RX = re.compile(r"\b(fig(?:ure)?|exhibit|chart)\b\s*\d+", re.I)
+
+# Blocks above the image are penalised by this many points (captions usually sit below).
+ABOVE_PENALTY = 24.0
+
+def score_text(text: str) -> int:
+    if not text: return 0
+    t = text.lower()
+    s = 0
+    s += sum(2 for k in CAPTION_HINTS if k in t)
+    s += sum(1 for k in METRIC_HINTS if k in t)
+    # bonus for numbers (likely axes/titles)
+    s += min(3, len(re.findall(r"\d", t)) // 4)
+    return s
+
+
+@dataclass(frozen=True)
+class Block:
+    order: int              # position in page.get_text("blocks") (used for stable tie-breaks)
+    rect: fitz.Rect
+    text: str               # stripped
+    lower: str
+    score: int
+    blank: bool
+
+
+class PageLayout:
+    """
+    Text blocks of one page, extracted once and indexed by top edge.
+    Caption lookups only visit blocks whose y0 can fall within `max_dist` of the
+    image's bottom edge instead of scanning every block per image.
+    """
+
+    def __init__(self, page: fitz.Page):
+        blocks: List[Block] = []
+        for i, (x0, y0, x1, y1, text, *_) in enumerate(page.get_text("blocks")):
+            if not text:
+                continue
+            stripped = text.strip()
+            blocks.append(Block(
+                order=i, rect=fitz.Rect(x0, y0, x1, y1), text=stripped, lower=stripped.lower(),
+                score=score_text(text), blank=text.isspace(),
+            ))
+        self.blocks = sorted(blocks, key=lambda b: (b.rect.y0, b.order))
+        self._y0s = [b.rect.y0 for b in self.blocks]
+        self.figure_targets = [b.rect for b in sorted(blocks, key=lambda b: b.order) if FIGURE_LINE_RX.search(b.text)]
+
+    def _window(self, rect: fitz.Rect, max_dist: float):
+        # dist = dy for blocks starting below rect.y1, |dy| + ABOVE_PENALTY otherwise
+        lo = bisect_left(self._y0s, rect.y1 - (max_dist - ABOVE_PENALTY))
+        hi = bisect_right(self._y0s, rect.y1 + max_dist)
+        for b in self.blocks[lo:hi]:
+            dy = b.rect.y0 - rect.y1
+            dist = dy if dy >= 0 else abs(dy) + ABOVE_PENALTY
+            if dist <= max_dist:
+                yield b, dist
+
+    def nearest_text(self, rect: fitz.Rect, max_dist: float = 90) -> str:
+        """Closest block below (or just above) `rect`."""
+        best = min(self._window(rect, max_dist), key=lambda bd: (bd[1], bd[0].order), default=None)
+        return best[0].text if best else ""
+
+    def best_caption(self, rect: fitz.Rect, max_dist: float = 90.0) -> str:
+        """Highest-scoring non-blank block within `max_dist`; nearer wins ties."""
+        best = min(
+            ((b, d) for b, d in self._window(rect, max_dist) if not b.blank),
+            key=lambda bd: (-bd[0].score, bd[1], bd[0].order), default=None,
+        )
+        return best[0].text if best else ""
+
+
+__all__ = ["PageLayout", "Block", "score_text", "CAPTION_HINTS", "METRIC_HINTS", "FIGURE_LINE_RX"]
@@ -0,0 +1,257 @@
+from __future__ import annotations
+import asyncio
+from email.utils import parsedate_to_datetime
+import logging
+import random
+import re
+import threading
+import time
+import weakref
+from typing import Any, Dict, Optional, Tuple
+
+import openai
+from openai import AsyncOpenAI, OpenAI
+
+from . import metrics
+
+logger = logging.getLogger("market_lense.llm")
+
+# Statuses worth another attempt; everything else (400/401/403/404/422...) is final.
+RETRYABLE_STATUS = {408, 409, 429}
+
+
+class RateLimiter:
+    """
+    Requests-per-minute and tokens-per-minute buckets shared by every caller of one client.
+    `reserve()` books capacity immediately and returns how long the caller must wait before
+    sending, so waiters queue up fairly instead of polling. A 429 pauses the whole bucket.
+    """
+
+    def __init__(self, rpm: int = 0, tpm: int = 0):
+        self.rpm, self.tpm = rpm, tpm
+        self._req = float(rpm)
+        self._tok = float(tpm)
+        self._stamp = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float) -> None:
+        dt = now - self._stamp
+        self._stamp = now
+        if self.rpm:
+            self._req = min(self.rpm, self._req + dt * self.rpm / 60.0)
+        if self.tpm:
+            self._tok = min(self.tpm, self._tok + dt * self.tpm / 60.0)
+
+    def reserve(self, tokens: int) -> float:
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            wait = max(0.0, self._paused_until - now)
+            if self.rpm:
+                self._req -= 1
+                if self._req < 0:
+                    wait = max(wait, -self._req * 60.0 / self.rpm)
+            if self.tpm:
+                # A single request larger than the whole bucket would otherwise wait forever.
+                self._tok -= min(tokens, self.tpm)
+                if self._tok < 0:
+                    wait = max(wait, -self._tok * 60.0 / self.tpm)
+            return wait
+
+    def settle(self, reserved: int, actual: int) -> None:
+        """Correct the token bucket once the response's real usage is known."""
+        if not self.tpm:
+            return
+        with self._lock:
+            self._tok = min(self.tpm, self._tok + min(reserved, self.tpm) - actual)
+
+    def pause(self, seconds: float) -> None:
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+
+_DURATION_RX = re.compile(r"(\d+(?:\.\d+)?)(ms|s|m|h)")
+_UNIT = {"ms": 0.001, "s": 1.0, "m": 60.0, "h": 3600.0}
+
+
+def _parse_duration(v: str) -> Optional[float]:
+    # OpenAI's x-ratelimit-reset-* headers look like "1s", "6m0s", "120ms".
+    parts = _DURATION_RX.findall(v or "")
+    return sum(float(n) * _UNIT[u] for n, u in parts) if parts else None
+
+
+def retry_hint(err: Exception) -> Optional[float]:
+    """Seconds the server asked us to wait (retry-after-ms, Retry-After, x-ratelimit-reset-*), if any."""
+    resp = getattr(err, "response", None)
+    headers = getattr(resp, "headers", None) or {}
+    try:
+        if headers.get("retry-after-ms"):
+            return float(headers["retry-after-ms"]) / 1000.0
+        ra = headers.get("retry-after")
+        if ra:
+            try:
+                return float(ra)
+            except ValueError:
+                return max(0.0, parsedate_to_datetime(ra).timestamp() - time.time())
+        resets = [_parse_duration(headers.get(h, "")) for h in ("x-ratelimit-reset-requests", "x-ratelimit-reset-tokens")]
+        resets = [r for r in resets if r is not None]
+        return max(resets) if resets else None
+    except (TypeError, ValueError):
+        return None
+
+
+def _classify(err: Exception) -> Tuple[bool, bool]:
+    """(retryable, rate_limited)"""
+    if isinstance(err, openai.RateLimitError):
+        return True, True
+    if isinstance(err, (openai.APIConnectionError, openai.APITimeoutError)):
+        return True, False
+    if isinstance(err, openai.APIStatusError):
+        code = err.status_code
+        return code in RETRYABLE_STATUS or code >= 500, code == 429
+    return False, False
+
+
+def _estimate_tokens(kwargs: Dict[str, Any]) -> int:
+    chars = sum(len(m.get("content") or "") for m in kwargs.get("messages", []) if isinstance(m.get("content"), str))
+    return chars // 4 + int(kwargs.get("max_completion_tokens") or kwargs.get("max_tokens") or 1000)
+
+
+class LLMClient:
+    """
+    Long-lived OpenAI client shared by every analyze/rank call in the process.
+    Keeps one sync SDK client, plus one async client per event loop (their connection pools are
+    bound to the loop), caps requests in flight, applies the RPM/TPM buckets (shared by sync and
+    async calls) and retries 429/5xx/connection errors with jittered
+    exponential backoff that defers to server hints. SDK-level retries are disabled so the
+    two retry loops don't multiply.
+    """
+
+    def __init__(self, api_key: str, max_in_flight: int = 4, rpm: int = 0, tpm: int = 0,
+                 max_retries: int = 6, base_url: Optional[str] = None, timeout: float = 600.0,
+                 backoff_base: float = 1.0, backoff_cap: float = 60.0):
+        self.api_key, self.base_url, self.timeout = api_key, base_url, timeout
+        self.max_in_flight = max(1, max_in_flight)
+        self.max_retries = max_retries
+        self.backoff_base, self.backoff_cap = backoff_base, backoff_cap
+        self.limiter = RateLimiter(rpm, tpm)
+        self._sem = threading.BoundedSemaphore(self.max_in_flight)
+        self._sync: Optional[OpenAI] = None
+        # Per event loop: an httpx pool or asyncio.Semaphore used from a second loop fails.
+        self._loops: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Tuple[AsyncOpenAI, asyncio.Semaphore]]" = \
+            weakref.WeakKeyDictionary()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_settings(cls, s) -> "LLMClient":
+        return cls(
+            s.openai_api_key, max_in_flight=s.openai_max_in_flight, rpm=s.openai_rpm, tpm=s.openai_tpm,
+            max_retries=s.openai_max_retries, base_url=s.openai_base_url,
+        )
+
+    @property
+    def sync(self) -> OpenAI:
+        with self._lock:
+            if self._sync is None:
+                self._sync = OpenAI(api_key=self.api_key, base_url=self.base_url, max_retries=0, timeout=self.timeout)
+            return self._sync
+
+    def _aio(self) -> Tuple[AsyncOpenAI, asyncio.Semaphore]:
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            pair = self._loops.get(loop)
+            if pair is None:
+                pair = self._loops[loop] = (
+                    AsyncOpenAI(api_key=self.api_key, base_url=self.base_url, max_retries=0, timeout=self.timeout),
+                    asyncio.Semaphore(self.max_in_flight),
+                )
+            return pair
+
+    def _backoff(self, attempt: int, err: Exception, rate_limited: bool) -> float:
+        hint = retry_hint(err)
+        if hint is not None:
+            delay = hint + random.uniform(0, 0.1 * hint + 0.25)
+        else:
+            # "Full jitter": spreads retries from many workers instead of synchronising them.
+            delay = random.uniform(0, min(self.backoff_cap, self.backoff_base * (2 ** attempt)))
+        if rate_limited:
+            self.limiter.pause(delay)
+        return delay
+
+    @staticmethod
+    def _usage(resp) -> int:
+        u = getattr(resp, "usage", None)
+        metrics.add(requests=1, prompt_tokens=getattr(u, "prompt_tokens", 0) or 0,
+                    completion_tokens=getattr(u, "completion_tokens", 0) or 0)
+        return int(getattr(u, "total_tokens", 0) or 0)
+
+    def chat(self, **kwargs):
+        """chat.completions.create with limits and retries; returns the SDK response."""
+        est = _estimate_tokens(kwargs)
+        for attempt in range(self.max_retries + 1):
+            wait = self.limiter.reserve(est)
+            if wait:
+                time.sleep(wait)
+            try:
+                with self._sem:
+                    resp = self.sync.chat.completions.create(**kwargs)
+            except Exception as e:
+                self.limiter.settle(est, 0)
+                retryable, limited = _classify(e)
+                if not retryable or attempt == self.max_retries:
+                    raise
+                delay = self._backoff(attempt, e, limited)
+                metrics.add(retries=1)
+                logger.warning("OpenAI call failed (%s); retry %d/%d in %.1fs", type(e).__name__, attempt + 1, self.max_retries, delay)
+                time.sleep(delay)
+                continue
+            self.limiter.settle(est, self._usage(resp) or est)
+            return resp
+
+    async def achat(self, **kwargs):
+        """Async twin of chat(); the in-flight cap is per event loop, the RPM/TPM buckets are shared."""
+        aio, sem = self._aio()
+        est = _estimate_tokens(kwargs)
+        for attempt in range(self.max_retries + 1):
+            wait = self.limiter.reserve(est)
+            if wait:
+                await asyncio.sleep(wait)
+            try:
+                async with sem:
+                    resp = await aio.chat.completions.create(**kwargs)
+            except Exception as e:
+                self.limiter.settle(est, 0)
+                retryable, limited = _classify(e)
+                if not retryable or attempt == self.max_retries:
+                    raise
+                delay = self._backoff(attempt, e, limited)
+                metrics.add(retries=1)
+                logger.warning("OpenAI call failed (%s); retry %d/%d in %.1fs", type(e).__name__, attempt + 1, self.max_retries, delay)
+                await asyncio.sleep(delay)
+                continue
+            self.limiter.settle(est, self._usage(resp) or est)
+            return resp
+
+
+_clients: Dict[Tuple[str, Optional[str]], LLMClient] = {}
+_clients_lock = threading.Lock()
+
+
+def get_client(api_key: str, base_url: Optional[str] = None, **opts: Any) -> LLMClient:
+    """Process-wide client per (api_key, base_url); `opts` only apply when it is first created."""
+    with _clients_lock:
+        c = _clients.get((api_key, base_url))
+        if c is None:
+            c = _clients[(api_key, base_url)] = LLMClient(api_key, base_url=base_url, **opts)
+        return c
+
+
+def set_client(client: LLMClient) -> LLMClient:
+    """Register a configured client (e.g. LLMClient.from_settings) as the shared one for its key."""
+    with _clients_lock:
+        _clients[(client.api_key, client.base_url)] = client
+    return client
+
+
+__all__ = ["LLMClient", "RateLimiter", "get_client", "set_client", "retry_hint"]
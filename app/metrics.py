@@ -0,0 +1,218 @@
+from __future__ import annotations
+from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+import json
+import logging
+import os
+from pathlib import Path
+import sys
+import threading
+import time
+from typing import Any, Dict, Iterator, List, Optional
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+logger = logging.getLogger("market_lense.metrics")
+
+# Display/export order; spans with other names are listed after these.
+STAGE_ORDER = ("download", "md5", "text", "candidates", "preview", "figure", "analyze", "rank", "crop", "render")
+
+_current: ContextVar[Optional["Span"]] = ContextVar("market_lense_span", default=None)
+
+
+def peak_rss_bytes() -> Optional[int]:
+    """High-water mark of this process's resident set (not including pool children)."""
+    # VmHWM belongs to the current image; ru_maxrss also carries the parent's peak across fork+exec,
+    # which would charge a spawned worker for its parent's memory.
+    try:
+        with open("/proc/self/status", "rb") as fh:
+            for line in fh:
+                if line.startswith(b"VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss if sys.platform == "darwin" else rss * 1024
+
+
+class Span:
+    __slots__ = ("recorder", "name", "file_id", "start", "wall_s", "cpu_s", "rss_peak", "rss_grew", "counters", "error")
+
+    def __init__(self, recorder: "Recorder", name: str, file_id: Optional[str]):
+        self.recorder, self.name, self.file_id = recorder, name, file_id
+        self.start = time.time()
+        self.wall_s = self.cpu_s = 0.0
+        self.rss_peak: Optional[int] = None
+        self.rss_grew = 0
+        self.counters: Dict[str, int] = defaultdict(int)
+        self.error: Optional[str] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "stage": self.name, "file_id": self.file_id, "start": round(self.start, 3),
+            "wall_s": round(self.wall_s, 4), "cpu_s": round(self.cpu_s, 4),
+            "rss_peak": self.rss_peak, "rss_grew": self.rss_grew, "error": self.error, **self.counters,
+        }
+
+
+def add(**counts: int) -> None:
+    """
+    Add to the counters of the innermost open span in this thread (no-op outside a span).
+    Conventional names: bytes_in, bytes_out, prompt_tokens, completion_tokens, requests, retries, cache_hits.
+    """
+    span = _current.get()
+    if span is None:
+        return
+    for k, v in counts.items():
+        if v:
+            span.counters[k] += int(v)
+
+
+def add_file(counter: str, path: Optional[str], base: Optional[str] = None) -> None:
+    """add(<counter>=size of `path`), for outputs written by code that only returns the path."""
+    if not path or _current.get() is None:
+        return
+    try:
+        add(**{counter: os.path.getsize(os.path.join(base, path) if base else path)})
+    except OSError:
+        pass
+
+
+@contextmanager
+def child(name: str) -> Iterator[Optional[Span]]:
+    """Nested span on the recorder of the enclosing span, for library code that has no recorder of its own."""
+    parent = _current.get()
+    if parent is None:
+        yield None
+        return
+    with parent.recorder.span(name, parent.file_id) as sp:
+        yield sp
+
+
+class Recorder:
+    """
+    Collects spans for one ingest run. Wall time, thread CPU time and the process RSS high-water
+    mark are taken around each span; byte/token counters come from `add()` calls made inside it.
+    With `jsonl_path` every span is appended to that file as it closes.
+    """
+
+    def __init__(self, jsonl_path: Optional[str] = None):
+        self.run_id = time.strftime("%Y%m%d-%H%M%S") + f"-{os.getpid()}"
+        self.started = time.time()
+        self.spans: List[Span] = []
+        self.jsonl_path = jsonl_path
+        self._fh = None
+        self._lock = threading.Lock()
+        if jsonl_path:
+            Path(jsonl_path).parent.mkdir(parents=True, exist_ok=True)
+            self._fh = open(jsonl_path, "a", encoding="utf-8")
+
+    @contextmanager
+    def span(self, name: str, file_id: Optional[str] = None) -> Iterator[Span]:
+        sp = Span(self, name, file_id)
+        token = _current.set(sp)
+        rss0 = peak_rss_bytes()
+        t0, c0 = time.perf_counter(), time.thread_time()
+        try:
+            yield sp
+        except BaseException as e:
+            sp.error = type(e).__name__
+            raise
+        finally:
+            sp.wall_s = time.perf_counter() - t0
+            sp.cpu_s = time.thread_time() - c0
+            sp.rss_peak = peak_rss_bytes()
+            if rss0 is not None and sp.rss_peak is not None:
+                sp.rss_grew = sp.rss_peak - rss0
+            _current.reset(token)
+            self._record(sp)
+
+    def _record(self, sp: Span) -> None:
+        logger.debug("%s %s: %.2fs wall, %.2fs cpu", sp.name, sp.file_id or "", sp.wall_s, sp.cpu_s)
+        with self._lock:
+            self.spans.append(sp)
+            if self._fh is not None:
+                self._fh.write(json.dumps({"run": self.run_id, **sp.to_dict()}) + "\n")
+                self._fh.flush()
+
+    def summary(self) -> List[Dict[str, Any]]:
+        """Per-stage aggregates, in pipeline order."""
+        by: Dict[str, List[Span]] = defaultdict(list)
+        with self._lock:
+            for sp in self.spans:
+                by[sp.name].append(sp)
+        order = [n for n in STAGE_ORDER if n in by] + sorted(n for n in by if n not in STAGE_ORDER)
+        out = []
+        for name in order:
+            spans = by[name]
+            walls = sorted(sp.wall_s for sp in spans)
+            counters: Dict[str, int] = defaultdict(int)
+            for sp in spans:
+                for k, v in sp.counters.items():
+                    counters[k] += v
+            out.append({
+                "stage": name, "calls": len(spans), "errors": sum(1 for sp in spans if sp.error),
+                "wall_s": sum(walls), "p50_s": walls[len(walls) // 2],
+                "p95_s": walls[min(len(walls) - 1, int(len(walls) * 0.95))],
+                "cpu_s": sum(sp.cpu_s for sp in spans),
+                "rss_grew": sum(sp.rss_grew for sp in spans), **counters,
+            })
+        return out
+
+    def write_prometheus(self, path: str, extra: Optional[Dict[str, tuple]] = None) -> None:
+        """
+        Node-exporter textfile with the last run's per-stage totals (written atomically).
+        `extra` adds run-level gauges as {metric: (help, value)}.
+        """
+        lines = []
+
+        def gauge(metric: str, help_: str, samples: List[tuple]) -> None:
+            lines.append(f"# HELP market_lense_{metric} {help_}")
+            lines.append(f"# TYPE market_lense_{metric} gauge")
+            for labels, value in samples:
+                lbl = ",".join(f'{k}="{v}"' for k, v in labels.items())
+                lines.append(f"market_lense_{metric}{{{lbl}}} {value}" if lbl else f"market_lense_{metric} {value}")
+
+        rows = self.summary()
+        gauge("stage_seconds", "Wall time spent in each ingest stage during the last run.",
+              [({"stage": r["stage"]}, round(r["wall_s"], 4)) for r in rows])
+        gauge("stage_cpu_seconds", "Thread CPU time spent in each ingest stage during the last run.",
+              [({"stage": r["stage"]}, round(r["cpu_s"], 4)) for r in rows])
+        gauge("stage_calls", "Spans recorded per ingest stage during the last run.",
+              [({"stage": r["stage"]}, r["calls"]) for r in rows])
+        gauge("stage_errors", "Failed spans per ingest stage during the last run.",
+              [({"stage": r["stage"]}, r["errors"]) for r in rows])
+        gauge("stage_bytes", "Bytes read/written per ingest stage during the last run.",
+              [({"stage": r["stage"], "direction": d}, r.get(f"bytes_{d}", 0)) for r in rows for d in ("in", "out")
+               if r.get(f"bytes_{d}")])
+        gauge("openai_tokens", "OpenAI tokens used per ingest stage during the last run.",
+              [({"stage": r["stage"], "kind": k}, r.get(f"{k}_tokens", 0)) for r in rows for k in ("prompt", "completion")
+               if r.get(f"{k}_tokens")])
+        peak = peak_rss_bytes()
+        if peak is not None:
+            gauge("peak_rss_bytes", "Peak resident set size of the last ingest run.", [({}, peak)])
+        gauge("last_run_duration_seconds", "Wall time of the last ingest run.", [({}, round(time.time() - self.started, 3))])
+        gauge("last_run_timestamp_seconds", "When the last ingest run finished.", [({}, int(time.time()))])
+        for metric, (help_, value) in (extra or {}).items():
+            gauge(metric, help_, [({}, value)])
+
+        p = Path(path)
+        p.parent.mkdir(parents=True, exist_ok=True)
+        tmp = p.with_name(p.name + f".{os.getpid()}.tmp")
+        tmp.write_text("\n".join(lines) + "\n", encoding="utf-8")
+        os.replace(tmp, p)
+
+    def close(self) -> None:
+        with self._lock:
+            if self._fh is not None:
+                self._fh.close()
+                self._fh = None
+
+
+__all__ = ["Recorder", "Span", "add", "add_file", "child", "peak_rss_bytes", "STAGE_ORDER"]
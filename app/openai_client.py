@@ -1,10 +1,12 @@
 # app/openai_client.py
 import json
-from typing import Any, Dict
-
-from openai import OpenAI
-from pypdf import PdfReader
+from typing import Any, Dict, List, Optional
 
+from .config import ANALYZE_TOKEN_BUDGET
+from .document import PdfSource, source_path
+from .llm import LLMClient, get_client
+from .response_cache import ResponseCache, request_key
+from .text import budgeted_text
 from .util import retry
 import logging
 
@@ -72,62 +74,87 @@ def _validate_payload(data: Dict[str, Any]) -> None:
         raise ValueError("`insights` must be a list of exactly 5 items")
 
 
-def _extract_text_first_pages(pdf_path: str, max_pages: int = 5, max_chars: int = 80_000) -> str:
-    reader = PdfReader(pdf_path)
-    pages = min(len(reader.pages), max_pages)
-    chunks = []
-    for i in range(pages):
-        # extract_text() can return None; guard it
-        t = reader.pages[i].extract_text() or ""
-        chunks.append(t)
-    text = "\n\n".join(chunks)
-    return text[:max_chars]
+# ---------- Main entry (Completions JSON mode; SDK 2.x compatible) ----------
 
+def _analyze_messages(extracted: str) -> List[Dict[str, str]]:
+    return [
+        {"role": "system", "content": "You are a careful analyst. Output strict JSON only."},
+        {
+            "role": "user",
+            "content": (
+                f"{PROMPT}\n\n"
+                "[EXTRACTED TEXT START]\n"
+                f"{extracted}\n"
+                "[EXTRACTED TEXT END]"
+            ),
+        },
+    ]
 
-# ---------- Main entry (Completions JSON mode; SDK 2.x compatible) ----------
 
-@retry(backoffs=(1, 2, 4))
-def analyze_pdf(pdf_path: str, model: str, temperature: float, openai_api_key: str) -> Dict[str, Any]:
+def analyze_pdf(pdf: PdfSource, model: str, temperature: float, openai_api_key: str,
+                cache: Optional[ResponseCache] = None, client: Optional[LLMClient] = None,
+                token_budget: int = ANALYZE_TOKEN_BUDGET) -> Dict[str, Any]:
     """
-    MVP path: extract first ~5 pages of text locally, then call Chat Completions in JSON mode.
+    MVP path: extract the densest pages' text locally (up to `token_budget`), then call Chat Completions in JSON mode.
     This avoids file uploads and works across openai==2.x.
 
     Returns: dict matching SCHEMA + adds _openai_file_id="" (no upload in this path).
     """
-    logger.info("analyze_pdf called: pdf_path=%s model=%s temperature=%s", pdf_path, model, temperature)
+    logger.info("analyze_pdf called: pdf=%s model=%s temperature=%s", source_path(pdf), model, temperature)
 
     # 1) Extract text
-    extracted = _extract_text_first_pages(pdf_path)
+    extracted = budgeted_text(pdf, token_budget)
     logger.debug("Extracted text length=%d", len(extracted or ""))
+    return analyze_text(extracted, model, temperature, openai_api_key, cache=cache, client=client)
 
-    # 2) Call OpenAI Chat Completions with JSON mode
-    client = OpenAI(api_key=openai_api_key)
-    logger.info("Calling OpenAI Chat Completions (model=%s)", model)
-    resp = client.chat.completions.create(
-        model=model,  # e.g., "gpt-4.1-mini"
-        messages=[
-            {"role": "system", "content": "You are a careful analyst. Output strict JSON only."},
-            {
-                "role": "user",
-                "content": (
-                    f"{PROMPT}\n\n"
-                    "[EXTRACTED TEXT START]\n"
-                    f"{extracted}\n"
-                    "[EXTRACTED TEXT END]"
-                ),
-            },
-        ],
-        response_format={"type": "json_object"},  # ensures valid JSON string
-        temperature=temperature,
-    )
 
-    payload = resp.choices[0].message.content
-    logger.debug("Received response payload length=%d", len(payload or ""))
-    data = json.loads(payload)
+def analyze_request(extracted: str, model: str, temperature: float) -> Dict[str, Any]:
+    """Chat Completions body for one analysis (used as-is for interactive calls and Batch API lines)."""
+    return {
+        "model": model,  # e.g., "gpt-4.1-mini"
+        "messages": _analyze_messages(extracted),
+        "response_format": {"type": "json_object"},  # ensures valid JSON string
+        "temperature": temperature,
+    }
 
-    # 3) Defensive validation
-    _validate_payload(data)
 
-    # 4) Mark no file upload used in this path
+def analyze_cache_key(body: Dict[str, Any]) -> str:
+    return request_key("analyze", body["model"], body["temperature"], body["messages"], response_format="json_object")
+
+
+def parse_analysis(payload: str) -> Dict[str, Any]:
+    """Model output -> validated payload dict; raises ValueError on anything unusable."""
+    data = json.loads(payload)
+    _validate_payload(data)
+    # Mark no file upload used in this path
     data["_openai_file_id"] = ""
     return data
+
+
+# Transport errors (429/5xx/timeouts) are retried inside LLMClient; this only re-asks on bad JSON.
+@retry(backoffs=(1, 2), exceptions=(ValueError,))
+def analyze_text(extracted: str, model: str, temperature: float, openai_api_key: str,
+                 cache: Optional[ResponseCache] = None, client: Optional[LLMClient] = None) -> Dict[str, Any]:
+    """Model half of analyze_pdf, for callers that extracted the text up front (e.g. the ingest pipeline)."""
+    body = analyze_request(extracted, model, temperature)
+    key = analyze_cache_key(body) if cache else None
+    payload = cache.get(key) if cache else None
+    cached = payload is not None
+
+    if not cached:
+        # Call OpenAI Chat Completions with JSON mode
+        client = client or get_client(openai_api_key)
+        logger.info("Calling OpenAI Chat Completions (model=%s)", model)
+        resp = client.chat(**body)
+        payload = resp.choices[0].message.content
+        logger.debug("Received response payload length=%d", len(payload or ""))
+
+    try:
+        data = parse_analysis(payload)
+    except Exception:
+        if cached:
+            cache.discard(key)  # corrupt entry: drop it so the retry goes to the model
+        raise
+    if cache and not cached:
+        cache.put(key, payload, kind="analyze", model=model)
+    return data
@@ -0,0 +1,68 @@
+from __future__ import annotations
+import atexit
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing as mp
+import threading
+from typing import Any, Callable, Iterator, List, Optional, Sequence
+
+# Shared worker pool for page-parallel PDF work. "spawn" keeps children clean even when the
+# parent is the threaded ingest pipeline (forking with MuPDF/sqlite locks held can deadlock).
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_size = 0
+_pool_lock = threading.Lock()
+
+
+def get_pool(processes: int) -> ProcessPoolExecutor:
+    global _pool, _pool_size
+    with _pool_lock:
+        if _pool is None or _pool_size != processes:
+            if _pool is not None:
+                _pool.shutdown(wait=True)
+            _pool = ProcessPoolExecutor(max_workers=processes, mp_context=mp.get_context("spawn"))
+            _pool_size = processes
+        return _pool
+
+
+@atexit.register
+def shutdown_pool() -> None:
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=True, cancel_futures=True)
+            _pool = None
+
+
+def page_shards(page_count: int, processes: int, min_pages: int = 16) -> List[range]:
+    """Split [0, page_count) into contiguous ranges: a few per process for balance, none under min_pages."""
+    if page_count <= 0:
+        return []
+    n = max(1, min(processes * 4, page_count // max(1, min_pages)))
+    step, extra = divmod(page_count, n)
+    shards, start = [], 0
+    for i in range(n):
+        stop = start + step + (1 if i < extra else 0)
+        shards.append(range(start, stop))
+        start = stop
+    return shards
+
+
+def iter_shards(fn: Callable[..., Any], pdf_path: str, shards: Sequence[range], processes: int, *args) -> Iterator[Any]:
+    """
+    Run fn(pdf_path, start, stop, *args) for every shard in the pool and yield results in shard order.
+    Closing the iterator early cancels shards that have not started yet.
+    """
+    pool = get_pool(processes)
+    futs = [pool.submit(fn, pdf_path, r.start, r.stop, *args) for r in shards]
+    try:
+        for f in futs:
+            yield f.result()
+    finally:
+        for f in futs:
+            f.cancel()
+
+
+def map_shards(fn: Callable[..., Any], pdf_path: str, shards: Sequence[range], processes: int, *args) -> List[Any]:
+    return list(iter_shards(fn, pdf_path, shards, processes, *args))
+
+
+__all__ = ["get_pool", "shutdown_pool", "page_shards", "iter_shards", "map_shards"]
@@ -0,0 +1,156 @@
+from __future__ import annotations
+from collections import Counter
+import logging
+import os
+from pathlib import Path
+import re
+import socket
+import threading
+import time
+from typing import Dict, List, Optional, Set
+
+from .state import State
+
+logger = logging.getLogger("market_lense.pdf_cache")
+
+_MD5_RX = re.compile(r"^[0-9a-f]{32}$")
+# Pins from other hosts (or whose liveness we can't check) are honoured this long.
+PIN_TTL_S = 6 * 3600
+
+
+def _owner() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class PdfCache:
+    """
+    Size-bounded LRU over CACHE_DIR, with its manifest (size, last access, md5 per PDF) in the state DB.
+    Files an ingest is using are pinned in the DB, so neither this process nor a concurrent
+    `cache prune` evicts them; pins of dead local processes are ignored.
+    """
+
+    def __init__(self, state: State, cache_dir: str, max_bytes: int = 0):
+        self.state = state
+        self.cache_dir = Path(cache_dir)
+        self.max_bytes = max_bytes
+        self.owner = _owner()
+        self._refs: Counter = Counter()
+        self._lock = threading.Lock()
+
+    def _key(self, path: str) -> str:
+        return Path(path).resolve().as_posix()
+
+    # ---------- pins ----------
+
+    def pin(self, path: str) -> None:
+        key = self._key(path)
+        with self._lock:
+            self._refs[key] += 1
+            if self._refs[key] == 1:
+                self.state.cache_pin(key, self.owner)
+
+    def unpin(self, path: str) -> None:
+        key = self._key(path)
+        with self._lock:
+            if self._refs[key] <= 0:
+                return
+            self._refs[key] -= 1
+            if self._refs[key] == 0:
+                del self._refs[key]
+                self.state.cache_unpin(key, self.owner)
+
+    def pinned(self) -> Set[str]:
+        host = socket.gethostname()
+        now = time.time()
+        live, dead = set(), set()
+        for path, owner, pinned_at in self.state.cache_pins():
+            h, _, pid = owner.rpartition(":")
+            if owner != self.owner and h == host and pid.isdigit():
+                if not _pid_alive(int(pid)):
+                    dead.add(owner)  # crashed ingest on this box: its pins no longer count
+                    continue
+                live.add(path)
+            elif owner == self.owner or now - pinned_at < PIN_TTL_S:
+                live.add(path)
+        if dead:
+            self.state.cache_drop_pins(dead)
+        return live
+
+    # ---------- manifest ----------
+
+    def touch(self, path: str, file_id: str, md5: Optional[str] = None) -> None:
+        try:
+            size = os.path.getsize(path)
+        except OSError:
+            return
+        self.state.cache_touch(self._key(path), file_id, md5, size)
+
+    def scan(self) -> int:
+        """Adopt PDFs already in CACHE_DIR that the manifest doesn't know about. Returns files added."""
+        known = {p for p, *_ in self.state.cache_entries()}
+        added = 0
+        for p in self.cache_dir.glob("*.pdf"):
+            key = self._key(str(p))
+            if key in known:
+                continue
+            parts = p.name.split(".")
+            tag = parts[1] if len(parts) == 3 else ""
+            st = p.stat()
+            self.state.cache_touch(key, parts[0], tag if _MD5_RX.match(tag) else None, st.st_size,
+                                   at=int(max(st.st_atime, st.st_mtime)))
+            added += 1
+        return added
+
+    def stats(self) -> Dict[str, int]:
+        entries = self.state.cache_entries()
+        return {"files": len(entries), "bytes": sum(e[3] for e in entries), "pinned": len(self.pinned())}
+
+    # ---------- eviction ----------
+
+    def evict(self, max_bytes: Optional[int] = None) -> List[str]:
+        """Delete least recently used, unpinned PDFs until the cache fits `max_bytes`. Returns removed paths."""
+        budget = self.max_bytes if max_bytes is None else max_bytes
+        entries = self.state.cache_entries()
+        gone = {e[0] for e in entries if not os.path.exists(e[0])}
+        if gone:
+            self.state.cache_forget(gone)
+        entries = [e for e in entries if e[0] not in gone]
+        total = sum(e[3] for e in entries)
+        if (max_bytes is None and not self.max_bytes) or total <= budget:
+            return []  # unlimited (PDF_CACHE_MAX_MB=0) or already within budget
+        pinned = self.pinned()
+        removed = []
+        for path, file_id, md5, size, last_access in entries:
+            if total <= budget:
+                break
+            if path in pinned:
+                continue
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+            except OSError:
+                logger.warning("Could not evict %s", path, exc_info=True)
+                continue
+            removed.append(path)
+            total -= size
+        self.state.cache_forget(removed)
+        if removed:
+            logger.info("Evicted %d cached PDF(s); cache now %.1f MB", len(removed), total / 1e6)
+        if total > budget:
+            logger.warning("PDF cache still over budget (%.1f MB > %.1f MB): remaining files are pinned",
+                           total / 1e6, budget / 1e6)
+        return removed
+
+
+__all__ = ["PdfCache"]
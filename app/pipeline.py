@@ -0,0 +1,671 @@
+from __future__ import annotations
+from dataclasses import dataclass, field
+import logging
+import os
+import queue
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+from rich.console import Console
+
+from . import metrics
+from .assets import Encoding, owned_by
+from .batch import BatchWriter, custom_id
+from .candidates import Candidate
+from .config import Settings
+from .crop import crop_regions
+from .document import PDF_LOCK, DocumentSession
+from .download import DownloadManager
+from .drive import cache_path
+from .extract import collect_candidates
+from .figure import extract_best_figure_png
+from .index import CorpusIndex
+from .llm import LLMClient
+from .metrics import Recorder, peak_rss_bytes
+from .normalize import normalize_report_payload
+from .pdf_cache import PdfCache
+from .openai_client import analyze_cache_key, analyze_request, analyze_text, parse_analysis
+from .preview import first_page_png
+from .rank import parse_ranking, rank_cache_key, rank_reports, rank_request, rank_tokens
+from .render import payload_hash, render_payload, report_payload, template_hash
+from .response_cache import ResponseCache
+from .state import STAGES, State
+from .text import budgeted_text
+
+logger = logging.getLogger("market_lense.pipeline")
+
+_STOP = object()
+
+# A checkpoint is only reused if the ones it was computed from are reused too.
+_DEPENDS = {"ranks": ("candidates",), "crops": ("ranks",), "render": ("preview", "figure", "analysis", "crops")}
+
+
+@dataclass
+class StageWorkers:
+    download: int = 1
+    extract: int = 1
+    llm: int = 1
+    render: int = 1
+    queue_size: int = 2     # max jobs waiting between two stages
+
+    @classmethod
+    def uniform(cls, n: int, **overrides: Optional[int]) -> "StageWorkers":
+        w = cls(download=n, extract=n, llm=n, render=n, queue_size=max(2, n))
+        for k, v in overrides.items():
+            if v is not None:
+                setattr(w, k, v)
+        return w
+
+
+@dataclass
+class Job:
+    idx: int
+    meta: Dict[str, Any]
+    pdf_path: Optional[str] = None
+    md5: Optional[str] = None
+    session: Optional[DocumentSession] = None
+    text: str = ""
+    figure: tuple = (None, None)     # (png, caption) from extract_best_figure_png
+    cands: List[Candidate] = field(default_factory=list)
+    preview: Optional[str] = None
+    data: Optional[Dict[str, Any]] = None
+    ranked: List[Dict[str, Any]] = field(default_factory=list)
+    html: Optional[str] = None
+    pinned: Optional[str] = None     # cache path held against eviction while the job runs
+    done: Dict[str, Any] = field(default_factory=dict)   # stage -> checkpointed output
+    batched: List[str] = field(default_factory=list)     # Batch API custom_ids written for this job
+    grouped: bool = False            # reached the rank stage
+    stage: str = "download"          # checkpoint stage being worked on (recorded if it fails)
+
+    @property
+    def name(self) -> str:
+        return self.meta.get("name") or self.meta.get("id", "?")
+
+    def close(self) -> None:
+        if self.session is not None:
+            with PDF_LOCK:
+                self.session.close()
+            self.session = None
+
+
+def _artifacts(stage: str, out: Any, out_dir: str) -> List[str]:
+    """Files a checkpoint points at; it is stale if any of them is gone or is not this report's."""
+    if stage == "render":
+        return [out] if out else []     # render_html returns the path itself
+    if stage == "candidates":
+        return [c["thumb_path"] for c in out or [] if c.get("thumb_path")]   # already under OUTPUT_DIR
+    if stage == "preview":
+        rel = [out]
+    elif stage == "figure":
+        rel = [out[0]] if out else []
+    elif stage == "crops":
+        rel = out or []
+    else:
+        rel = []
+    # Asset paths are stored relative to OUTPUT_DIR, as the HTML links them.
+    return [os.path.join(out_dir, p) for p in rel if p]
+
+
+class _Slots:
+    """Admission control so at most `limit` files finish; failed or skipped files free their slot."""
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.succeeded = 0
+        self.inflight = 0
+        self.cond = threading.Condition()
+
+    def acquire(self) -> bool:
+        with self.cond:
+            while self.inflight and self.succeeded + self.inflight >= self.limit:
+                self.cond.wait()
+            if self.succeeded >= self.limit:
+                return False
+            self.inflight += 1
+            return True
+
+    def can_admit(self) -> bool:
+        """Whether another file could be admitted now without waiting for one in flight."""
+        with self.cond:
+            return self.succeeded + self.inflight < self.limit
+
+    def release(self, success: bool) -> None:
+        with self.cond:
+            self.inflight -= 1
+            self.succeeded += int(success)
+            self.cond.notify_all()
+
+
+class _Stage:
+    def __init__(self, name: str, fn: Callable[[Job], Optional[Job]], workers: int,
+                 inbox: "queue.Queue", outbox: Optional["queue.Queue"], pipeline: "IngestPipeline"):
+        self.name, self.fn, self.workers = name, fn, max(1, workers)
+        self.inbox, self.outbox, self.pipeline = inbox, outbox, pipeline
+        self.next: Optional[_Stage] = None
+        self._alive = self.workers
+        self._lock = threading.Lock()
+        self.threads = [
+            threading.Thread(target=self._run, name=f"ingest-{name}-{i}", daemon=True)
+            for i in range(self.workers)
+        ]
+
+    def start(self) -> None:
+        for t in self.threads:
+            t.start()
+
+    def _run(self) -> None:
+        while True:
+            job = self.inbox.get()
+            if job is _STOP:
+                break
+            try:
+                out = self.fn(job)
+            except Exception as e:
+                self.pipeline.fail(job, e, job.stage)
+                continue
+            self._emit(job, out)
+        self._exit()
+
+    def _emit(self, job: Job, out: Optional[Job]) -> None:
+        if out is None:
+            self.pipeline.drop(job)
+        elif self.outbox is not None:
+            self.outbox.put(out)
+
+    def _exit(self) -> None:
+        with self._lock:
+            self._alive -= 1
+            last = self._alive == 0
+        # Last worker out tells every worker of the next stage to stop.
+        if last and self.next is not None:
+            for _ in range(self.next.workers):
+                self.outbox.put(_STOP)
+
+
+class _GroupStage(_Stage):
+    """
+    A stage whose workers take jobs in groups: after the first job they keep collecting for up to
+    `linger` seconds, or until `full(jobs)`, then call `fn(jobs)` once for the whole group.
+    `full` should also be true once no further job can arrive.
+    """
+
+    def __init__(self, name: str, fn: Callable[[List[Job]], List[Job]], workers: int,
+                 inbox: "queue.Queue", outbox: Optional["queue.Queue"], pipeline: "IngestPipeline",
+                 linger: float, full: Callable[[List[Job]], bool]):
+        super().__init__(name, fn, workers, inbox, outbox, pipeline)
+        self.linger, self.full = linger, full
+
+    def _take(self, timeout: Optional[float] = None):
+        item = self.inbox.get(timeout=timeout)
+        if item is not _STOP:
+            self.pipeline.arrived(item)
+        return item
+
+    def _run(self) -> None:
+        stopped = False
+        while not stopped:
+            job = self._take()
+            if job is _STOP:
+                break
+            jobs = [job]
+            deadline = time.monotonic() + self.linger
+            while not self.full(jobs):
+                left = deadline - time.monotonic()
+                if left <= 0:
+                    break
+                try:
+                    # Short waits, so a job failing upstream ends the wait early.
+                    nxt = self._take(timeout=min(0.1, left))
+                except queue.Empty:
+                    continue
+                if nxt is _STOP:
+                    stopped = True
+                    break
+                jobs.append(nxt)
+            try:
+                outs = self.fn(jobs)
+            except Exception as e:
+                for j in jobs:
+                    self.pipeline.fail(j, e, j.stage)
+                continue
+            for j, out in zip(jobs, outs):
+                self._emit(j, out)
+        self._exit()
+
+
+class IngestPipeline:
+    """
+    Staged ingest: download -> extract (PDF CPU work) -> llm (analyze) -> rank -> render.
+    Stages run in their own thread pools connected by bounded queues, so downloads and
+    model calls for one report overlap with PDF work on another. The rank stage groups
+    reports that arrive close together into one ranking request.
+    With `batch`, model requests are written to Batch API JSONL instead of sent; with `offline`,
+    no model calls are made at all (used to finish reports from imported batch results).
+    """
+
+    def __init__(self, s: Settings, state: State, env, drive_factory: Callable[[], Any],
+                 workers: StageWorkers, limit: int, console: Optional[Console] = None,
+                 cache: Optional[ResponseCache] = None, llm: Optional[LLMClient] = None,
+                 pdf_cache: Optional[PdfCache] = None, resume: bool = True, recorder: Optional[Recorder] = None,
+                 batch: Optional[BatchWriter] = None, offline: bool = False, index: Optional[CorpusIndex] = None,
+                 downloads: Optional[DownloadManager] = None):
+        self.s, self.state, self.env = s, state, env
+        self.batch, self.offline = batch, offline
+        self.index = index
+        self.metrics = recorder or Recorder()
+        self.resume = resume
+        self.cache = cache
+        self.llm_client = llm or LLMClient.from_settings(s)
+        self.pdf_cache = pdf_cache
+        self.assets = Encoding(s.asset_format, s.asset_quality, s.asset_max_px or None)
+        self.thumbs = self.assets.limit(s.thumb_max_px or None)
+        self.downloads = downloads or DownloadManager.from_settings(s, drive_factory, workers.download)
+        self.template_hash = template_hash()
+        self.workers = workers
+        self.slots = _Slots(limit)
+        self.console = console or Console()
+        self.rows: List[tuple] = []
+        self.failed = 0
+        self.batched = 0
+        self.skipped: List[str] = []   # ids of files skipped as already processed
+        self.upstream = 0        # admitted jobs that have not reached the rank stage yet
+        self._feeding_done = False
+        self.exhausted = False   # every listed file was admitted or skipped (no --limit cut-off)
+        self._rows_lock = threading.Lock()
+
+    # ---------- bookkeeping ----------
+
+    def _say(self, job: Job, msg: str, style: str = "cyan") -> None:
+        self.console.print(f"[{style}]  -> {job.name}: {msg}[/{style}]")
+
+    def _release(self, job: Job) -> None:
+        job.close()
+        if job.pinned and self.pdf_cache is not None:
+            self.pdf_cache.unpin(job.pinned)
+            job.pinned = None
+
+    def arrived(self, job: Job) -> None:
+        with self._rows_lock:
+            job.grouped = True
+            self.upstream -= 1
+
+    def _gone(self, job: Job) -> None:
+        if not job.grouped:
+            with self._rows_lock:
+                job.grouped = True
+                self.upstream -= 1
+
+    def fail(self, job: Job, e: Exception, stage: str) -> None:
+        self._gone(job)
+        self._release(job)
+        if job.md5:
+            self.state.stage_failed(job.meta["id"], job.md5, stage, f"{type(e).__name__}: {e}")
+        with self._rows_lock:
+            self.failed += 1
+        self.console.print(f"[red]Error processing {job.name}: {e}[/red]")
+        logger.error("Error processing %s", job.name, exc_info=e)
+        self.slots.release(False)
+
+    def drop(self, job: Job) -> None:
+        self._gone(job)
+        self._release(job)
+        self.slots.release(False)
+
+    # ---------- checkpoints ----------
+
+    def _checkpoint(self, job: Job, stage: str, output: Any, durable: bool = False) -> None:
+        self.state.stage_done(job.meta["id"], job.md5, stage, output, durable=durable)
+        job.done[stage] = output
+
+    def _restore(self, job: Job) -> None:
+        """Load the usable checkpoints for this revision into the job."""
+        rows = self.state.stages(job.meta["id"], job.md5) if self.resume else {}
+        done: Dict[str, Any] = {}
+        for stage in STAGES:
+            status, out = rows.get(stage, (None, None))
+            if status != "done" or not all(d in done for d in _DEPENDS.get(stage, ())):
+                continue
+            paths = _artifacts(stage, out, self.s.output_dir)
+            if all(owned_by(p, job.meta["id"]) and os.path.exists(p) for p in paths):
+                done[stage] = out
+        job.done = done
+        if not done:
+            return
+        job.text = done.get("text", "")
+        job.cands = [Candidate(**{**c, "bbox": tuple(c["bbox"])}) for c in done.get("candidates", [])]
+        job.preview = done.get("preview")
+        job.figure = tuple(done.get("figure") or (None, None))
+        job.data = done.get("analysis")
+        job.ranked = done.get("ranks", [])
+        todo = next((st for st in STAGES if st not in done), None)
+        self._say(job, f"resuming at {todo}" if todo else "all stages checkpointed, finishing", "yellow")
+        logger.info("Resuming %s from stage %s", job.meta.get("id"), todo)
+
+    def _session(self, job: Job) -> DocumentSession:
+        # Caller holds PDF_LOCK.
+        if job.session is None:
+            job.session = DocumentSession(job.pdf_path, image_repeat_pages=self.s.image_repeat_pages,
+                                          image_memory_mb=self.s.image_memory_mb)
+            metrics.add_file("bytes_in", job.pdf_path)
+        return job.session
+
+    def _span(self, name: str, job: Job):
+        return self.metrics.span(name, job.meta.get("id"))
+
+    # ---------- stages ----------
+
+    def download(self, job: Job) -> Optional[Job]:
+        f = job.meta
+        self._say(job, "downloading PDF...")
+        logger.info("Downloading PDF %s", f.get("id"))
+        if self.pdf_cache is not None:
+            # Pin before fetching so a concurrent eviction can't remove the file under us.
+            job.pinned = str(cache_path(self.s.cache_dir, f))
+            self.pdf_cache.pin(job.pinned)
+        # MD5 is computed while streaming (and checked against Drive's md5Checksum).
+        with self._span("download", job):
+            job.pdf_path, job.md5 = self.downloads.fetch(f)
+        if self.pdf_cache is not None:
+            self.pdf_cache.touch(job.pdf_path, f["id"], job.md5)
+            self.pdf_cache.evict()
+
+        if self.state.already_processed(f["id"], job.md5):
+            self._say(job, "already processed, skipping", "yellow")
+            with self._rows_lock:
+                self.skipped.append(f["id"])
+            logger.info("Skipping already processed file %s", f.get("id"))
+            return None
+        self._restore(job)
+        return job
+
+    def extract(self, job: Job) -> Job:
+        f = job.meta
+        if "text" not in job.done:
+            job.stage = "text"
+            with self._span("text", job), PDF_LOCK:
+                job.text = budgeted_text(self._session(job), self.s.analyze_token_budget)
+            self._checkpoint(job, "text", job.text)
+
+        if "candidates" not in job.done:
+            job.stage = "candidates"
+            with self._span("candidates", job):
+                with PDF_LOCK:
+                    session = self._session(job)
+                # Chart detection takes PDF_LOCK itself (or runs in the process pool); pdfplumber doesn't need it.
+                self._say(job, "finding tables/charts...")
+                logger.info("Finding tables/charts in %s", job.pdf_path)
+                job.cands = collect_candidates(session, self.s.output_dir, f["id"], processes=self.s.extract_processes,
+                                               table_backend=self.s.table_backend, thumb=self.thumbs)
+                for c in job.cands:
+                    metrics.add_file("bytes_out", c.thumb_path)
+            self._checkpoint(job, "candidates", [c.to_public() for c in job.cands])
+
+        if "preview" not in job.done:
+            job.stage = "preview"
+            with self._span("preview", job), PDF_LOCK:
+                self._say(job, "generating preview (page 1)...")
+                logger.info("Generating preview for %s", job.pdf_path)
+                job.preview = first_page_png(self._session(job), self.s.output_dir, f["id"], encoding=self.assets)
+                metrics.add_file("bytes_out", job.preview, self.s.output_dir)
+            self._checkpoint(job, "preview", job.preview)
+
+        if "figure" not in job.done:
+            job.stage = "figure"
+            with self._span("figure", job), PDF_LOCK:
+                self._say(job, "extracting best figure...")
+                logger.info("Extracting best figure for %s", job.pdf_path)
+                job.figure = extract_best_figure_png(self._session(job), self.s.output_dir, f["id"], encoding=self.assets)
+                metrics.add_file("bytes_out", job.figure[0], self.s.output_dir)
+            self._checkpoint(job, "figure", list(job.figure))
+        if job.session is not None:
+            with PDF_LOCK:
+                logger.info("Images in %s: %d render(s), ~%.0f MB decoded at peak (ceiling %d MB); process peak RSS %.0f MB",
+                            f.get("id"), job.session.images.renders, job.session.image_peak_bytes / 2**20,
+                            self.s.image_memory_mb, (peak_rss_bytes() or 0) / 2**20)
+        return job
+
+    def _from_cache(self, key: str, parse: Callable[[str], Any]) -> Optional[Any]:
+        if self.cache is None:
+            return None
+        payload = self.cache.get(key)
+        if payload is None:
+            return None
+        try:
+            return parse(payload)
+        except Exception:
+            self.cache.discard(key)
+            return None
+
+    def _queue_batch(self, job: Job) -> Job:
+        """Batch mode: write the analyze/rank requests this job still needs (unless the response cache has them)."""
+        s, f = self.s, job.meta
+        if "analysis" not in job.done:
+            job.stage = "analysis"
+            body = analyze_request(job.text, s.openai_model, s.temperature)
+            data = self._from_cache(analyze_cache_key(body), parse_analysis)
+            if data is not None:
+                job.data = normalize_report_payload(data)
+                self._checkpoint(job, "analysis", job.data)
+            else:
+                cid = custom_id("analyze", f["id"], job.md5)
+                self.batch.add(cid, body)
+                self.state.stage_pending(f["id"], job.md5, "analysis", {"custom_id": cid, "name": f.get("name")})
+                job.batched.append(cid)
+        if "ranks" not in job.done:
+            job.stage = "ranks"
+            if not job.cands:
+                self._checkpoint(job, "ranks", [])
+            else:
+                body = rank_request(job.cands, s.openai_model)
+                ranked = self._from_cache(rank_cache_key(body), parse_ranking)
+                if ranked is not None:
+                    job.ranked = ranked
+                    self._checkpoint(job, "ranks", ranked)
+                else:
+                    cid = custom_id("rank", f["id"], job.md5)
+                    self.batch.add(cid, body)
+                    self.state.stage_pending(f["id"], job.md5, "ranks", {"custom_id": cid, "name": f.get("name")})
+                    job.batched.append(cid)
+        if job.batched:
+            self._say(job, f"queued {len(job.batched)} batch request(s)")
+        return job
+
+    def llm(self, job: Job) -> Job:
+        s = self.s
+        if self.batch is not None:
+            return self._queue_batch(job)
+        if self.offline:
+            if "analysis" not in job.done:
+                job.stage = "analysis"
+                raise RuntimeError("no analysis result for this revision")
+            if "ranks" not in job.done and job.cands:
+                logger.warning("No ranking result for %s; rendering without crops", job.meta.get("id"))
+            return job
+
+        if "analysis" not in job.done:
+            job.stage = "analysis"
+            self._say(job, "sending to OpenAI...")
+            logger.info("Sending %s to model %s (temp=%s)", job.pdf_path, s.openai_model, s.temperature)
+            with self._span("analyze", job):
+                job.data = normalize_report_payload(analyze_text(
+                    job.text, s.openai_model, s.temperature, s.openai_api_key, cache=self.cache, client=self.llm_client))
+            self._checkpoint(job, "analysis", job.data, durable=True)
+
+        return job
+
+    def _needs_rank(self, job: Job) -> bool:
+        return self.batch is None and not self.offline and "ranks" not in job.done and bool(job.cands)
+
+    def _rank_full(self, jobs: List[Job]) -> bool:
+        need = [j for j in jobs if self._needs_rank(j)]
+        if not need or self.upstream <= 0 and (self._feeding_done or not self.slots.can_admit()):
+            return True   # nothing to rank, or nothing more can arrive
+        return sum(rank_tokens(j.cands) for j in need) >= self.s.rank_token_budget
+
+    def rank(self, jobs: List[Job]) -> List[Job]:
+        s = self.s
+        for job in jobs:
+            if self.batch is None and not self.offline and "ranks" not in job.done and not job.cands:
+                self._checkpoint(job, "ranks", [], durable=True)
+        todo = [j for j in jobs if self._needs_rank(j)]
+        if not todo:
+            return jobs
+        for job in todo:
+            job.stage = "ranks"
+            self._say(job, f"ranking {len(job.cands)} candidates...")
+        logger.info("Ranking %d candidate regions from %d report(s)", sum(len(j.cands) for j in todo), len(todo))
+        with self.metrics.span("rank", todo[0].meta.get("id") if len(todo) == 1 else None):
+            metrics.add(reports=len(todo))
+            ranked = rank_reports(
+                {j.meta["id"]: j.cands for j in todo}, model=s.openai_model, api_key=s.openai_api_key,
+                cache=self.cache, client=self.llm_client, token_budget=s.rank_token_budget, debug_dir=s.rank_debug_dir)
+        for job in todo:
+            if job.meta["id"] in ranked:
+                job.ranked = ranked[job.meta["id"]]
+                self._checkpoint(job, "ranks", job.ranked, durable=True)
+            else:
+                # Not checkpointed, so a later run of this revision tries again.
+                logger.warning("Ranking failed for %s; continuing without ranks", job.meta.get("id"))
+                job.ranked = []
+        return jobs
+
+    def _finish_batched(self, job: Job) -> Job:
+        # The report is finished by `import-batch` once the results are in.
+        self._release(job)
+        with self._rows_lock:
+            self.batched += 1
+            self.rows.append((job.idx, job.meta["name"], job.meta["id"], job.md5[:10] + "…",
+                              "batch: " + ", ".join(c.split(":", 1)[0] for c in job.batched)))
+        self.slots.release(True)
+        return job
+
+    def render(self, job: Job) -> Job:
+        if job.batched:
+            return self._finish_batched(job)
+        f, data = job.meta, job.data
+
+        # Join back coords for top-N (N=3)
+        id2cand = {c.id: c for c in job.cands}
+        top_items = []
+        for row in sorted(job.ranked, key=lambda r: r.get("score",0), reverse=True)[:3]:
+            c = id2cand.get(row["id"])
+            if not c: continue
+            top_items.append({"id":c.id,"type":c.kind,"score":row.get("score",0),"page":c.page,"bbox":c.bbox})
+
+        if "crops" in job.done:
+            sliced_paths = job.done["crops"]
+        else:
+            job.stage = "crops"
+            self._say(job, "cropping top candidates...")
+            logger.info("Cropping top candidates: %s", [i.get("id") for i in top_items])
+            with self._span("crop", job), PDF_LOCK:
+                sliced_paths = crop_regions(self._session(job), self.s.output_dir, f["id"], top_items, encoding=self.assets)
+                for p in sliced_paths:
+                    metrics.add_file("bytes_out", p, self.s.output_dir)
+            if "ranks" in job.done:
+                self._checkpoint(job, "crops", sliced_paths)
+        self._release(job)
+        job.stage = "render"
+
+        # First image (if chart) → primary "Figure" image
+        if sliced_paths:
+            data["_figure_gallery"] = sliced_paths  # full gallery
+            data["_figure_top"] = sliced_paths[0]   # first as main
+
+        fig_png, fig_caption = job.figure
+        if fig_png:
+            data["_figure_image"] = fig_png
+            if fig_caption and not (data["figure"].get("evidence") or "").strip():
+                data["figure"]["evidence"] = fig_caption
+
+        # Stored so `render-all` can rebuild the page after template changes without model calls.
+        payload = report_payload(data, f["name"], job.preview, job.ranked)
+        ph = payload_hash(payload)
+        if "render" in job.done:
+            job.html = job.done["render"]
+            render_key = None   # rendered by an earlier run, possibly from another template
+        else:
+            self._say(job, "rendering HTML...")
+            logger.info("Rendering HTML for %s", f.get("id"))
+            with self._span("render", job):
+                job.html = render_payload(self.env, f["id"], payload, self.s.output_dir)
+                metrics.add_file("bytes_out", job.html)
+            self._checkpoint(job, "render", job.html)
+            render_key = f"{ph}:{self.template_hash}"
+        self.state.save_report(f["id"], job.md5, f["name"], payload, ph, render_key, job.html)
+        if self.index is not None:
+            try:
+                self.index.update(f["id"], payload, job.html)
+            except Exception:
+                # The report itself is done; `build-index` can catch the index up later.
+                logger.exception("Failed to update the corpus index for %s", f.get("id"))
+
+        self.state.record(f["id"], job.md5, data.get("_openai_file_id"))
+        with self._rows_lock:
+            self.rows.append((job.idx, f["name"], f["id"], job.md5[:10] + "…", job.html))
+
+        self._say(job, "done", "green")
+        logger.info("Done processing %s", f.get("name"))
+        self.slots.release(True)
+        return job
+
+    # ---------- driver ----------
+
+    def run(self, files: Iterable[Dict[str, Any]]) -> List[tuple]:
+        """Feed `files` through the stages; returns summary rows (name, id, md5, html) in listing order."""
+        w = self.workers
+        queues = [queue.Queue(maxsize=w.queue_size) for _ in range(5)]
+        specs = [("download", self.download, w.download), ("extract", self.extract, w.extract),
+                 ("llm", self.llm, w.llm), ("rank", self.rank, 1), ("render", self.render, w.render)]
+        stages = []
+        for i, (name, fn, n) in enumerate(specs):
+            outbox = queues[i + 1] if i + 1 < len(queues) else None
+            if name == "rank":
+                # One worker, so reports that finish extraction close together share a request.
+                stages.append(_GroupStage(name, fn, n, queues[i], outbox, self,
+                                          linger=self.s.rank_linger_s, full=self._rank_full))
+            else:
+                stages.append(_Stage(name, fn, n, queues[i], outbox, self))
+        for a, b in zip(stages, stages[1:]):
+            a.next = b
+        for st in stages:
+            st.start()
+
+        try:
+            for idx, f in enumerate(files, start=1):
+                self.console.print(f"[cyan]Found file {idx}: {f['name']} ({f['id']})[/cyan]")
+                logger.info("Found file %s (%s) index=%d", f.get("name"), f.get("id"), idx)
+                # Drive usually lists md5Checksum: unchanged files are skipped without downloading.
+                listed_md5 = f.get("md5Checksum")
+                if listed_md5 and self.state.already_processed(f["id"], listed_md5):
+                    self.console.print(f"[yellow]  -> {f['name']}: already processed, skipping[/yellow]")
+                    logger.info("Skipping already processed file %s (listing md5)", f.get("id"))
+                    with self._rows_lock:
+                        self.skipped.append(f["id"])
+                    continue
+                if not self.slots.acquire():
+                    break
+                with self._rows_lock:
+                    self.upstream += 1
+                queues[0].put(Job(idx=idx, meta=f))
+            else:
+                self.exhausted = True
+        finally:
+            self._feeding_done = True
+            for _ in range(stages[0].workers):
+                queues[0].put(_STOP)
+            for st in stages:
+                for t in st.threads:
+                    t.join()
+            self.state.flush()
+
+        return [r[1:] for r in sorted(self.rows)]
+
+    @property
+    def complete(self) -> bool:
+        """True when every listed file was handled successfully (safe to advance a Drive page token)."""
+        return self.exhausted and self.failed == 0 and self.batched == 0
+
+
+__all__ = ["IngestPipeline", "StageWorkers", "Job"]
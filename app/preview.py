@@ -1,11 +1,14 @@
 # app/preview.py
 from pathlib import Path
 import fitz  # PyMuPDF
+from .assets import ASSET, Encoding, fit_zoom, save_pixmap
+from .document import PdfSource, borrow
 
-def first_page_png(pdf_path: str, out_dir: str, file_id: str, dpi: int = 144) -> str | None:
+def first_page_png(pdf: PdfSource, out_dir: str, file_id: str, dpi: int = 144,
+                   encoding: Encoding = ASSET) -> str | None:
     """
-    Render page 1 of PDF to PNG and return a path RELATIVE to the HTML (./out).
-    Example returned value: "assets/<file_id>_page1.png"
+    Render page 1 of PDF (at `dpi`, or smaller to fit `encoding.max_px`) and return a path RELATIVE to the HTML (./out).
+    Example returned value: "assets/<file_id>_page1.webp"
     """
     try:
         out_root = Path(out_dir)
@@ -14,16 +17,13 @@ def first_page_png(pdf_path: str, out_dir: str, file_id: str, dpi: int = 144) ->
         img_dir = out_root / "assets"
         img_dir.mkdir(parents=True, exist_ok=True)
 
-        abs_png = img_dir / f"{file_id}_page1.png"
-
-        doc = fitz.open(pdf_path)
-        if doc.page_count == 0:
-            return None
-        page = doc.load_page(0)
-        zoom = dpi / 72.0
-        pix = page.get_pixmap(matrix=fitz.Matrix(zoom, zoom), alpha=False)
-        pix.save(abs_png.as_posix())
-        doc.close()
+        with borrow(pdf) as session:
+            if session.page_count == 0:
+                return None
+            page = session.page(0)
+            zoom = fit_zoom(page.rect, dpi / 72.0, encoding.max_px)
+            pix = page.get_pixmap(matrix=fitz.Matrix(zoom, zoom), alpha=False)
+            abs_png = save_pixmap(pix, img_dir / f"{file_id}_page1", encoding)
 
         # Return RELATIVE path for use in <img src="..."> inside the HTML in ./out/
         rel_png = Path("assets") / abs_png.name
@@ -1,8 +1,10 @@
 from __future__ import annotations
-import json, base64, logging, os, time
-from typing import List, Dict, Any
-from openai import OpenAI
+import json, logging, os, time, uuid
+from typing import List, Dict, Any, Optional, Tuple
 from .candidates import Candidate
+from .llm import LLMClient, get_client
+from .response_cache import ResponseCache, request_key
+from .text import estimate_tokens
 
 logger = logging.getLogger("market_lense.rank")
 
@@ -12,42 +14,162 @@ RANK_SCHEMA_HINT = """
 Никаких лишних ключей/комментариев.
 """
 
-def rank_candidates_text_only(cands: List[Candidate], model: str, api_key: str) -> List[Dict[str, Any]]:
-    client = OpenAI(api_key=api_key)
-    rows = [{
-        "id": c.id, "type": c.kind, "page": c.page,
+MULTI_HINT = """
+Кандидаты взяты из нескольких отчётов: id имеет вид "<отчёт>/<кандидат>".
+Оценивай каждый отчёт отдельно и верни все id без изменений.
+"""
+
+def _rows(cands: List[Candidate], prefix: str = "") -> List[Dict[str, Any]]:
+    return [{
+        "id": prefix + c.id, "type": c.kind, "page": c.page,
         "meta": c.meta or {},
         "title_or_caption": (c.caption or "")[:300],
         "table_preview": c.preview_text[:400] if c.kind=="table" else ""
     } for c in cands]
+
+def _body(rows: List[Dict[str, Any]], model: str, multi: bool = False) -> Dict[str, Any]:
     prompt = (
         "Задача: выбрать самые интересные графики/таблицы (0-100). "
-        "Критерии: проценты/динамика/KPI/сильные инсайты. " + RANK_SCHEMA_HINT
+        "Критерии: проценты/динамика/KPI/сильные инсайты. " + RANK_SCHEMA_HINT + (MULTI_HINT if multi else "")
     )
-    resp = client.chat.completions.create(
-        model=model,  # e.g. gpt-4.1-mini
-        messages=[
-            {"role":"system","content":"Ты продуктовый аналитик. Отвечай только валидным JSON."},
-            {"role":"user","content": prompt},
-            {"role":"user","content": json.dumps(rows, ensure_ascii=False)}
-        ],
-        response_format={"type":"json_object"},
-        temperature=1,
-    )
-    content = resp.choices[0].message.content
+    messages = [
+        {"role":"system","content":"Ты продуктовый аналитик. Отвечай только валидным JSON."},
+        {"role":"user","content": prompt},
+        {"role":"user","content": json.dumps(rows, ensure_ascii=False)}
+    ]
+    return {
+        "model": model,  # e.g. gpt-4.1-mini
+        "messages": messages,
+        "response_format": {"type":"json_object"},
+        "temperature": 1,
+    }
 
-    # Save raw model response for debugging/inspection
+def rank_request(cands: List[Candidate], model: str) -> Dict[str, Any]:
+    """Chat Completions body for ranking one report's candidates (interactive or Batch API)."""
+    return _body(_rows(cands), model)
+
+def rank_tokens(cands: List[Candidate]) -> int:
+    """Approximate prompt tokens one report's candidates add to a ranking request."""
+    return estimate_tokens(json.dumps(_rows(cands), ensure_ascii=False))
+
+def pack_reports(reports: List[Tuple[str, List[Candidate]]], token_budget: int) -> List[List[Tuple[str, List[Candidate]]]]:
+    """Group reports, in order, so each group's candidates fit in `token_budget` (a bigger report goes alone)."""
+    packs, cur, used = [], [], 0
+    for key, cands in reports:
+        cost = rank_tokens(cands)
+        if cur and used + cost > token_budget:
+            packs.append(cur)
+            cur, used = [], 0
+        cur.append((key, cands))
+        used += cost
+    if cur:
+        packs.append(cur)
+    return packs
+
+def rank_cache_key(body: Dict[str, Any]) -> str:
+    return request_key("rank", body["model"], body["temperature"], body["messages"], response_format="json_object")
+
+def _save_debug(content: str, debug_dir: Optional[str]) -> None:
+    """Keep the raw model response for inspection; names are unique across threads and processes."""
+    if not debug_dir:
+        return
     try:
-        dbg_dir = os.path.join(os.getcwd(), "debug")
-        os.makedirs(dbg_dir, exist_ok=True)
-        ts = time.strftime("%Y%m%d-%H%M%S")
-        fname = f"rank_raw_{ts}.txt"
-        path = os.path.join(dbg_dir, fname)
-        with open(path, "w", encoding="utf-8") as fh:
+        os.makedirs(debug_dir, exist_ok=True)
+        fname = f"rank_raw_{time.strftime('%Y%m%d-%H%M%S')}_{os.getpid()}_{uuid.uuid4().hex[:8]}.txt"
+        path = os.path.join(debug_dir, fname)
+        with open(path, "x", encoding="utf-8") as fh:
             fh.write(content)
         logger.info("Saved raw ranking response to %s", path)
     except Exception:
         logger.exception("Failed to write debug ranking response file")
+
+def rank_candidates_text_only(cands: List[Candidate], model: str, api_key: str,
+                              cache: Optional[ResponseCache] = None,
+                              client: Optional[LLMClient] = None,
+                              debug_dir: Optional[str] = None) -> List[Dict[str, Any]]:
+    body = rank_request(cands, model)
+    key = rank_cache_key(body) if cache else None
+    cached = cache.get(key) if cache else None
+    if cached is not None:
+        try:
+            return parse_ranking(cached)
+        except Exception:
+            cache.discard(key)
+
+    client = client or get_client(api_key)
+    resp = client.chat(**body)
+    content = resp.choices[0].message.content
+
+    _save_debug(content, debug_dir)
+
+    ranked = parse_ranking(content)
+    if cache:
+        cache.put(key, content, kind="rank", model=model)
+    return ranked
+
+def rank_reports(reports: Dict[str, List[Candidate]], model: str, api_key: str,
+                 cache: Optional[ResponseCache] = None,
+                 client: Optional[LLMClient] = None,
+                 token_budget: int = 6000,
+                 debug_dir: Optional[str] = None) -> Dict[str, List[Dict[str, Any]]]:
+    """
+    Rank several reports' candidates with as few requests as `token_budget` allows. Candidate IDs are
+    sent as "<report key>/<id>" and split back per report. Reports missing from the result (failed
+    request, or no scores returned for them) should be treated as not ranked.
+    """
+    out: Dict[str, List[Dict[str, Any]]] = {}
+    todo = []
+    for key, cands in reports.items():
+        single_key = rank_cache_key(rank_request(cands, model)) if cache else None
+        cached = cache.get(single_key) if cache else None
+        if cached is not None:
+            try:
+                out[key] = parse_ranking(cached)
+                continue
+            except Exception:
+                cache.discard(single_key)
+        todo.append((key, cands))
+
+    for pack in pack_reports(todo, token_budget):
+        if len(pack) == 1:
+            key, cands = pack[0]
+            try:
+                out[key] = rank_candidates_text_only(cands, model, api_key, cache=cache, client=client, debug_dir=debug_dir)
+            except Exception:
+                logger.exception("Ranking failed for %s", key)
+            continue
+
+        rows = [r for key, cands in pack for r in _rows(cands, key + "/")]
+        try:
+            client = client or get_client(api_key)
+            resp = client.chat(**_body(rows, model, multi=True))
+            content = resp.choices[0].message.content
+            _save_debug(content, debug_dir)
+            ranked = parse_ranking(content)
+        except Exception:
+            logger.exception("Ranking failed for %s", ", ".join(k for k, _ in pack))
+            continue
+
+        split: Dict[str, List[Dict[str, Any]]] = {key: [] for key, _ in pack}
+        for row in ranked:
+            if not isinstance(row, dict):
+                continue
+            key, sep, cid = str(row.get("id", "")).partition("/")
+            if sep and key in split:
+                split[key].append({**row, "id": cid})
+        for key, cands in pack:
+            if not split[key]:
+                logger.warning("Ranking response had no scores for %s", key)
+                continue
+            out[key] = split[key]
+            if cache:
+                # Stored under the single-report key, so later runs hit it however the reports were packed.
+                cache.put(rank_cache_key(rank_request(cands, model)), json.dumps({"results": split[key]}, ensure_ascii=False),
+                          kind="rank", model=model)
+        logger.info("Ranked %d reports (%d candidates) in one request", len(pack), len(rows))
+    return out
+
+def parse_ranking(content: str) -> List[Dict[str, Any]]:
     try:
         parsed = json.loads(content)
     except Exception:
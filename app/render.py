@@ -1,14 +1,41 @@
-from jinja2 import Environment, FileSystemLoader, select_autoescape
+from jinja2 import Environment, FileSystemBytecodeCache, FileSystemLoader, select_autoescape
+import hashlib
+import json
 from pathlib import Path
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Iterator, List, Optional, Tuple
+from .assets import owned_by, write_atomic
 from .util import slugify
 
-def jinja_env() -> Environment:
+TEMPLATES_DIR = "./templates"
+
+def jinja_env(bytecode_cache: Optional[str] = None) -> Environment:
+    cache = None
+    if bytecode_cache:
+        Path(bytecode_cache).mkdir(parents=True, exist_ok=True)
+        cache = FileSystemBytecodeCache(bytecode_cache)
     return Environment(
-        loader=FileSystemLoader("./templates"),
-        autoescape=select_autoescape(["html", "xml"])
+        loader=FileSystemLoader(TEMPLATES_DIR),
+        autoescape=select_autoescape(["html", "xml"]),
+        bytecode_cache=cache,
     )
 
+def template_hash(root: str = TEMPLATES_DIR) -> str:
+    """Digest of every template file, so partials and macros count as template changes too."""
+    h = hashlib.sha256()
+    for p in sorted(Path(root).rglob("*")):
+        if p.is_file():
+            h.update(p.relative_to(root).as_posix().encode() + b"\0" + p.read_bytes() + b"\0")
+    return h.hexdigest()[:16]
+
+def report_payload(data: Dict[str, Any], doc_name: str, preview_png: Optional[str],
+                   ranked: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Everything a report page is rendered from: normalized analysis (with image paths), preview and ranking."""
+    return {"data": data, "doc_name": doc_name, "preview_png": preview_png, "ranked": ranked}
+
+def payload_hash(payload: Dict[str, Any]) -> str:
+    raw = json.dumps(payload, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()[:16]
+
 def render_html(env, data: Dict[str, Any], doc_name: str, file_id: str, out_dir: str, preview_png: Optional[str] = None) -> str:
     html = env.get_template("report.html.j2").render(
         data=data,
@@ -18,5 +45,58 @@ def render_html(env, data: Dict[str, Any], doc_name: str, file_id: str, out_dir:
         preview_png=preview_png,
     )
     out_path = Path(out_dir) / f"{file_id}_{slugify(doc_name)}.html"
-    out_path.write_text(html, encoding="utf-8")
+    write_atomic(out_path, html.encode("utf-8"))
     return str(out_path)
+
+def own_images(file_id: str, data: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    `data` without crop paths that aren't this report's. Payloads stored before crops were kept per
+    report point at shared slices/<candidate id> files, which another report may have overwritten.
+    """
+    gallery = data.get("_figure_gallery") or []
+    own = [p for p in gallery if owned_by(p, file_id)]
+    if own == gallery:
+        return data
+    data = {k: v for k, v in data.items() if k not in ("_figure_gallery", "_figure_top")}
+    if own:
+        data.update(_figure_gallery=own, _figure_top=own[0])
+    return data
+
+def render_payload(env, file_id: str, payload: Dict[str, Any], out_dir: str) -> str:
+    return render_html(env, own_images(file_id, payload["data"]), payload["doc_name"], file_id, out_dir,
+                       preview_png=payload.get("preview_png"))
+
+# ---------- bulk re-render (process pool) ----------
+
+_worker_env: Optional[Environment] = None
+
+def _render_chunk(items: List[Tuple[str, str]], out_dir: str, bytecode_cache: Optional[str]) -> List[Tuple[str, Optional[str], Optional[str]]]:
+    # Process-pool entry point; the environment (and its compiled templates) lives as long as the worker.
+    global _worker_env
+    if _worker_env is None:
+        _worker_env = jinja_env(bytecode_cache)
+    out = []
+    for file_id, payload in items:
+        try:
+            out.append((file_id, render_payload(_worker_env, file_id, json.loads(payload), out_dir), None))
+        except Exception as e:
+            out.append((file_id, None, f"{type(e).__name__}: {e}"))
+    return out
+
+def render_many(items: List[Tuple[str, str]], out_dir: str, processes: int = 1, bytecode_cache: Optional[str] = None,
+                chunk: int = 25) -> Iterator[Tuple[str, Optional[str], Optional[str]]]:
+    """
+    Render (file_id, payload JSON) pairs; yields (file_id, html_path, error) as chunks finish.
+    With processes > 1 the work runs in the shared spawn pool.
+    """
+    chunks = [items[i:i + chunk] for i in range(0, len(items), chunk)]
+    if processes <= 1 or len(chunks) <= 1:
+        for c in chunks:
+            yield from _render_chunk(c, out_dir, bytecode_cache)
+        return
+    from concurrent.futures import as_completed
+    from .parallel import get_pool
+    pool = get_pool(processes)
+    futs = [pool.submit(_render_chunk, c, out_dir, bytecode_cache) for c in chunks]
+    for f in as_completed(futs):
+        yield from f.result()
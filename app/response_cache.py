@@ -0,0 +1,140 @@
+from __future__ import annotations
+import hashlib
+import json
+import logging
+import os
+from pathlib import Path
+import re
+import tempfile
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+from . import metrics
+
+logger = logging.getLogger("market_lense.response_cache")
+
+_CREATED_RX = re.compile(rb'"created":\s*(\d+)')
+
+
+def request_key(kind: str, model: str, temperature: float, messages: List[Dict[str, Any]], **extra: Any) -> str:
+    """Content address of a completion: exact prompt/messages, model, temperature and any extra request knobs."""
+    blob = json.dumps(
+        {"kind": kind, "model": model, "temperature": temperature, "messages": messages, **extra},
+        ensure_ascii=False, sort_keys=True, separators=(",", ":"),
+    )
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """
+    On-disk cache of raw model completions, one JSON file per request key under `root/<kk>/<key>.json`.
+    Entries written more than `max_age_s` ago (their `created` field) are ignored and deleted, however
+    often they are hit; `prune()` also trims the least recently used entries (by mtime, refreshed on
+    every hit) until the directory fits in `max_bytes`.
+    """
+
+    PRUNE_EVERY = 50  # puts between automatic prunes
+
+    def __init__(self, root: str, max_bytes: int = 200 * 1024 * 1024, max_age_s: float = 30 * 86400):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.max_age_s = max_age_s
+        self._puts = 0
+        self._lock = threading.Lock()
+
+    def _path(self, key: str) -> Path:
+        return self.root / key[:2] / f"{key}.json"
+
+    def get(self, key: str) -> Optional[str]:
+        p = self._path(key)
+        try:
+            entry = json.loads(p.read_text(encoding="utf-8"))
+            if self.max_age_s and time.time() - entry.get("created", 0) > self.max_age_s:
+                p.unlink(missing_ok=True)
+                return None
+            os.utime(p)  # LRU: a hit counts as a use
+        except (OSError, ValueError):
+            return None
+        logger.info("Response cache hit %s (%s)", key[:12], entry.get("kind"))
+        metrics.add(cache_hits=1)
+        return entry.get("content")
+
+    def put(self, key: str, content: str, kind: str = "", model: str = "") -> None:
+        p = self._path(key)
+        p.parent.mkdir(parents=True, exist_ok=True)
+        entry = {"kind": kind, "model": model, "created": int(time.time()), "content": content}
+        fd, tmp = tempfile.mkstemp(dir=p.parent, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as fh:
+                json.dump(entry, fh, ensure_ascii=False)
+            os.replace(tmp, p)
+        except Exception:
+            Path(tmp).unlink(missing_ok=True)
+            raise
+        with self._lock:
+            self._puts += 1
+            due = self._puts % self.PRUNE_EVERY == 0
+        if due:
+            self.prune()
+
+    def discard(self, key: str) -> None:
+        self._path(key).unlink(missing_ok=True)
+
+    def _entries(self):
+        for p in self.root.glob("*/*.json"):
+            try:
+                yield p, p.stat()
+            except OSError:
+                continue
+
+    @staticmethod
+    def _created(p: Path, st: os.stat_result) -> float:
+        # put() writes "created" before the content, so the head of the file is enough.
+        try:
+            with open(p, "rb") as fh:
+                m = _CREATED_RX.search(fh.read(512))
+        except OSError:
+            return st.st_mtime
+        return int(m.group(1)) if m else st.st_mtime
+
+    def _expired(self, p: Path, st: os.stat_result, now: float) -> bool:
+        # mtime is bumped by hits but never precedes `created`, so an old mtime settles it without reading.
+        return bool(self.max_age_s) and (now - st.st_mtime > self.max_age_s
+                                         or now - self._created(p, st) > self.max_age_s)
+
+    def stats(self) -> Dict[str, int]:
+        n = size = 0
+        for _, st in self._entries():
+            n += 1; size += st.st_size
+        return {"entries": n, "bytes": size}
+
+    def prune(self) -> int:
+        """Drop expired entries, then oldest-used ones until under max_bytes. Returns entries removed."""
+        now = time.time()
+        live, removed, total = [], 0, 0
+        for p, st in self._entries():
+            if self._expired(p, st, now):
+                p.unlink(missing_ok=True); removed += 1
+                continue
+            live.append((st.st_mtime, st.st_size, p))
+            total += st.st_size
+        if self.max_bytes and total > self.max_bytes:
+            for _, size, p in sorted(live, key=lambda e: e[0]):
+                p.unlink(missing_ok=True); removed += 1
+                total -= size
+                if total <= self.max_bytes:
+                    break
+        if removed:
+            logger.info("Pruned %d response cache entries", removed)
+        return removed
+
+    def clear(self) -> int:
+        removed = 0
+        for p, _ in list(self._entries()):
+            p.unlink(missing_ok=True); removed += 1
+        return removed
+
+
+__all__ = ["ResponseCache", "request_key"]
@@ -1,5 +1,11 @@
+import json
 import sqlite3
-from typing import Optional, Tuple
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+# Per-report checkpoints, in pipeline order.
+STAGES = ("text", "candidates", "preview", "figure", "analysis", "ranks", "crops", "render")
 
 DDL = """
 CREATE TABLE IF NOT EXISTS processed (
@@ -8,30 +14,391 @@ CREATE TABLE IF NOT EXISTS processed (
   processed_at INTEGER NOT NULL,
   openai_file_id TEXT
 );
+CREATE TABLE IF NOT EXISTS stages (
+  file_id TEXT NOT NULL,
+  md5 TEXT NOT NULL,
+  stage TEXT NOT NULL,
+  status TEXT NOT NULL,           -- done | failed | pending (waiting on a Batch API result)
+  output TEXT,                    -- JSON (stage output, or the error message)
+  updated_at INTEGER NOT NULL,
+  PRIMARY KEY (file_id, md5, stage)
+);
+CREATE TABLE IF NOT EXISTS reports (
+  file_id TEXT PRIMARY KEY,
+  md5 TEXT NOT NULL,
+  name TEXT NOT NULL,
+  payload TEXT NOT NULL,          -- JSON render context (render.report_payload)
+  payload_hash TEXT NOT NULL,
+  render_key TEXT,                -- payload_hash:template_hash the HTML was last rendered from
+  html_path TEXT,
+  updated_at INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS index_entries (
+  file_id TEXT PRIMARY KEY,
+  seq INTEGER NOT NULL UNIQUE,    -- first-indexed order; the index shard is seq / shard size
+  entry TEXT NOT NULL,            -- JSON search-manifest entry
+  updated_at INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS jobs (
+  file_id TEXT PRIMARY KEY,
+  rev TEXT NOT NULL,              -- md5Checksum (or v<version>) of the revision to process
+  meta TEXT NOT NULL,             -- JSON Drive listing entry
+  status TEXT NOT NULL,           -- queued | running | failed (done jobs are deleted)
+  attempts INTEGER NOT NULL,
+  error TEXT,
+  due_at INTEGER NOT NULL,        -- not claimed before this (retry backoff)
+  enqueued_at INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS jobs_due ON jobs(status, due_at);
+CREATE TABLE IF NOT EXISTS drive_tokens (
+  folder_id TEXT PRIMARY KEY,
+  page_token TEXT NOT NULL,
+  updated_at INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS pdf_cache (
+  path TEXT PRIMARY KEY,
+  file_id TEXT NOT NULL,
+  md5 TEXT,
+  size INTEGER NOT NULL,
+  last_access INTEGER NOT NULL,
+  added_at INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS pdf_cache_lru ON pdf_cache(last_access);
+CREATE TABLE IF NOT EXISTS pdf_cache_pins (
+  path TEXT NOT NULL,
+  owner TEXT NOT NULL,
+  pinned_at INTEGER NOT NULL,
+  PRIMARY KEY (path, owner)
+);
 """
 
 class State:
-    def __init__(self, path: str):
-        self.conn = sqlite3.connect(path)
-        self.conn.execute(DDL)
+    """
+    One connection shared by the ingest pipeline's worker threads; every access goes through `lock`.
+    The DB runs in WAL mode and routine writes are committed in batches (every `commit_every`
+    writes or `commit_interval` seconds, whichever comes first); call `flush()` before exiting.
+    Writes other processes must see right away (cache pins, page tokens) commit immediately.
+    """
+
+    def __init__(self, path: str, commit_every: int = 64, commit_interval: float = 1.0):
+        self.conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self.lock = threading.RLock()
+        self.commit_every = commit_every
+        self.commit_interval = commit_interval
+        self._pending = 0
+        self._last_commit = time.monotonic()
+        self._timer: Optional[threading.Timer] = None
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(DDL)
         self.conn.commit()
 
+    # ---------- commits ----------
+
+    def _commit(self, now: bool = False) -> None:
+        with self.lock:
+            self._pending += 1
+            if now or self._pending >= self.commit_every or time.monotonic() - self._last_commit >= self.commit_interval:
+                self.flush()
+            elif self._timer is None:
+                # Don't hold the write lock open while the pipeline is busy elsewhere.
+                self._timer = threading.Timer(self.commit_interval, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+
+    def flush(self) -> None:
+        with self.lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            if self.conn.in_transaction:
+                self.conn.commit()
+            self._pending = 0
+            self._last_commit = time.monotonic()
+
+    def close(self) -> None:
+        self.flush()
+        with self.lock:
+            self.conn.close()
+
     def already_processed(self, file_id: str, md5: str) -> bool:
-        cur = self.conn.execute(
-            "SELECT 1 FROM processed WHERE file_id=? AND md5=?", (file_id, md5)
-        )
-        return cur.fetchone() is not None
+        with self.lock:
+            cur = self.conn.execute(
+                "SELECT 1 FROM processed WHERE file_id=? AND md5=?", (file_id, md5)
+            )
+            return cur.fetchone() is not None
 
     def record(self, file_id: str, md5: str, openai_file_id: Optional[str]):
-        self.conn.execute(
-            "INSERT OR REPLACE INTO processed(file_id, md5, processed_at, openai_file_id) "
-            "VALUES(?, ?, strftime('%s','now'), ?)",
-            (file_id, md5, openai_file_id),
-        )
-        self.conn.commit()
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO processed(file_id, md5, processed_at, openai_file_id) "
+                "VALUES(?, ?, strftime('%s','now'), ?)",
+                (file_id, md5, openai_file_id),
+            )
+            # Checkpoints of older revisions can never be resumed.
+            self.conn.execute("DELETE FROM stages WHERE file_id=? AND md5<>?", (file_id, md5))
+            self._commit()
 
     def get(self, file_id: str) -> Optional[Tuple[str, str, int, Optional[str]]]:
-        cur = self.conn.execute(
-            "SELECT file_id, md5, processed_at, openai_file_id FROM processed WHERE file_id=?", (file_id,)
-        )
-        return cur.fetchone()
+        with self.lock:
+            cur = self.conn.execute(
+                "SELECT file_id, md5, processed_at, openai_file_id FROM processed WHERE file_id=?", (file_id,)
+            )
+            return cur.fetchone()
+
+    # ---------- stage checkpoints ----------
+
+    def stage_done(self, file_id: str, md5: str, stage: str, output: Any = None, durable: bool = False) -> None:
+        """Checkpoint a finished stage; `durable` commits at once (use it for outputs that cost money to redo)."""
+        self._put_stage(file_id, md5, stage, "done", json.dumps(output, ensure_ascii=False), durable)
+
+    def stage_failed(self, file_id: str, md5: str, stage: str, error: str) -> None:
+        self._put_stage(file_id, md5, stage, "failed", json.dumps(error, ensure_ascii=False), False)
+
+    def stage_pending(self, file_id: str, md5: str, stage: str, info: Any) -> None:
+        self._put_stage(file_id, md5, stage, "pending", json.dumps(info, ensure_ascii=False), False)
+
+    def _put_stage(self, file_id: str, md5: str, stage: str, status: str, output: str, durable: bool) -> None:
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO stages(file_id, md5, stage, status, output, updated_at) "
+                "VALUES(?, ?, ?, ?, ?, strftime('%s','now'))",
+                (file_id, md5, stage, status, output),
+            )
+            self._commit(now=durable)
+
+    def stages(self, file_id: str, md5: str) -> Dict[str, Tuple[str, Any]]:
+        """{stage: (status, output)} for one revision of a file."""
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT stage, status, output FROM stages WHERE file_id=? AND md5=?", (file_id, md5)
+            ).fetchall()
+        return {stage: (status, json.loads(out) if out is not None else None) for stage, status, out in rows}
+
+    def status_counts(self) -> Dict[str, Any]:
+        """
+        Totals for `status`: processed files, and revisions with checkpoints but no finished report,
+        split into failed (some stage failed), awaiting a Batch API result, and interrupted.
+        """
+        with self.lock:
+            processed, last = self.conn.execute("SELECT COUNT(*), MAX(processed_at) FROM processed").fetchone()
+            rows = self.conn.execute(
+                "SELECT SUM(failed > 0), SUM(failed = 0 AND waiting > 0), SUM(failed = 0 AND waiting = 0) FROM ("
+                "  SELECT SUM(s.status = 'failed') AS failed, SUM(s.status = 'pending') AS waiting FROM stages s"
+                "  WHERE NOT EXISTS (SELECT 1 FROM processed p WHERE p.file_id = s.file_id AND p.md5 = s.md5)"
+                "  GROUP BY s.file_id, s.md5)"
+            ).fetchone()
+            reports = self.conn.execute("SELECT COUNT(*) FROM reports").fetchone()[0]
+        failed, batch, interrupted = (n or 0 for n in rows)
+        return {"processed": processed, "last_processed_at": last, "failed": failed, "awaiting_batch": batch,
+                "interrupted": interrupted, "reports": reports}
+
+    def clear_stages(self, file_id: str, md5: Optional[str] = None) -> None:
+        with self.lock:
+            if md5 is None:
+                self.conn.execute("DELETE FROM stages WHERE file_id=?", (file_id,))
+            else:
+                self.conn.execute("DELETE FROM stages WHERE file_id=? AND md5=?", (file_id, md5))
+            self._commit()
+
+    # ---------- stored reports (re-rendered by `render-all`) ----------
+
+    def save_report(self, file_id: str, md5: str, name: str, payload: Any, payload_hash: str,
+                    render_key: Optional[str], html_path: Optional[str]) -> None:
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO reports(file_id, md5, name, payload, payload_hash, render_key, html_path, updated_at) "
+                "VALUES(?, ?, ?, ?, ?, ?, ?, strftime('%s','now'))",
+                (file_id, md5, name, json.dumps(payload, ensure_ascii=False), payload_hash, render_key, html_path),
+            )
+            self._commit()
+
+    def reports(self) -> List[Tuple[str, str, str, str, str, Optional[str], Optional[str]]]:
+        """(file_id, md5, name, payload JSON, payload_hash, render_key, html_path) for every stored report."""
+        with self.lock:
+            return self.conn.execute(
+                "SELECT file_id, md5, name, payload, payload_hash, render_key, html_path FROM reports ORDER BY file_id"
+            ).fetchall()
+
+    def report_rendered(self, file_id: str, render_key: str, html_path: str) -> None:
+        with self.lock:
+            self.conn.execute(
+                "UPDATE reports SET render_key=?, html_path=?, updated_at=strftime('%s','now') WHERE file_id=?",
+                (render_key, html_path, file_id),
+            )
+            self._commit()
+
+    def index_put(self, file_id: str, entry: Dict[str, Any]) -> Tuple[int, bool]:
+        """Store a manifest entry; returns (seq, is_new). A report keeps its seq when updated."""
+        with self.lock:
+            row = self.conn.execute("SELECT seq FROM index_entries WHERE file_id=?", (file_id,)).fetchone()
+            if row:
+                seq = row[0]
+            else:
+                seq = self.conn.execute("SELECT COALESCE(MAX(seq), -1) + 1 FROM index_entries").fetchone()[0]
+            self.conn.execute(
+                "INSERT OR REPLACE INTO index_entries(file_id, seq, entry, updated_at) VALUES(?, ?, ?, strftime('%s','now'))",
+                (file_id, seq, json.dumps(entry, ensure_ascii=False)),
+            )
+            self._commit()
+            return seq, row is None
+
+    def index_range(self, lo: int, hi: int) -> List[Dict[str, Any]]:
+        """Entries with lo <= seq < hi, newest first."""
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT entry FROM index_entries WHERE seq>=? AND seq<? ORDER BY seq DESC", (lo, hi)
+            ).fetchall()
+        return [json.loads(r[0]) for r in rows]
+
+    def index_size(self) -> int:
+        """One past the highest seq (seqs are never reused, so this is also the entry count)."""
+        with self.lock:
+            return self.conn.execute("SELECT COALESCE(MAX(seq), -1) + 1 FROM index_entries").fetchone()[0]
+
+    # ---------- job queue (`watch`) ----------
+
+    @staticmethod
+    def job_rev(meta: Dict[str, Any]) -> str:
+        return meta.get("md5Checksum") or (f"v{meta['version']}" if meta.get("version") else "")
+
+    def job_enqueue(self, files: Iterable[Dict[str, Any]]) -> int:
+        """
+        Queue listed files (one row per file; a newer revision replaces the queued one). A file being
+        processed keeps running and is queued again when it finishes. Committed before returning.
+        """
+        n = 0
+        with self.lock:
+            for f in files:
+                self.conn.execute(
+                    "INSERT INTO jobs(file_id, rev, meta, status, attempts, error, due_at, enqueued_at) "
+                    "VALUES(?, ?, ?, 'queued', 0, NULL, 0, strftime('%s','now')) "
+                    "ON CONFLICT(file_id) DO UPDATE SET meta=excluded.meta, rev=excluded.rev, "
+                    "  status=CASE WHEN jobs.status='running' THEN 'running' "
+                    "              WHEN jobs.status='failed' AND jobs.rev=excluded.rev THEN 'failed' ELSE 'queued' END, "
+                    "  attempts=CASE WHEN jobs.rev=excluded.rev THEN jobs.attempts ELSE 0 END, "
+                    "  due_at=CASE WHEN jobs.rev=excluded.rev THEN jobs.due_at ELSE 0 END",
+                    (f["id"], self.job_rev(f), json.dumps(f, ensure_ascii=False)),
+                )
+                n += 1
+            self._commit(now=True)
+        return n
+
+    def job_claim(self, limit: int) -> List[Dict[str, Any]]:
+        """Mark up to `limit` due jobs running, oldest first; returns their listing entries."""
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT file_id, meta FROM jobs WHERE status='queued' AND due_at<=strftime('%s','now') "
+                "ORDER BY enqueued_at, rowid LIMIT ?", (limit,)
+            ).fetchall()
+            self.conn.executemany("UPDATE jobs SET status='running', attempts=attempts+1 WHERE file_id=?",
+                                  [(r[0],) for r in rows])
+            self._commit(now=True)
+        return [json.loads(r[1]) for r in rows]
+
+    def job_done(self, file_id: str, rev: str) -> None:
+        with self.lock:
+            self.conn.execute("DELETE FROM jobs WHERE file_id=? AND rev=?", (file_id, rev))
+            # Still there: a newer revision was listed while this one ran.
+            self.conn.execute("UPDATE jobs SET status='queued', attempts=0 WHERE file_id=? AND status='running'", (file_id,))
+            self._commit()
+
+    def job_failed(self, file_id: str, rev: str, error: str, max_attempts: int, retry_s: float) -> None:
+        """Retry later with exponential backoff, or park as failed after `max_attempts`."""
+        with self.lock:
+            self.conn.execute(
+                "UPDATE jobs SET error=?, "
+                "  status=CASE WHEN rev=? AND attempts>=? THEN 'failed' ELSE 'queued' END, "
+                "  due_at=CASE WHEN rev=? THEN strftime('%s','now') + ? * (1 << (attempts - 1)) ELSE 0 END, "
+                "  attempts=CASE WHEN rev=? THEN attempts ELSE 0 END "
+                "WHERE file_id=? AND status='running'",
+                (error, rev, max_attempts, rev, int(retry_s), rev, file_id),
+            )
+            self._commit()
+
+    def job_release(self, file_ids: Iterable[str]) -> None:
+        """Put claimed jobs that never started back in the queue (not counted as an attempt)."""
+        with self.lock:
+            self.conn.executemany(
+                "UPDATE jobs SET status='queued', attempts=MAX(attempts-1, 0) WHERE file_id=? AND status='running'",
+                [(i,) for i in file_ids],
+            )
+            self._commit(now=True)
+
+    def job_recover(self) -> int:
+        """Requeue jobs left running by a process that died; their stage checkpoints are resumed."""
+        with self.lock:
+            n = self.conn.execute("UPDATE jobs SET status='queued' WHERE status='running'").rowcount
+            self._commit(now=True)
+        return n
+
+    def job_revs(self) -> Dict[str, str]:
+        """file_id -> revision of every job row (queued, running or parked)."""
+        with self.lock:
+            return dict(self.conn.execute("SELECT file_id, rev FROM jobs").fetchall())
+
+    def job_counts(self) -> Dict[str, int]:
+        with self.lock:
+            rows = self.conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+        return {"queued": 0, "running": 0, "failed": 0, **dict(rows)}
+
+    def get_page_token(self, folder_id: str) -> Optional[str]:
+        with self.lock:
+            row = self.conn.execute("SELECT page_token FROM drive_tokens WHERE folder_id=?", (folder_id,)).fetchone()
+            return row[0] if row else None
+
+    def set_page_token(self, folder_id: str, token: str) -> None:
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO drive_tokens(folder_id, page_token, updated_at) "
+                "VALUES(?, ?, strftime('%s','now'))",
+                (folder_id, token),
+            )
+            self._commit(now=True)
+
+    # ---------- PDF cache manifest (policy lives in pdf_cache.PdfCache) ----------
+
+    def cache_touch(self, path: str, file_id: str, md5: Optional[str], size: int, at: Optional[int] = None) -> None:
+        with self.lock:
+            self.conn.execute(
+                "INSERT INTO pdf_cache(path, file_id, md5, size, last_access, added_at) "
+                "VALUES(?, ?, ?, ?, COALESCE(?, strftime('%s','now')), strftime('%s','now')) "
+                "ON CONFLICT(path) DO UPDATE SET md5=COALESCE(excluded.md5, md5), size=excluded.size, "
+                "last_access=excluded.last_access",
+                (path, file_id, md5, size, at),
+            )
+            self._commit()
+
+    def cache_entries(self) -> List[Tuple[str, str, Optional[str], int, int]]:
+        """(path, file_id, md5, size, last_access), least recently used first."""
+        with self.lock:
+            return self.conn.execute(
+                "SELECT path, file_id, md5, size, last_access FROM pdf_cache ORDER BY last_access, path"
+            ).fetchall()
+
+    def cache_forget(self, paths: Iterable[str]) -> None:
+        with self.lock:
+            self.conn.executemany("DELETE FROM pdf_cache WHERE path=?", [(p,) for p in paths])
+            self._commit()
+
+    def cache_pin(self, path: str, owner: str) -> None:
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO pdf_cache_pins(path, owner, pinned_at) VALUES(?, ?, strftime('%s','now'))",
+                (path, owner),
+            )
+            self._commit(now=True)
+
+    def cache_unpin(self, path: str, owner: str) -> None:
+        with self.lock:
+            self.conn.execute("DELETE FROM pdf_cache_pins WHERE path=? AND owner=?", (path, owner))
+            self._commit(now=True)
+
+    def cache_pins(self) -> List[Tuple[str, str, int]]:
+        with self.lock:
+            return self.conn.execute("SELECT path, owner, pinned_at FROM pdf_cache_pins").fetchall()
+
+    def cache_drop_pins(self, owners: Iterable[str]) -> None:
+        with self.lock:
+            self.conn.executemany("DELETE FROM pdf_cache_pins WHERE owner=?", [(o,) for o in owners])
+            self._commit(now=True)
@@ -0,0 +1,144 @@
+from __future__ import annotations
+from collections import Counter
+from dataclasses import dataclass
+import logging
+import math
+import re
+from typing import List, Set
+
+from .config import ANALYZE_TOKEN_BUDGET
+from .document import PdfSource, borrow
+
+logger = logging.getLogger("market_lense.text")
+
+_WS_RX = re.compile(r"\s+")
+_DIGITS_RX = re.compile(r"\d+")
+_PAGE_NO_RX = re.compile(r"^(page\s*)?\d{1,4}(\s*(/|of)\s*\d{1,4})?$", re.I)
+_LEADER_RX = re.compile(r"(\.{3,}|…+)\s*\d{1,3}$")
+_ENDS_NUM_RX = re.compile(r"\s\d{1,3}$")
+_CONTENTS_RX = re.compile(r"^(table of )?contents$|^содержание$|^оглавление$", re.I)
+_WORD_RX = re.compile(r"\w+", re.U)
+_NUMERIC_RX = re.compile(r"\d[\d.,]*%?|\$\d")
+_URL_RX = re.compile(r"(https?://[^\s)>\]]+|www\.[^\s)>\]]+)", re.I)
+
+# A line that shows up on at least this share of pages (and on 3+ pages) is header/footer boilerplate.
+REPEAT_FRAC = 0.3
+COVER_CHARS = 300       # the cover's title block is kept even when the page itself doesn't make the cut
+MAX_URLS = 5
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate: ~4 chars/token for ASCII, ~2 for other scripts (Cyrillic, CJK)."""
+    ascii_chars = sum(1 for ch in text if ord(ch) < 128)
+    return ascii_chars // 4 + (len(text) - ascii_chars) // 2 + 1
+
+
+def _lines(page_text: str) -> List[str]:
+    out = []
+    for raw in page_text.splitlines():
+        line = _WS_RX.sub(" ", raw).strip()
+        if line:
+            out.append(line)
+    return out
+
+
+def _key(line: str) -> str:
+    # Page numbers and dates change between otherwise identical running headers.
+    return _DIGITS_RX.sub("#", line.lower())
+
+
+def boilerplate(pages: List[List[str]]) -> Set[str]:
+    """Normalised lines repeated across pages (running headers/footers, confidentiality notes...)."""
+    if len(pages) < 3:
+        return set()
+    seen = Counter()
+    for lines in pages:
+        seen.update({_key(l) for l in lines})
+    need = max(3, math.ceil(REPEAT_FRAC * len(pages)))
+    return {k for k, n in seen.items() if n >= need}
+
+
+@dataclass
+class PageText:
+    pno: int
+    text: str
+    tokens: int
+    score: float
+
+
+def _is_toc(lines: List[str]) -> bool:
+    if len(lines) < 5:
+        return False
+    if sum(1 for l in lines if _LEADER_RX.search(l)) / len(lines) > 0.3:
+        return True
+    titled = any(_CONTENTS_RX.match(l) for l in lines[:3])
+    return titled and sum(1 for l in lines if _ENDS_NUM_RX.search(l)) / len(lines) > 0.5
+
+
+def _score(lines: List[str]) -> float:
+    """Information density: long, varied, number-rich pages score high; covers, dividers and TOCs low."""
+    if not lines:
+        return 0.0
+    if _is_toc(lines):
+        return 0.0
+    words = [w.lower() for l in lines for w in _WORD_RX.findall(l)]
+    if len(words) < 25:
+        return 0.1 * len(words) / 25
+    numeric = sum(len(_NUMERIC_RX.findall(l)) for l in lines)
+    variety = len(set(words)) / len(words)
+    return math.log1p(len(words)) * (0.5 + variety) * (1 + min(1.0, 5 * numeric / len(words)))
+
+
+def page_texts(pdf: PdfSource, max_pages: int = 300) -> List[PageText]:
+    """Cleaned, scored text of the first `max_pages` pages (boilerplate lines and page numbers removed)."""
+    with borrow(pdf) as session:
+        raw = [_lines(session.page_text(i)) for i in range(min(session.page_count, max_pages))]
+    repeated = boilerplate(raw)
+    out = []
+    for pno, lines in enumerate(raw):
+        kept = [l for l in lines if _key(l) not in repeated and not _PAGE_NO_RX.match(l)]
+        text = "\n".join(kept)
+        out.append(PageText(pno, text, estimate_tokens(text), _score(kept)))
+    return out
+
+
+def budgeted_text(pdf: PdfSource, token_budget: int = ANALYZE_TOKEN_BUDGET, max_pages: int = 300) -> str:
+    """
+    Text for the analyze prompt: the densest pages that fit in `token_budget`, in reading order,
+    plus the cover's title block and any URLs found in the document (for the `source` field).
+    """
+    pages = page_texts(pdf, max_pages)
+    if not pages:
+        return ""
+    urls = list(dict.fromkeys(m.rstrip(".,;") for p in pages for m in _URL_RX.findall(p.text)))[:MAX_URLS]
+    header = pages[0].text[:COVER_CHARS]
+    tail = ("[Links]\n" + "\n".join(urls)) if urls else ""
+    left = token_budget - estimate_tokens(header) - estimate_tokens(tail)
+
+    chosen = {}
+    for p in sorted(pages, key=lambda p: (-p.score, p.pno)):
+        if p.score <= 0 or left <= 0:
+            break
+        cost = p.tokens + 4   # "[Page N]" marker
+        if cost <= left:
+            chosen[p.pno] = p.text
+            left -= cost
+        elif left > 200:
+            # Partial page rather than leaving a large part of the budget unused.
+            cut = left * 4
+            while cut and estimate_tokens(p.text[:cut]) > left - 4:
+                cut = int(cut * 0.8)
+            chosen[p.pno] = p.text[:cut]
+            left = 0
+
+    parts = [header] if header and 0 not in chosen else []
+    parts += [f"[Page {pno + 1}]\n{chosen[pno]}" for pno in sorted(chosen)]
+    if tail:
+        parts.append(tail)
+    text = "\n\n".join(parts)
+    logger.info("Analyze text: %d/%d pages, ~%d tokens (budget %d)",
+                len(chosen), len(pages), estimate_tokens(text), token_budget)
+    return text
+
+
+__all__ = ["budgeted_text", "page_texts", "boilerplate", "estimate_tokens", "PageText"]
@@ -1,3 +1,4 @@
+import random
 import re
 import time
 from functools import wraps
@@ -9,14 +10,15 @@ def slugify(value: str) -> str:
     v = v.strip("-")
     return v[:120] or "report"
 
-def retry(backoffs=(1, 2, 4, 8), exceptions=(Exception,)):
+def retry(backoffs=(1, 2, 4, 8), exceptions=(Exception,), jitter=0.5):
+    # Each delay is scaled by a random factor in [1 - jitter, 1 + jitter] so parallel callers don't retry in lockstep.
     def deco(fn):
         @wraps(fn)
         def wrap(*a, **kw):
             last = None
             for n, delay in enumerate((0,)+tuple(backoffs)):
                 try:
-                    if delay: time.sleep(delay)
+                    if delay: time.sleep(delay * random.uniform(1 - jitter, 1 + jitter))
                     return fn(*a, **kw)
                 except exceptions as e:
                     last = e
@@ -0,0 +1,171 @@
+from __future__ import annotations
+import logging
+import signal
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from rich.console import Console
+
+from .config import Settings
+from .download import DownloadManager
+from .drive import incremental_listing
+from .index import CorpusIndex
+from .llm import LLMClient
+from .pdf_cache import PdfCache
+from .pipeline import IngestPipeline, StageWorkers
+from .response_cache import ResponseCache
+from .state import State
+
+logger = logging.getLogger("market_lense.watch")
+
+
+class Watcher:
+    """
+    Resident ingest: polls Drive every `interval` seconds, queues new and changed PDFs in the state
+    DB's `jobs` table and feeds them through a fresh pipeline `batch` at a time. The download manager,
+    OpenAI client, Jinja env and caches are built once here and shared by every cycle's pipeline,
+    so their connections stay warm.
+
+    The queue is durable: the Changes token only moves forward once every listed file is queued,
+    and jobs a dead process left running are requeued on start (their stage checkpoints resume).
+    At most `queue_max` jobs wait at a time; files that don't fit are listed again next poll. SIGTERM/SIGINT stop new jobs from starting
+    and return once the ones in flight are finished; a second signal exits at once.
+    """
+
+    def __init__(self, s: Settings, state: State, drive, folder_id: str, env, drive_factory: Callable[[], Any],
+                 workers: StageWorkers, interval: float, batch: int, queue_max: int, max_attempts: int,
+                 retry_s: float, console: Optional[Console] = None, prom_file: Optional[str] = None,
+                 llm: Optional[LLMClient] = None, cache: Optional[ResponseCache] = None,
+                 pdf_cache: Optional[PdfCache] = None, index: Optional[CorpusIndex] = None):
+        self.s, self.state, self.drive, self.folder_id = s, state, drive, folder_id
+        self.env, self.workers = env, workers
+        self.downloads = DownloadManager.from_settings(s, drive_factory, workers.download)
+        self.llm = llm or LLMClient.from_settings(s)
+        self.cache, self.pdf_cache, self.index = cache, pdf_cache, index
+        self.interval, self.batch, self.queue_max = interval, max(1, batch), queue_max
+        self.max_attempts, self.retry_s = max_attempts, retry_s
+        self.console = console or Console()
+        self.prom_file = prom_file
+        self.stop = threading.Event()
+        self.processed = self.failed = 0
+
+    # ---------- signals ----------
+
+    def _on_signal(self, signum, frame) -> None:
+        # Only the first signal is graceful; the default handlers take the next one.
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        signal.signal(signal.SIGINT, signal.default_int_handler)
+        self.console.print(f"[yellow]{signal.Signals(signum).name}: finishing jobs in flight (signal again to exit now)[/yellow]")
+        logger.info("Received %s; draining", signal.Signals(signum).name)
+        self.stop.set()
+
+    # ---------- one cycle ----------
+
+    def pipeline(self, limit: int) -> IngestPipeline:
+        return IngestPipeline(
+            self.s, self.state, self.env, drive_factory=self.downloads.client_factory, workers=self.workers,
+            limit=limit, console=self.console, cache=self.cache, llm=self.llm, pdf_cache=self.pdf_cache,
+            index=self.index, downloads=self.downloads,
+        )
+
+    def poll(self) -> int:
+        """Queue files changed since the last poll; returns how many were queued."""
+        queued = self.state.job_counts()["queued"]
+        if queued >= self.queue_max:
+            logger.info("%d job(s) queued (max %d); not polling Drive", queued, self.queue_max)
+            return 0
+        files, new_token = incremental_listing(self.drive, self.folder_id, self.state.get_page_token(self.folder_id))
+        # Revisions already in the queue are skipped, so a capped enqueue makes progress down the listing.
+        jobs = self.state.job_revs()
+        fresh = [f for f in files
+                 if jobs.get(f["id"]) != State.job_rev(f)
+                 and not (f.get("md5Checksum") and self.state.already_processed(f["id"], f["md5Checksum"]))]
+        room = self.queue_max - queued
+        n = self.state.job_enqueue(fresh[:room])
+        if len(fresh) <= room:
+            self.state.set_page_token(self.folder_id, new_token)
+        else:
+            # Keep the old token so the files left out are listed (and queued) again.
+            logger.info("Queue full: %d listed file(s) left for a later poll", len(fresh) - room)
+        if n:
+            self.console.print(f"[cyan]Queued {n} new or changed PDF(s).[/cyan]")
+        return n
+
+    def _error(self, f: Dict[str, Any]) -> str:
+        md5 = f.get("md5Checksum")
+        if md5:
+            for status, out in self.state.stages(f["id"], md5).values():
+                if status == "failed":
+                    return str(out)
+        return "failed"
+
+    def work(self) -> bool:
+        """Run one batch of due jobs; False when there were none."""
+        jobs = self.state.job_claim(self.batch)
+        if not jobs:
+            return False
+        started: List[Dict[str, Any]] = []
+
+        def feed():
+            for f in jobs:
+                if self.stop.is_set():
+                    return
+                started.append(f)
+                yield f
+
+        pipeline = self.pipeline(len(jobs))
+        try:
+            rows = pipeline.run(feed())
+        finally:
+            self.state.job_release(f["id"] for f in jobs[len(started):])
+        # Skipped files were already processed (the pipeline checks the downloaded md5 when none was listed).
+        done = {r[1] for r in rows} | set(pipeline.skipped)
+        for f in started:
+            rev = State.job_rev(f)
+            if f["id"] in done:
+                self.state.job_done(f["id"], rev)
+                self.processed += 1
+            else:
+                self.state.job_failed(f["id"], rev, self._error(f), self.max_attempts, self.retry_s)
+                self.failed += 1
+        self.state.flush()
+        if self.prom_file:
+            counts = self.state.job_counts()
+            pipeline.metrics.write_prometheus(self.prom_file, extra={
+                "reports_processed": ("Reports rendered by the last watch cycle.", len(rows)),
+                "reports_failed": ("Reports that failed in the last watch cycle.", pipeline.failed),
+                "jobs_queued": ("Jobs waiting in the watch queue.", counts["queued"]),
+                "jobs_failed": ("Jobs parked after too many failed attempts.", counts["failed"]),
+            })
+        return True
+
+    # ---------- driver ----------
+
+    def run(self) -> None:
+        old = {sig: signal.signal(sig, self._on_signal) for sig in (signal.SIGTERM, signal.SIGINT)}
+        n = self.state.job_recover()
+        if n:
+            logger.info("Requeued %d job(s) left running by a previous process", n)
+        self.console.print(f"[cyan]Watching folder {self.folder_id} every {self.interval:g}s "
+                           "(SIGTERM or Ctrl-C to stop).[/cyan]")
+        next_poll = 0.0
+        try:
+            while not self.stop.is_set():
+                if time.monotonic() >= next_poll:
+                    try:
+                        self.poll()
+                    except Exception:
+                        # Drive hiccups must not take the daemon down; the next poll retries.
+                        logger.exception("Polling Drive failed")
+                    next_poll = time.monotonic() + self.interval
+                if not self.work():
+                    self.stop.wait(max(0.0, next_poll - time.monotonic()))
+        finally:
+            for sig, handler in old.items():
+                signal.signal(sig, handler)
+            self.state.flush()
+        self.console.print(f"[green]Stopped: {self.processed} report(s) processed, {self.failed} failed.[/green]")
+
+
+__all__ = ["Watcher"]
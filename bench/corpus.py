@@ -0,0 +1,187 @@
+"""
+Deterministic synthetic PDF corpus for the extraction benchmarks, generated offline with PyMuPDF.
+
+Document kinds:
+  text    dense multi-column text, no images
+  images  several raster charts per page, mixed sizes, some CMYK JPEGs
+  logos   the same header/footer logo on every page (one shared xref) plus one captioned chart
+  tables  ruled (vector-drawn) numeric tables
+  deck    a mix of the above, page by page
+
+Files are cached under bench/corpus/ and rebuilt when GEN_VERSION changes.
+"""
+from __future__ import annotations
+from functools import lru_cache
+import io
+import json
+from pathlib import Path
+import random
+from typing import Dict, List, Tuple
+
+import fitz
+from PIL import Image, ImageDraw
+
+GEN_VERSION = 1
+CORPUS_DIR = Path(__file__).parent / "corpus"
+
+# (kind, pages)
+FULL = [("text", 120), ("images", 40), ("logos", 60), ("tables", 30), ("deck", 10), ("deck", 500)]
+QUICK = [("text", 20), ("images", 10), ("logos", 10), ("tables", 10), ("deck", 10)]
+
+PAGE_W, PAGE_H = 612, 792   # US letter, points
+
+_WORDS = (
+    "market growth revenue users retention cohort mobile share analysis quarter forecast survey "
+    "respondents adoption spend installs conversion region segment platform average median "
+    "increase decline year trend channel budget brand audience engagement session benchmark"
+).split()
+
+
+def doc_name(kind: str, pages: int) -> str:
+    return f"{kind}-{pages}"
+
+
+def _sentence(rng: random.Random, n: int) -> str:
+    words = [rng.choice(_WORDS) for _ in range(n)]
+    if rng.random() < 0.3:
+        words.insert(rng.randrange(len(words)), f"{rng.randint(2, 98)}%")
+    return " ".join(words).capitalize() + "."
+
+
+def _paragraph(rng: random.Random, sentences: int) -> str:
+    return " ".join(_sentence(rng, rng.randint(8, 18)) for _ in range(sentences))
+
+
+@lru_cache(maxsize=64)
+def _chart_image(w: int, h: int, seed: int, fmt: str = "png") -> bytes:
+    """Bar chart raster; 'jpeg-cmyk' mimics print-quality decks."""
+    rng = random.Random(seed)
+    img = Image.new("RGB", (w, h), "white")
+    d = ImageDraw.Draw(img)
+    bars = rng.randint(4, 12)
+    bw = w // (bars * 2 + 1)
+    for i in range(bars):
+        bh = int(h * rng.uniform(0.15, 0.85))
+        x0 = bw * (2 * i + 1)
+        colour = tuple(rng.randint(30, 220) for _ in range(3))
+        d.rectangle([x0, h - bh, x0 + bw, h - 2], fill=colour)
+    for y in range(0, h, max(8, h // 10)):
+        d.line([0, y, w, y], fill=(225, 225, 225))
+    buf = io.BytesIO()
+    if fmt == "jpeg-cmyk":
+        img.convert("CMYK").save(buf, format="JPEG", quality=85)
+    else:
+        img.save(buf, format="PNG")
+    return buf.getvalue()
+
+
+@lru_cache(maxsize=1)
+def _logo() -> bytes:
+    img = Image.new("RGB", (360, 90), (20, 60, 140))
+    ImageDraw.Draw(img).ellipse([10, 10, 80, 80], fill=(250, 180, 0))
+    buf = io.BytesIO()
+    img.save(buf, format="PNG")
+    return buf.getvalue()
+
+
+def _text_page(page: fitz.Page, rng: random.Random) -> None:
+    page.insert_text((54, 60), _sentence(rng, 6), fontsize=16)
+    col_w = (PAGE_W - 54 * 2 - 18) / 2
+    for c in range(2):
+        x0 = 54 + c * (col_w + 18)
+        page.insert_textbox(fitz.Rect(x0, 84, x0 + col_w, PAGE_H - 60), _paragraph(rng, 30), fontsize=8.5)
+
+
+def _images_page(page: fitz.Page, rng: random.Random, pno: int) -> None:
+    page.insert_text((54, 130), _sentence(rng, 5), fontsize=12)
+    slots = [fitz.Rect(54, 150, 300, 330), fitz.Rect(312, 150, 558, 330),
+             fitz.Rect(54, 360, 300, 540), fitz.Rect(312, 360, 558, 540),
+             fitz.Rect(54, 570, 558, 680)]
+    for i, r in enumerate(slots[: rng.randint(3, len(slots))]):
+        big = rng.random() < 0.3
+        w, h = (2400, 1600) if big else (900, 600)
+        fmt = "jpeg-cmyk" if rng.random() < 0.25 else "png"
+        page.insert_image(r, stream=_chart_image(w, h, (pno * 7 + i) % 16, fmt))
+        page.insert_text((r.x0, r.y1 + 11), f"Figure {pno + 1}.{i + 1}: {_sentence(rng, 5)}", fontsize=8)
+
+
+def _logos_page(page: fitz.Page, rng: random.Random, pno: int, logo_xref: Dict[str, int]) -> None:
+    # Same image object on every page, as real decks do with header/footer branding.
+    for r in (fitz.Rect(54, 20, 198, 56), fitz.Rect(PAGE_W - 198, PAGE_H - 56, PAGE_W - 54, PAGE_H - 20)):
+        if "xref" in logo_xref:
+            page.insert_image(r, xref=logo_xref["xref"])
+        else:
+            logo_xref["xref"] = page.insert_image(r, stream=_logo())
+    page.insert_text((54, 120), _sentence(rng, 6), fontsize=14)
+    chart = fitz.Rect(90, 180, 522, 468)
+    page.insert_image(chart, stream=_chart_image(1200, 800, pno % 16))
+    page.insert_text((90, 486), f"Figure {pno + 1}: {_sentence(rng, 6)}", fontsize=9)
+    page.insert_textbox(fitz.Rect(54, 510, PAGE_W - 54, PAGE_H - 80), _paragraph(rng, 8), fontsize=9)
+
+
+def _tables_page(page: fitz.Page, rng: random.Random) -> None:
+    page.insert_text((54, 70), _sentence(rng, 6), fontsize=14)
+    y = 100
+    for _ in range(rng.randint(1, 2)):
+        rows, cols = rng.randint(6, 14), rng.randint(3, 6)
+        cw, rh = (PAGE_W - 108) / cols, 18
+        for r in range(rows + 1):
+            page.draw_line((54, y + r * rh), (PAGE_W - 54, y + r * rh), width=0.6)
+        for c in range(cols + 1):
+            page.draw_line((54 + c * cw, y), (54 + c * cw, y + rows * rh), width=0.6)
+        for r in range(rows):
+            for c in range(cols):
+                txt = rng.choice(_WORDS).title() if c == 0 or r == 0 else f"{rng.uniform(0, 100):.1f}%"
+                page.insert_text((58 + c * cw, y + r * rh + 13), txt, fontsize=8)
+        y += rows * rh + 40
+        page.insert_text((54, y - 24), f"Table: {_sentence(rng, 5)}", fontsize=8)
+    if y < PAGE_H - 140:
+        page.insert_textbox(fitz.Rect(54, y, PAGE_W - 54, PAGE_H - 60), _paragraph(rng, 6), fontsize=9)
+
+
+def build(kind: str, pages: int, path: Path) -> None:
+    doc = fitz.open()
+    logo: Dict[str, int] = {}
+    for pno in range(pages):
+        rng = random.Random(f"{kind}:{pages}:{pno}")
+        page = doc.new_page(width=PAGE_W, height=PAGE_H)
+        k = kind if kind != "deck" else ("text", "images", "logos", "tables")[pno % 4]
+        if k == "text":
+            _text_page(page, rng)
+        elif k == "images":
+            _images_page(page, rng, pno)
+        elif k == "logos":
+            _logos_page(page, rng, pno, logo)
+        else:
+            _tables_page(page, rng)
+    doc.set_metadata({"title": doc_name(kind, pages), "creationDate": "", "modDate": ""})
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(path.name + ".tmp")
+    doc.save(tmp.as_posix(), garbage=3, deflate=True)
+    doc.close()
+    tmp.replace(path)
+
+
+def ensure_corpus(spec: List[Tuple[str, int]], root: Path = CORPUS_DIR) -> List[Tuple[str, Path, int]]:
+    """Generate missing/outdated documents; returns [(name, path, pages)]."""
+    stamp = root / "VERSION.json"
+    try:
+        current = json.loads(stamp.read_text())["gen_version"] == GEN_VERSION
+    except (OSError, ValueError, KeyError):
+        current = False
+    out = []
+    for kind, pages in spec:
+        name = doc_name(kind, pages)
+        path = root / f"{name}.pdf"
+        if not current or not path.exists():
+            print(f"generating {name}...", flush=True)
+            build(kind, pages, path)
+        out.append((name, path, pages))
+    root.mkdir(parents=True, exist_ok=True)
+    stamp.write_text(json.dumps({"gen_version": GEN_VERSION}))
+    return out
+
+
+if __name__ == "__main__":
+    for name, path, pages in ensure_corpus(FULL):
+        print(f"{name}: {pages} pages, {path.stat().st_size / 1e6:.1f} MB")
@@ -0,0 +1,298 @@
+"""
+Local stand-ins for the Drive v3 and OpenAI chat-completions HTTP APIs, for offline load tests.
+
+    DRIVE_API_ENDPOINT=<FakeDrive.endpoint>   OPENAI_BASE_URL=<FakeOpenAI.base_url>
+
+Only what the ingest path calls is implemented: files.list, files.get?alt=media (with Range),
+changes.getStartPageToken / changes.list and POST /v1/chat/completions. FakeDrive records
+`upload`/`modify`/`trash` calls as changes and can expire old page tokens (410). Completions
+are canned: a fixed analysis object, or scores for every candidate id in a ranking request.
+Both servers share the fault model in `Faults`.
+"""
+from __future__ import annotations
+from collections import Counter
+import hashlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import random
+import re
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlparse
+
+ANALYSIS = {
+    "tldr": "Synthetic report used by the load test.",
+    "insights": ["Revenue grew 12% year over year", "Mobile share reached 64%", "Retention is flat",
+                 "Ad spend shifted to video", "Two new regions launched"],
+    "quote": {"text": "Growth is steady.", "author": "Load test"},
+    "figure": {"title": "Revenue by quarter", "evidence": ""},
+    "commentary": "Canned completion.",
+    "source": "",
+}
+
+
+class Faults:
+    """
+    Latency and failures injected before a request is served: `latency_ms` mean (exponential) delay,
+    `error_rate` share of 500s and, every `burst_every_s` seconds, `burst_s` seconds of 429s with
+    Retry-After. Counts what it injected in `stats`.
+    """
+
+    def __init__(self, latency_ms: float = 0.0, error_rate: float = 0.0, burst_every_s: float = 0.0,
+                 burst_s: float = 0.0, seed: int = 1):
+        self.latency_ms, self.error_rate = latency_ms, error_rate
+        self.burst_every_s, self.burst_s = burst_every_s, burst_s
+        self.started = time.monotonic()
+        self.stats: Counter = Counter()
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def decide(self) -> Optional[int]:
+        """Sleep the injected latency; returns an error status to send, or None to serve normally."""
+        with self._lock:
+            self.stats["requests"] += 1
+            delay = self._rng.expovariate(1000.0 / self.latency_ms) if self.latency_ms > 0 else 0.0
+            fail = self._rng.random() < self.error_rate
+        if delay:
+            time.sleep(delay)
+        if self.burst_every_s and (time.monotonic() - self.started) % self.burst_every_s < self.burst_s:
+            with self._lock:
+                self.stats["429"] += 1
+            return 429
+        if fail:
+            with self._lock:
+                self.stats["500"] += 1
+            return 500
+        return None
+
+
+class _Server:
+    def __init__(self, handler, faults: Faults):
+        self.faults = faults
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+        self.httpd.daemon_threads = True
+        self.httpd.owner = self
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    @property
+    def port(self) -> int:
+        return self.httpd.server_address[1]
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, fmt, *args):   # keep the harness output readable
+        pass
+
+    def _send(self, status: int, body: bytes, ctype: str = "application/json", headers: Optional[Dict[str, str]] = None):
+        self.send_response(status)
+        self.send_header("Content-Type", ctype)
+        self.send_header("Content-Length", str(len(body)))
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _json(self, status: int, obj, headers: Optional[Dict[str, str]] = None):
+        self._send(status, json.dumps(obj).encode("utf-8"), headers=headers)
+
+    def _fault(self) -> bool:
+        status = self.server.owner.faults.decide()
+        if status is None:
+            return False
+        msg = "Rate limit reached" if status == 429 else "Injected server error"
+        self._json(status, {"error": {"code": status, "message": msg, "type": "fake"}},
+                   headers={"Retry-After": "1"} if status == 429 else None)
+        return True
+
+
+# ---------- Drive ----------
+
+class _DriveHandler(_Handler):
+    def do_GET(self):
+        if self._fault():
+            return
+        drive: FakeDrive = self.server.owner
+        url = urlparse(self.path)
+        q = {k: v[0] for k, v in parse_qs(url.query).items()}
+        path = url.path.rstrip("/")
+        with drive.lock:
+            if path.endswith("/changes/startPageToken"):
+                return self._json(200, {"startPageToken": drive.token(len(drive.changes))})
+            if path.endswith("/changes"):
+                return self._changes(drive, q)
+            if path.endswith("/files"):
+                return self._files(drive, q)
+        m = re.search(r"/files/([^/]+)$", path)
+        if m and q.get("alt") == "media" and m.group(1) in drive.blobs:
+            return self._media(drive.blobs[m.group(1)])
+        self._json(404, {"error": {"code": 404, "message": "not found"}})
+
+    def _files(self, drive: "FakeDrive", q: Dict[str, str]):
+        # Honours the parts of the query list_pdfs sends: folder, mime type and trashed=false.
+        query = q.get("q", "")
+        folder = re.search(r"'([^']+)' in parents", query)
+        mime = re.search(r"mimeType='([^']+)'", query)
+        rows = [f for f in drive.files.values()
+                if (not folder or folder.group(1) in f["parents"]) and (not mime or f["mimeType"] == mime.group(1))
+                and not ("trashed=false" in query and f["trashed"])]
+        start = int(q.get("pageToken") or 0)
+        size = drive.page(q)
+        body = {"files": [drive.meta(f) for f in rows[start:start + size]]}
+        if start + size < len(rows):
+            body["nextPageToken"] = str(start + size)
+        self._json(200, body)
+
+    def _changes(self, drive: "FakeDrive", q: Dict[str, str]):
+        epoch, _, start = (q.get("pageToken") or "").partition("-")
+        if epoch != str(drive.epoch) or not start.isdigit() or int(start) > len(drive.changes):
+            return self._json(410, {"error": {"code": 410, "message": "Invalid page token", "type": "fake"}})
+        start, size = int(start), drive.page(q)
+        body = {"changes": drive.changes[start:start + size]}
+        if start + size < len(drive.changes):
+            body["nextPageToken"] = drive.token(start + size)
+        else:
+            body["newStartPageToken"] = drive.token(len(drive.changes))
+        self._json(200, body)
+
+    def _media(self, data: bytes):
+        rng = re.match(r"bytes=(\d+)-(\d*)", self.headers.get("Range", ""))
+        if not rng:
+            return self._send(200, data, "application/pdf")
+        lo = int(rng.group(1))
+        hi = min(int(rng.group(2)) if rng.group(2) else len(data) - 1, len(data) - 1)
+        if lo >= len(data):
+            return self._send(416, b"", "application/pdf", {"Content-Range": f"bytes */{len(data)}"})
+        self._send(206, data[lo:hi + 1], "application/pdf", {"Content-Range": f"bytes {lo}-{hi}/{len(data)}"})
+
+
+class FakeDrive(_Server):
+    """
+    Serves `docs` ({name: pdf bytes}) as folder `folder_id`; use as a context manager. The initial
+    files are there before the first page token; later `upload`/`modify`/`trash` calls show up in
+    the changes feed. `expire_tokens()` makes every token issued so far answer 410 Gone.
+    `page_size` caps list pages below what the client asks for, to exercise paging.
+    """
+
+    def __init__(self, docs: Dict[str, bytes], faults: Optional[Faults] = None, folder_id: str = "load",
+                 page_size: Optional[int] = None):
+        super().__init__(_DriveHandler, faults or Faults())
+        self.folder_id, self.page_size = folder_id, page_size
+        self.blobs: Dict[str, bytes] = {}
+        self.files: Dict[str, Dict] = {}
+        self.changes: List[Dict] = []
+        self.epoch = 0                  # tokens are "<epoch>-<change index>"; expiring bumps the epoch
+        self.lock = threading.Lock()
+        for name, data in docs.items():
+            self._put(f"load{len(self.files):05d}", name, data)
+
+    def _put(self, fid: str, name: str, data: bytes, folder: Optional[str] = None, mime: str = "application/pdf") -> Dict:
+        old = self.files.get(fid)
+        f = self.files[fid] = {
+            "id": fid, "name": name, "mimeType": mime, "parents": [folder or self.folder_id], "trashed": False,
+            "modifiedTime": time.strftime("%Y-%m-%dT%H:%M:%S.000Z", time.gmtime()),
+            "md5Checksum": hashlib.md5(data).hexdigest(), "version": str(int(old["version"]) + 1 if old else 1),
+        }
+        self.blobs[fid] = data
+        return f
+
+    def _change(self, f: Dict) -> None:
+        self.changes.append({"fileId": f["id"], "removed": False, "file": dict(f)})
+
+    def upload(self, name: str, data: bytes, folder: Optional[str] = None, mime: str = "application/pdf") -> str:
+        with self.lock:
+            f = self._put(f"load{len(self.files):05d}", name, data, folder, mime)
+            self._change(f)
+            return f["id"]
+
+    def modify(self, fid: str, data: bytes) -> None:
+        with self.lock:
+            old = self.files[fid]
+            self._change(self._put(fid, old["name"], data, old["parents"][0], old["mimeType"]))
+
+    def trash(self, fid: str) -> None:
+        with self.lock:
+            self.files[fid]["trashed"] = True
+            self._change(self.files[fid])
+
+    def expire_tokens(self) -> None:
+        with self.lock:
+            self.epoch += 1
+
+    def token(self, index: int) -> str:
+        return f"{self.epoch}-{index}"
+
+    def page(self, q: Dict[str, str]) -> int:
+        size = int(q.get("pageSize") or 100)
+        return min(size, self.page_size) if self.page_size else size
+
+    @staticmethod
+    def meta(f: Dict) -> Dict[str, str]:
+        return {k: f[k] for k in ("id", "name", "modifiedTime", "md5Checksum", "version")}
+
+    @property
+    def metas(self) -> List[Dict[str, str]]:
+        return [self.meta(f) for f in self.files.values()]
+
+    @property
+    def endpoint(self) -> str:
+        return f"http://127.0.0.1:{self.port}/drive/v3/"
+
+
+# ---------- OpenAI ----------
+
+def _completion(request: Dict) -> Tuple[str, int]:
+    messages = request.get("messages") or []
+    last = (messages[-1].get("content") if messages else "") or ""
+    if isinstance(last, str) and last.lstrip().startswith("["):
+        # A ranking request: score every candidate id it lists.
+        try:
+            rows = json.loads(last)
+            return json.dumps({"results": [{"id": r["id"], "score": 90 - i % 60} for i, r in enumerate(rows)]}), len(last)
+        except (ValueError, KeyError, TypeError):
+            pass
+    prompt = sum(len(m.get("content") or "") for m in messages if isinstance(m.get("content"), str))
+    return json.dumps(ANALYSIS), prompt
+
+
+class _OpenAIHandler(_Handler):
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        if self._fault():
+            return
+        if not urlparse(self.path).path.rstrip("/").endswith("/chat/completions"):
+            return self._json(404, {"error": {"code": 404, "message": "not found"}})
+        request = json.loads(body or b"{}")
+        content, prompt_chars = _completion(request)
+        owner: FakeOpenAI = self.server.owner
+        with owner.lock:
+            owner.calls += 1
+            n = owner.calls
+        self._json(200, {
+            "id": f"chatcmpl-fake-{n}", "object": "chat.completion", "created": int(time.time()),
+            "model": request.get("model", "fake"),
+            "choices": [{"index": 0, "finish_reason": "stop", "message": {"role": "assistant", "content": content}}],
+            "usage": {"prompt_tokens": prompt_chars // 4, "completion_tokens": len(content) // 4,
+                      "total_tokens": prompt_chars // 4 + len(content) // 4},
+        })
+
+
+class FakeOpenAI(_Server):
+    def __init__(self, faults: Optional[Faults] = None):
+        super().__init__(_OpenAIHandler, faults or Faults())
+        self.calls = 0
+        self.lock = threading.Lock()
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.port}/v1"
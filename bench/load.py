@@ -0,0 +1,187 @@
+"""
+End-to-end ingest load test against local stand-in Drive and OpenAI servers (bench/fakes.py).
+
+    python -m bench.load                                  # 20 reports, no faults
+    python -m bench.load --docs 100 --workers 8 --openai-latency-ms 800
+    python -m bench.load --error-rate 0.05 --burst-every 20 --burst-s 3
+    python -m bench.load --save-baseline                  # record reports/min as the baseline
+
+The real `ingest` command runs in a subprocess with DRIVE_API_ENDPOINT and OPENAI_BASE_URL
+pointed at the fakes, so nothing leaves the machine. The folder is the synthetic bench corpus,
+copied until `--docs` files with distinct checksums exist. Reported: reports/minute, per-stage
+latency from the run's --profile spans, the faults the servers injected and the client retries
+they caused. If reports are still missing after the first run, ingest is run again to check
+they recover from their checkpoints. Missing reports after that, or a throughput drop beyond
+the tolerance vs the baseline, exit with status 1.
+"""
+from __future__ import annotations
+from collections import defaultdict
+import json
+import os
+from pathlib import Path
+import platform
+import shutil
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Any, Dict, List, Optional
+
+import typer
+from rich.console import Console
+from rich.table import Table
+from rich import box
+
+from .corpus import QUICK, ensure_corpus
+from .fakes import Faults, FakeDrive, FakeOpenAI
+
+BASELINE = Path(__file__).parent / "load_baseline.json"
+ROOT = Path(__file__).resolve().parent.parent
+STAGES = ("download", "md5", "text", "candidates", "preview", "figure", "analyze", "rank", "crop", "render")
+
+console = Console()
+cli = typer.Typer(add_completion=False, help="Offline end-to-end ingest load test")
+
+
+def _folder(n: int) -> Dict[str, bytes]:
+    """`n` PDFs cycled from the quick bench corpus; a trailing comment makes every checksum distinct."""
+    corpus = ensure_corpus(QUICK)
+    blobs = [p.read_bytes() for _, p, _ in corpus]
+    return {f"{corpus[i % len(corpus)][0]}-{i:04d}.pdf": blobs[i % len(blobs)] + b"\n%load " + str(i).encode() + b"\n"
+            for i in range(n)}
+
+
+def _ingest(work: Path, env: Dict[str, str], workers: int, limit: int) -> float:
+    cmd = [sys.executable, "-m", "app.cli", "ingest", "--profile", "--no-response-cache",
+           "--workers", str(workers), "--limit", str(limit)]
+    t0 = time.perf_counter()
+    p = subprocess.run(cmd, cwd=work, env=env, capture_output=True, text=True)
+    wall = time.perf_counter() - t0
+    with open(work / "ingest.log", "a") as log:
+        log.write(p.stdout + p.stderr)
+    if p.returncode != 0:
+        console.print(f"[red]ingest exited with {p.returncode}; see {work / 'ingest.log'}[/red]")
+    return wall
+
+
+def _processed(db: Path) -> int:
+    if not db.exists():
+        return 0
+    with sqlite3.connect(db) as conn:
+        return conn.execute("SELECT COUNT(*) FROM processed").fetchone()[0]
+
+
+def _spans(metrics_dir: Path) -> Dict[str, Dict[str, Any]]:
+    by: Dict[str, List[dict]] = defaultdict(list)
+    for path in sorted(metrics_dir.glob("ingest-*.jsonl")):
+        for line in path.read_text().splitlines():
+            sp = json.loads(line)
+            by[sp["stage"]].append(sp)
+    out = {}
+    for name in [n for n in STAGES if n in by] + sorted(n for n in by if n not in STAGES):
+        spans = by[name]
+        walls = sorted(sp["wall_s"] for sp in spans)
+        out[name] = {
+            "calls": len(spans), "errors": sum(1 for sp in spans if sp.get("error")),
+            "p50_s": walls[len(walls) // 2], "p95_s": walls[min(len(walls) - 1, int(len(walls) * 0.95))],
+            "retries": sum(sp.get("retries", 0) for sp in spans),
+        }
+    return out
+
+
+@cli.command()
+def main(
+    docs: int = typer.Option(20, help="PDFs in the fake Drive folder"),
+    workers: int = typer.Option(4, help="ingest --workers"),
+    drive_latency_ms: float = typer.Option(20.0, help="Mean Drive response delay"),
+    openai_latency_ms: float = typer.Option(300.0, help="Mean completion delay"),
+    error_rate: float = typer.Option(0.0, help="Share of requests (both servers) answered with a 500"),
+    burst_every: float = typer.Option(0.0, help="Seconds between 429 bursts from the OpenAI server (0 = none)"),
+    burst_s: float = typer.Option(0.0, help="Length of each 429 burst"),
+    seed: int = typer.Option(1, help="Fault injection seed"),
+    rerun: bool = typer.Option(True, help="Run ingest again when reports are missing, to check recovery"),
+    keep: bool = typer.Option(False, help="Keep the work directory (state DB, HTML, logs)"),
+    baseline: Path = typer.Option(BASELINE, help="Baseline JSON to compare against / save to"),
+    save_baseline: bool = typer.Option(False, help="Write this run as the new baseline instead of comparing"),
+    tolerance: float = typer.Option(0.25, help="Allowed reports/min drop vs baseline (0.25 = 25%)"),
+    json_out: Optional[Path] = typer.Option(None, "--json", help="Also write the raw results here"),
+):
+    folder = _folder(docs)
+    work = Path(tempfile.mkdtemp(prefix="load-"))
+    (work / "templates").symlink_to(ROOT / "templates")
+    drive_faults = Faults(drive_latency_ms, error_rate, seed=seed)
+    openai_faults = Faults(openai_latency_ms, error_rate, burst_every, burst_s, seed=seed + 1)
+
+    with FakeDrive(folder, drive_faults) as drive, FakeOpenAI(openai_faults) as ai:
+        env = dict(os.environ)   # OPENAI_MAX_RETRIES, OPENAI_RPM, ... pass through
+        env.update(
+            PYTHONPATH=str(ROOT), GOOGLE_SERVICE_ACCOUNT_JSON="unused", GDRIVE_FOLDER_ID="load",
+            DRIVE_API_ENDPOINT=drive.endpoint, OPENAI_BASE_URL=ai.base_url, OPENAI_API_KEY="fake",
+            OUTPUT_DIR=str(work / "out"), CACHE_DIR=str(work / "cache"), STATE_DB=str(work / "state.sqlite"),
+            RESPONSE_CACHE_DIR=str(work / "responses"), METRICS_DIR=str(work / "metrics"), BATCH_DIR=str(work / "batch"),
+        )
+        console.print(f"[cyan]Ingesting {docs} PDF(s) with {workers} worker(s) in {work}...[/cyan]")
+        wall = _ingest(work, env, workers, docs)
+        first = _processed(work / "state.sqlite")
+        recovered, rerun_wall = 0, 0.0
+        if rerun and first < docs:
+            console.print(f"[yellow]{docs - first} report(s) missing; running ingest again...[/yellow]")
+            rerun_wall = _ingest(work, env, workers, docs)
+            recovered = _processed(work / "state.sqlite") - first
+        ai_calls = ai.calls
+
+    results = {
+        "docs": docs, "workers": workers, "wall_s": wall, "processed": first,
+        "reports_per_min": first / wall * 60 if wall else 0.0,
+        "missing": docs - first - recovered, "recovered": recovered, "rerun_wall_s": rerun_wall,
+        "openai_calls": ai_calls, "drive_faults": dict(drive_faults.stats), "openai_faults": dict(openai_faults.stats),
+        "stages": _spans(work / "metrics"),
+    }
+
+    table = Table(title="Stage latency", box=box.SIMPLE_HEAVY)
+    for col in ("Stage", "Calls", "Errors", "Retries", "p50 ms", "p95 ms"):
+        table.add_column(col, justify="left" if col == "Stage" else "right")
+    for name, r in results["stages"].items():
+        table.add_row(name, str(r["calls"]), str(r["errors"]), str(r["retries"]),
+                      f"{r['p50_s'] * 1000:.0f}", f"{r['p95_s'] * 1000:.0f}")
+    console.print(table)
+    console.print(f"Throughput: {first} report(s) in {wall:.1f}s = [bold]{results['reports_per_min']:.1f} reports/min[/bold]"
+                  f" ({ai_calls} model call(s))")
+    console.print(f"Injected: Drive {results['drive_faults']}, OpenAI {results['openai_faults']}")
+    if recovered or results["missing"]:
+        console.print(f"Recovery: {recovered} report(s) completed on the rerun ({rerun_wall:.1f}s), {results['missing']} still missing")
+
+    problems = []
+    if results["missing"]:
+        problems.append(f"{results['missing']} report(s) never completed (see {work / 'ingest.log'})")
+        keep = True
+    base = json.loads(baseline.read_text()) if not save_baseline and baseline.exists() else None
+    if base and base.get("docs") == docs and base.get("workers") == workers:
+        b = base["reports_per_min"]
+        results["vs_baseline"] = results["reports_per_min"] / b - 1 if b else 0.0
+        console.print(f"vs baseline: {results['vs_baseline']:+.0%} ({b:.1f} reports/min)")
+        if results["reports_per_min"] < b * (1 - tolerance):
+            problems.append(f"throughput {results['reports_per_min']:.1f} reports/min vs {b:.1f} baseline")
+    elif base:
+        console.print("[yellow]Baseline was recorded with different --docs/--workers; not comparing.[/yellow]")
+
+    record = {"created": int(time.time()), "python": sys.version.split()[0], "machine": platform.platform(),
+              "faults": {"drive_latency_ms": drive_latency_ms, "openai_latency_ms": openai_latency_ms,
+                         "error_rate": error_rate, "burst_every": burst_every, "burst_s": burst_s}, **results}
+    if json_out:
+        json_out.write_text(json.dumps(record, indent=2))
+    if save_baseline:
+        baseline.write_text(json.dumps(record, indent=2, sort_keys=True))
+        console.print(f"[green]Baseline saved to {baseline}[/green]")
+    if not keep:
+        shutil.rmtree(work, ignore_errors=True)
+    if problems:
+        console.print("[bold red]Load test problems:[/bold red]")
+        for line in problems:
+            console.print(f"[red]  {line}[/red]")
+        raise typer.Exit(1)
+
+
+if __name__ == "__main__":
+    cli()
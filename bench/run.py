@@ -0,0 +1,196 @@
+"""
+Extraction benchmarks over the synthetic corpus (bench/corpus.py).
+
+    python -m bench.run                      # full corpus, compare against bench/baseline.json
+    python -m bench.run --quick              # small documents only
+    python -m bench.run --save-baseline      # record the current numbers as the baseline
+    python -m bench.run --only charts,tables --docs deck
+
+Every (extractor, document) pair runs in a fresh spawned process, so the peak RSS reported is
+that extractor's own high-water mark. A warm-up call is excluded from the latencies. Against a
+baseline, a slower p50 or more RSS growth beyond the tolerances exits with status 1. The baseline
+is machine-specific: record it on the box that runs the comparison.
+"""
+from __future__ import annotations
+from concurrent.futures import ProcessPoolExecutor
+import json
+import multiprocessing as mp
+from pathlib import Path
+import platform
+import shutil
+import sys
+import tempfile
+import time
+from typing import Any, Dict, List, Optional
+
+import typer
+from rich.console import Console
+from rich.table import Table
+from rich import box
+
+from .corpus import FULL, GEN_VERSION, QUICK, ensure_corpus
+
+BASELINE = Path(__file__).parent / "baseline.json"
+EXTRACTORS = ("charts", "tables", "figure", "crop", "preview")
+NOISE_FLOOR_S = 0.005   # ignore p50 regressions smaller than this
+NOISE_FLOOR_MB = 10     # ...and RSS growth regressions smaller than this
+
+console = Console()
+cli = typer.Typer(add_completion=False, help="Benchmark the PDF extraction hot paths")
+
+
+def _call(extractor: str, pdf: str, out_dir: str, pages: int, processes: int, table_backend: str,
+          asset_format: str) -> int:
+    """Run one extractor once; returns how many pages of work it represents."""
+    from app.assets import ASSET, THUMB
+    from dataclasses import replace
+    asset, thumb = replace(ASSET, fmt=asset_format), replace(THUMB, fmt=asset_format)
+    if extractor == "charts":
+        from app.extract import extract_charts
+        extract_charts(pdf, str(Path(out_dir) / "thumbs"), processes=processes, thumb=thumb)
+        return pages
+    if extractor == "tables":
+        from app.extract import extract_tables
+        extract_tables(pdf, processes=processes, backend=table_backend)
+        return pages
+    if extractor == "figure":
+        from app.figure import extract_best_figure_png
+        extract_best_figure_png(pdf, out_dir, "bench", encoding=asset)
+        return pages
+    if extractor == "crop":
+        from app.crop import crop_regions
+        items = [{"id": f"crop-{p}", "page": p, "bbox": (72, 144, 540, 500)} for p in range(min(3, pages))]
+        crop_regions(pdf, out_dir, "bench", items, encoding=asset)
+        return len(items)
+    if extractor == "preview":
+        from app.preview import first_page_png
+        first_page_png(pdf, out_dir, "bench", encoding=asset)
+        return 1
+    raise ValueError(extractor)
+
+
+def _measure(extractor: str, pdf: str, pages: int, repeat: int, warmup: int, processes: int,
+             table_backend: str, asset_format: str) -> Dict[str, Any]:
+    # Runs in a fresh child process.
+    import logging
+    logging.disable(logging.INFO)
+    import app.crop, app.extract, app.figure, app.preview  # noqa: F401  (import cost is not the extractor's)
+    from app.metrics import peak_rss_bytes
+    from app.parallel import shutdown_pool
+
+    out_dir = tempfile.mkdtemp(prefix="mlbench-")
+    try:
+        rss0 = peak_rss_bytes() or 0
+        for _ in range(warmup):
+            _call(extractor, pdf, out_dir, pages, processes, table_backend, asset_format)
+        lat, work = [], pages
+        for _ in range(repeat):
+            t0 = time.perf_counter()
+            work = _call(extractor, pdf, out_dir, pages, processes, table_backend, asset_format)
+            lat.append(time.perf_counter() - t0)
+        peak = peak_rss_bytes() or 0
+        out_bytes = sum(p.stat().st_size for p in Path(out_dir).rglob("*") if p.is_file())
+    finally:
+        shutdown_pool()
+        shutil.rmtree(out_dir, ignore_errors=True)
+    lat.sort()
+    p50 = lat[len(lat) // 2]
+    return {
+        "p50_s": p50, "p95_s": lat[min(len(lat) - 1, int(len(lat) * 0.95))], "max_s": lat[-1],
+        "pages": work, "pages_per_s": work / p50 if p50 else 0.0,
+        "peak_rss_mb": peak / 1e6, "rss_grew_mb": (peak - rss0) / 1e6, "out_kb": out_bytes / 1e3,
+    }
+
+
+def _compare(results: Dict[str, Dict[str, Any]], baseline: Dict[str, Any], tol: float, mem_tol: float) -> List[str]:
+    regressions = []
+    for key, r in results.items():
+        b = baseline.get("results", {}).get(key)
+        if not b:
+            continue
+        r["vs_baseline"] = r["p50_s"] / b["p50_s"] - 1 if b["p50_s"] else 0.0
+        if r["p50_s"] > b["p50_s"] * (1 + tol) and r["p50_s"] - b["p50_s"] > NOISE_FLOOR_S:
+            regressions.append(f"{key}: p50 {r['p50_s'] * 1000:.1f} ms vs {b['p50_s'] * 1000:.1f} ms baseline "
+                               f"({r['vs_baseline']:+.0%})")
+        if r["rss_grew_mb"] > max(b["rss_grew_mb"] * (1 + mem_tol), b["rss_grew_mb"] + NOISE_FLOOR_MB):
+            regressions.append(f"{key}: RSS growth {r['rss_grew_mb']:.0f} MB vs {b['rss_grew_mb']:.0f} MB baseline")
+    return regressions
+
+
+@cli.command()
+def main(
+    quick: bool = typer.Option(False, help="Small documents only (CI smoke run)"),
+    only: str = typer.Option(",".join(EXTRACTORS), help="Comma-separated extractors to run"),
+    docs: str = typer.Option("", help="Only documents whose name contains this (e.g. 'deck-500')"),
+    repeat: int = typer.Option(5, help="Timed runs per extractor and document"),
+    warmup: int = typer.Option(1, help="Untimed runs first"),
+    processes: int = typer.Option(1, help="EXTRACT_PROCESSES for charts/tables"),
+    table_backend: str = typer.Option("pymupdf", help="TABLE_BACKEND for the tables extractor"),
+    asset_format: str = typer.Option("webp", help="ASSET_FORMAT for thumbnails, figures, crops and previews"),
+    baseline: Path = typer.Option(BASELINE, help="Baseline JSON to compare against / save to"),
+    save_baseline: bool = typer.Option(False, help="Write this run as the new baseline instead of comparing"),
+    tolerance: float = typer.Option(0.25, help="Allowed p50 slowdown vs baseline (0.25 = 25%)"),
+    mem_tolerance: float = typer.Option(0.25, help="Allowed RSS growth increase vs baseline"),
+    json_out: Optional[Path] = typer.Option(None, "--json", help="Also write the raw results here"),
+):
+    corpus = ensure_corpus(QUICK if quick else FULL)
+    corpus = [c for c in corpus if docs in c[0]]
+    extractors = [e.strip() for e in only.split(",") if e.strip()]
+    unknown = set(extractors) - set(EXTRACTORS)
+    if unknown:
+        raise typer.BadParameter(f"unknown extractor(s): {', '.join(sorted(unknown))}")
+
+    results: Dict[str, Dict[str, Any]] = {}
+    ctx = mp.get_context("spawn")
+    for ex in extractors:
+        for name, path, pages in corpus:
+            console.print(f"[cyan]{ex} / {name}...[/cyan]")
+            with ProcessPoolExecutor(1, mp_context=ctx) as pool:
+                results[f"{ex}:{name}"] = pool.submit(
+                    _measure, ex, str(path), pages, repeat, warmup, processes, table_backend, asset_format).result()
+
+    base = None
+    if not save_baseline and baseline.exists():
+        base = json.loads(baseline.read_text())
+        if base.get("gen_version") != GEN_VERSION:
+            console.print("[yellow]Baseline was recorded on a different corpus version; not comparing.[/yellow]")
+            base = None
+    regressions = _compare(results, base, tolerance, mem_tolerance) if base else []
+
+    table = Table(title="Extraction benchmarks", box=box.SIMPLE_HEAVY)
+    for col in ("Extractor", "Document", "Pages", "p50 ms", "p95 ms", "max ms", "pages/s", "Peak RSS MB", "RSS +MB", "Out KB", "vs base"):
+        table.add_column(col, justify="left" if col in ("Extractor", "Document") else "right")
+    for key, r in results.items():
+        ex, name = key.split(":", 1)
+        vs = r.get("vs_baseline")
+        table.add_row(
+            ex, name, str(r["pages"]), f"{r['p50_s'] * 1000:.1f}", f"{r['p95_s'] * 1000:.1f}", f"{r['max_s'] * 1000:.1f}",
+            f"{r['pages_per_s']:.1f}", f"{r['peak_rss_mb']:.0f}", f"{r['rss_grew_mb']:.0f}", f"{r['out_kb']:.0f}",
+            "" if vs is None else f"[{'red' if vs > tolerance else 'green'}]{vs:+.0%}[/]",
+        )
+    console.print(table)
+
+    record = {
+        "gen_version": GEN_VERSION, "created": int(time.time()), "python": sys.version.split()[0],
+        "machine": platform.platform(), "processes": processes, "table_backend": table_backend, "asset_format": asset_format, "repeat": repeat, "results": results,
+    }
+    if json_out:
+        json_out.write_text(json.dumps(record, indent=2))
+    if save_baseline:
+        # Merge so a partial run (--only/--docs/--quick) doesn't drop other entries.
+        old = json.loads(baseline.read_text()) if baseline.exists() else {}
+        if old.get("gen_version") == GEN_VERSION:
+            record["results"] = {**old.get("results", {}), **results}
+        baseline.write_text(json.dumps(record, indent=2, sort_keys=True))
+        console.print(f"[green]Baseline saved to {baseline}[/green]")
+    elif regressions:
+        console.print("[bold red]Performance regressions:[/bold red]")
+        for line in regressions:
+            console.print(f"[red]  {line}[/red]")
+        raise typer.Exit(1)
+    elif base:
+        console.print("[green]No regressions against the baseline.[/green]")
+
+
+if __name__ == "__main__":
+    cli()
@@ -0,0 +1,129 @@
+"""
+CLI start-up benchmark: wall time of short commands, each in a fresh interpreter.
+
+    python -m bench.startup                  # compare against bench/startup_baseline.json
+    python -m bench.startup --save-baseline  # record the current numbers as the baseline
+
+Commands run against a throwaway state DB and no credentials, so nothing touches Drive or the
+model. Besides timing, the run fails if a cheap command imports one of the heavy stacks
+(PyMuPDF, OpenAI, the Google client, pdfplumber, pypdf, Pillow, Jinja) at all.
+"""
+from __future__ import annotations
+import json
+import os
+from pathlib import Path
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Any, Dict, List
+
+import typer
+from rich.console import Console
+from rich.table import Table
+from rich import box
+
+BASELINE = Path(__file__).parent / "startup_baseline.json"
+ROOT = Path(__file__).resolve().parent.parent
+HEAVY = ("fitz", "pymupdf", "openai", "googleapiclient", "pdfplumber", "pypdf", "PIL", "jinja2")
+NOISE_FLOOR_S = 0.02    # ignore regressions smaller than this
+
+# name -> python code run in the child; cheap commands go through the real CLI entry point.
+COMMANDS = {
+    "python": "pass",
+    "import app.cli": "import app.cli",
+    "--help": "from app.cli import app\ntry: app(['--help'])\nexcept SystemExit as e: assert not e.code",
+    "status": "from app.cli import app\ntry: app(['status'])\nexcept SystemExit as e: assert not e.code",
+}
+# Appended to each child: report which heavy packages ended up imported.
+REPORT = "\nimport sys as _s, json as _j; print('\\n__HEAVY__' + _j.dumps([m for m in {heavy!r} if m in _s.modules]))"
+
+console = Console()
+cli = typer.Typer(add_completion=False, help="Benchmark CLI start-up time")
+
+
+def _run(code: str, env: Dict[str, str], cwd: str) -> tuple:
+    t0 = time.perf_counter()
+    p = subprocess.run([sys.executable, "-c", code + REPORT.format(heavy=HEAVY)], cwd=cwd, env=env,
+                       capture_output=True, text=True)
+    dt = time.perf_counter() - t0
+    if p.returncode != 0:
+        raise RuntimeError(f"{code!r} exited with {p.returncode}:\n{p.stderr[-2000:]}")
+    heavy = json.loads(p.stdout.rsplit("__HEAVY__", 1)[1]) if "__HEAVY__" in p.stdout else []
+    return dt, heavy
+
+
+def _measure(code: str, repeat: int, env: Dict[str, str], cwd: str) -> Dict[str, Any]:
+    _run(code, env, cwd)     # warm the OS file cache and __pycache__
+    times, heavy = [], []
+    for _ in range(repeat):
+        dt, heavy = _run(code, env, cwd)
+        times.append(dt)
+    times.sort()
+    return {"p50_s": statistics.median(times), "min_s": times[0], "max_s": times[-1], "heavy": heavy}
+
+
+def _compare(results: Dict[str, Dict[str, Any]], baseline: Dict[str, Any], tol: float) -> List[str]:
+    regressions = []
+    for key, r in results.items():
+        b = baseline.get("results", {}).get(key)
+        if not b:
+            continue
+        r["vs_baseline"] = r["p50_s"] / b["p50_s"] - 1 if b["p50_s"] else 0.0
+        if r["p50_s"] > b["p50_s"] * (1 + tol) and r["p50_s"] - b["p50_s"] > NOISE_FLOOR_S:
+            regressions.append(f"{key}: p50 {r['p50_s'] * 1000:.0f} ms vs {b['p50_s'] * 1000:.0f} ms baseline "
+                               f"({r['vs_baseline']:+.0%})")
+    return regressions
+
+
+@cli.command()
+def main(
+    repeat: int = typer.Option(10, help="Timed runs per command"),
+    baseline: Path = typer.Option(BASELINE, help="Baseline JSON to compare against / save to"),
+    save_baseline: bool = typer.Option(False, help="Write this run as the new baseline instead of comparing"),
+    tolerance: float = typer.Option(0.25, help="Allowed p50 slowdown vs baseline (0.25 = 25%)"),
+):
+    with tempfile.TemporaryDirectory(prefix="startup-") as tmp:
+        env = {k: v for k, v in os.environ.items() if k not in ("GOOGLE_SERVICE_ACCOUNT_JSON", "OPENAI_API_KEY", "GDRIVE_FOLDER_ID")}
+        env.update(PYTHONPATH=str(ROOT), STATE_DB=str(Path(tmp) / "state.sqlite"),
+                   OUTPUT_DIR=str(Path(tmp) / "out"), CACHE_DIR=str(Path(tmp) / "cache"))
+        results = {}
+        for name, code in COMMANDS.items():
+            console.print(f"[cyan]{name}...[/cyan]")
+            results[name] = _measure(code, repeat, env, tmp)
+
+    base = json.loads(baseline.read_text()) if not save_baseline and baseline.exists() else None
+    regressions = _compare(results, base, tolerance) if base else []
+    for name, r in results.items():
+        if name != "python" and r["heavy"]:
+            regressions.append(f"{name}: imported {', '.join(r['heavy'])}")
+
+    table = Table(title="CLI start-up", box=box.SIMPLE_HEAVY)
+    for col in ("Command", "p50 ms", "min ms", "max ms", "Heavy imports", "vs base"):
+        table.add_column(col, justify="left" if col in ("Command", "Heavy imports") else "right")
+    for name, r in results.items():
+        vs = r.get("vs_baseline")
+        table.add_row(
+            name, f"{r['p50_s'] * 1000:.0f}", f"{r['min_s'] * 1000:.0f}", f"{r['max_s'] * 1000:.0f}", ", ".join(r["heavy"]) or "-",
+            "" if vs is None else f"[{'red' if vs > tolerance else 'green'}]{vs:+.0%}[/]",
+        )
+    console.print(table)
+
+    if save_baseline:
+        record = {"created": int(time.time()), "python": sys.version.split()[0], "machine": platform.platform(),
+                  "repeat": repeat, "results": results}
+        baseline.write_text(json.dumps(record, indent=2, sort_keys=True))
+        console.print(f"[green]Baseline saved to {baseline}[/green]")
+    if regressions:
+        console.print("[bold red]Start-up regressions:[/bold red]")
+        for line in regressions:
+            console.print(f"[red]  {line}[/red]")
+        raise typer.Exit(1)
+    if base:
+        console.print("[green]No regressions against the baseline.[/green]")
+
+
+if __name__ == "__main__":
+    cli()
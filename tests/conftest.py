@@ -0,0 +1,71 @@
+import io
+import random
+import sys
+from pathlib import Path
+
+import fitz
+import pytest
+from PIL import Image, ImageDraw
+
+# Tests import `app` and `bench` from the repository root, as `python -m ...` does.
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from bench.fakes import FakeDrive, FakeOpenAI  # noqa: E402
+
+PATHS = {"OUTPUT_DIR": "out", "CACHE_DIR": "cache", "STATE_DB": "state.sqlite", "RESPONSE_CACHE_DIR": "responses",
+         "METRICS_DIR": "metrics", "BATCH_DIR": "batch"}
+
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    """tmp_path as the working directory, with the templates and every output/state path inside it."""
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "templates").symlink_to(ROOT / "templates")
+    for k, d in PATHS.items():
+        monkeypatch.setenv(k, str(tmp_path / d))
+    return tmp_path
+
+
+@pytest.fixture
+def services(workdir, monkeypatch):
+    """Empty fake Drive folder "load" and a fake OpenAI server, with the environment pointing at both."""
+    with FakeDrive({}) as drive, FakeOpenAI() as ai:
+        monkeypatch.setenv("DRIVE_API_ENDPOINT", drive.endpoint)
+        monkeypatch.setenv("OPENAI_BASE_URL", ai.base_url)
+        monkeypatch.setenv("GOOGLE_SERVICE_ACCOUNT_JSON", "unused")
+        monkeypatch.setenv("GDRIVE_FOLDER_ID", "load")
+        monkeypatch.setenv("OPENAI_API_KEY", "fake")
+        yield drive, ai
+
+
+def _chart(seed: int) -> bytes:
+    rng = random.Random(seed)
+    img = Image.new("RGB", (600, 400), "white")
+    d = ImageDraw.Draw(img)
+    for i in range(6):
+        h = rng.randint(60, 360)
+        d.rectangle([40 + i * 90, 400 - h, 100 + i * 90, 398], fill=tuple(rng.randint(30, 220) for _ in range(3)))
+    buf = io.BytesIO()
+    img.save(buf, format="PNG")
+    return buf.getvalue()
+
+
+@pytest.fixture
+def chart_pdf():
+    """
+    chart_pdf(seed, pages=2) -> PDF bytes with one captioned chart per page. Different seeds give
+    different pictures but the same candidate IDs ("chart-0-0", ...), as unrelated reports do.
+    """
+    def build(seed: int, pages: int = 2) -> bytes:
+        doc = fitz.open()
+        for pno in range(pages):
+            page = doc.new_page()
+            page.insert_text((72, 120), f"Report {seed}, page {pno + 1}: revenue grew year over year.", fontsize=11)
+            r = fitz.Rect(72, 200, 540, 512)
+            page.insert_image(r, stream=_chart(seed * 100 + pno))
+            page.insert_text((r.x0, r.y1 + 14), f"Figure {pno + 1}: revenue by quarter", fontsize=9)
+        data = doc.tobytes()
+        doc.close()
+        return data
+    return build
@@ -0,0 +1,36 @@
+import subprocess
+import sys
+
+from typer.testing import CliRunner
+
+from app.cli import app
+from app.state import State
+
+from conftest import ROOT
+
+HEAVY = ("openai", "googleapiclient", "fitz", "pdfplumber", "pypdf", "PIL", "jinja2")
+
+
+def test_cli_import_leaves_heavy_dependencies_unloaded():
+    code = f"import sys, app.cli; print(','.join(m for m in {HEAVY!r} if m in sys.modules))"
+    out = subprocess.run([sys.executable, "-c", code], cwd=ROOT, capture_output=True, text=True, check=True)
+    assert out.stdout.strip() == ""
+
+
+def test_status_counts_without_credentials(workdir, monkeypatch):
+    for k in ("GOOGLE_SERVICE_ACCOUNT_JSON", "GDRIVE_FOLDER_ID", "OPENAI_API_KEY"):
+        monkeypatch.delenv(k, raising=False)
+    state = State(str(workdir / "state.sqlite"))
+    state.record("a", "m1", None)
+    state.stage_done("b", "m2", "text", "")
+    state.stage_failed("b", "m2", "analysis", "boom")
+    state.stage_pending("c", "m3", "analysis", {"batch": "x"})
+    state.stage_done("d", "m4", "text", "")
+    state.close()
+
+    res = CliRunner().invoke(app, ["status"])
+    assert res.exit_code == 0, res.output
+    out = " ".join(res.output.split())
+    assert "Processed: 1 file(s)" in out
+    assert "Pending: 2 (1 awaiting Batch API results, 1 interrupted)" in out
+    assert "Failed: 1" in out
@@ -0,0 +1,62 @@
+import hashlib
+
+import pytest
+
+from app.download import ChecksumMismatch, DownloadManager, IncompleteDownload
+from app.drive import cache_path, drive_client
+from bench import fakes
+from bench.fakes import FakeDrive
+
+DATA = bytes(range(256)) * 40   # 10 KiB
+
+
+@pytest.fixture
+def drive():
+    with FakeDrive({"a.pdf": DATA}) as fake:
+        yield fake
+
+
+def _manager(fake, tmp_path, chunk=4096):
+    return DownloadManager(lambda: drive_client("", endpoint=fake.endpoint), str(tmp_path), chunk_size=chunk,
+                           num_retries=0)
+
+
+def test_ranged_download_resumes_a_partial_file(drive, tmp_path):
+    meta = drive.metas[0]
+    final = cache_path(str(tmp_path), meta)
+    part = final.with_name(final.name + ".part")
+    part.write_bytes(DATA[:5000])
+
+    path, md5 = _manager(drive, tmp_path).fetch(meta)
+    assert md5 == hashlib.md5(DATA).hexdigest() == meta["md5Checksum"]
+    assert open(path, "rb").read() == DATA and not part.exists()
+
+
+def test_checksum_mismatch_discards_the_download(drive, tmp_path):
+    meta = {**drive.metas[0], "md5Checksum": "0" * 32}
+    with pytest.raises(ChecksumMismatch):
+        _manager(drive, tmp_path).fetch(meta)
+    final = cache_path(str(tmp_path), meta)
+    assert not final.exists() and not final.with_name(final.name + ".part").exists()
+
+
+def test_short_read_without_drive_md5_keeps_the_part_to_resume(drive, tmp_path, monkeypatch):
+    meta = {k: v for k, v in drive.metas[0].items() if k != "md5Checksum"}   # e.g. a Google-native export
+    media = fakes._DriveHandler._media
+
+    def stalls(self, data):
+        if self.headers.get("Range", "").startswith("bytes=0-"):
+            return media(self, data)
+        # The connection delivers an empty 206 before the file is complete.
+        self._send(206, b"", "application/pdf", {"Content-Range": f"bytes 4096-4095/{len(data)}"})
+
+    monkeypatch.setattr(fakes._DriveHandler, "_media", stalls)
+    with pytest.raises(IncompleteDownload):
+        _manager(drive, tmp_path).fetch(meta)
+    final = cache_path(str(tmp_path), meta)
+    part = final.with_name(final.name + ".part")
+    assert not final.exists() and part.read_bytes() == DATA[:4096]
+
+    monkeypatch.setattr(fakes._DriveHandler, "_media", media)
+    path, md5 = _manager(drive, tmp_path).fetch(meta)
+    assert md5 == hashlib.md5(DATA).hexdigest() and open(path, "rb").read() == DATA
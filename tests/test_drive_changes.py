@@ -0,0 +1,56 @@
+import pytest
+
+from app.drive import drive_client, incremental_listing, list_changed_pdfs, PageTokenExpired
+from bench.fakes import FakeDrive
+
+PDF = b"%PDF-1.4\n%fake\n"
+
+
+@pytest.fixture
+def drive():
+    with FakeDrive({"a.pdf": PDF + b"a", "b.pdf": PDF + b"b"}, folder_id="f", page_size=2) as fake:
+        yield fake, drive_client("", endpoint=fake.endpoint)
+
+
+def _ids(files):
+    return [f["id"] for f in files]
+
+
+def test_first_run_lists_folder_and_returns_token(drive):
+    fake, client = drive
+    files, token = incremental_listing(client, "f", None)
+    assert _ids(files) == ["load00000", "load00001"]
+    assert list_changed_pdfs(client, "f", token) == ([], token)
+
+
+def test_incremental_pickup_filters_and_pages(drive):
+    fake, client = drive
+    _, token = incremental_listing(client, "f", None)
+    new = fake.upload("c.pdf", PDF + b"c")
+    fake.upload("elsewhere.pdf", PDF + b"x", folder="other")
+    fake.upload("notes.txt", b"text", mime="text/plain")
+    fake.modify("load00000", PDF + b"a2")
+    gone = fake.upload("d.pdf", PDF + b"d")
+    fake.trash(gone)
+    fake.modify("load00001", PDF + b"b2")
+    fake.trash("load00001")
+
+    files, token2 = incremental_listing(client, "f", token)   # 8 changes over 4 pages of 2
+    assert _ids(files) == [new, "load00000"]
+    assert {f["md5Checksum"] for f in files} == {fake.files[new]["md5Checksum"], fake.files["load00000"]["md5Checksum"]}
+    assert fake.files["load00000"]["version"] == "2"
+    assert list_changed_pdfs(client, "f", token2)[0] == []
+
+
+def test_expired_token_falls_back_to_full_listing(drive):
+    fake, client = drive
+    _, token = incremental_listing(client, "f", None)
+    new = fake.upload("c.pdf", PDF + b"c")
+    fake.expire_tokens()
+    with pytest.raises(PageTokenExpired):
+        list_changed_pdfs(client, "f", token)
+
+    files, token2 = incremental_listing(client, "f", token)
+    assert _ids(files) == ["load00000", "load00001", new]
+    fake.upload("e.pdf", PDF + b"e")
+    assert len(list_changed_pdfs(client, "f", token2)[0]) == 1
@@ -0,0 +1,62 @@
+import io
+import random
+
+import fitz
+from PIL import Image, ImageDraw
+
+from app.document import DocumentSession
+from app.extract import extract_charts
+
+SLOTS = [fitz.Rect(72, 200, 300, 350), fitz.Rect(320, 200, 548, 350), fitz.Rect(72, 420, 300, 570)]
+
+
+def _chart(seed: int, fmt: str = "png") -> bytes:
+    rng = random.Random(seed)
+    img = Image.new("RGB", (600, 400), "white")
+    d = ImageDraw.Draw(img)
+    for i in range(6):
+        h = rng.randint(60, 360)
+        d.rectangle([40 + i * 90, 400 - h, 100 + i * 90, 398], fill=tuple(rng.randint(30, 220) for _ in range(3)))
+    buf = io.BytesIO()
+    img.save(buf, format=fmt)
+    return buf.getvalue()
+
+
+def _pdf(path) -> None:
+    """40 pages: one picture embedded once and drawn on pages 2 and 30, a re-encoded (JPEG) copy
+    of another on pages 10 and 33, and a unique chart on most pages (2 and 30 included)."""
+    doc = fitz.open()
+    shared_xref = None
+    for pno in range(40):
+        page = doc.new_page()
+        slots = iter(SLOTS)
+        if pno in (2, 30):
+            r = next(slots)
+            shared_xref = page.insert_image(r, stream=_chart(1000), xref=shared_xref or 0)
+            page.insert_text((r.x0, r.y1 + 12), "Figure: shared", fontsize=8)
+        if pno in (10, 33):
+            r = next(slots)
+            page.insert_image(r, stream=_chart(2000, "png" if pno == 10 else "jpeg"))
+            page.insert_text((r.x0, r.y1 + 12), "Figure: re-encoded", fontsize=8)
+        if pno % 5 or pno == 30:
+            r = next(slots)
+            page.insert_image(r, stream=_chart(pno))
+            page.insert_text((r.x0, r.y1 + 12), f"Figure {pno}", fontsize=8)
+    doc.save(path)
+
+
+def _charts(pdf, out, **kw):
+    with DocumentSession(str(pdf)) as session:
+        found = extract_charts(session, str(out), **kw)
+    return [(c.id, c.page, c.bbox) for c in found], sorted(p.name for p in out.iterdir())
+
+
+def test_sharded_chart_ids_match_serial(tmp_path):
+    pdf = tmp_path / "shared.pdf"
+    _pdf(pdf)
+    serial, serial_files = _charts(pdf, tmp_path / "serial")
+    sharded, sharded_files = _charts(pdf, tmp_path / "sharded", processes=2, shard_pages=8)
+    assert serial == sharded
+    assert serial_files == sharded_files == sorted(f"{cid}.webp" for cid, _, _ in serial)
+    ids = [cid for cid, _, _ in serial]
+    assert "chart-2-0" in ids and "chart-30-0" in ids and "chart-30-1" not in ids
@@ -0,0 +1,66 @@
+import json
+import sqlite3
+from pathlib import Path
+
+import pytest
+from typer.testing import CliRunner
+
+from app.cli import app
+from bench.corpus import build
+from bench.fakes import FakeDrive, _completion
+
+
+@pytest.fixture
+def batched(workdir, monkeypatch):
+    """A work dir after `ingest --batch` against a fake Drive, plus canned Batch API results for it."""
+    tmp_path = workdir
+    pdf = tmp_path / "images.pdf"
+    build("images", 3, pdf)
+    with FakeDrive({"images.pdf": pdf.read_bytes()}) as drive:
+        monkeypatch.setenv("DRIVE_API_ENDPOINT", drive.endpoint)
+        monkeypatch.setenv("GOOGLE_SERVICE_ACCOUNT_JSON", "unused")
+        monkeypatch.setenv("GDRIVE_FOLDER_ID", "load")
+        monkeypatch.setenv("OPENAI_API_KEY", "unused")
+        res = CliRunner().invoke(app, ["ingest", "--batch", "--no-response-cache", "--workers", "1"])
+        assert res.exit_code == 0, res.output
+    # From here on there is no Drive and no credentials.
+    monkeypatch.setenv("DRIVE_API_ENDPOINT", "http://127.0.0.1:9/drive/v3/")
+    for k in ("GOOGLE_SERVICE_ACCOUNT_JSON", "GDRIVE_FOLDER_ID", "OPENAI_API_KEY"):
+        monkeypatch.delenv(k)
+
+    results = tmp_path / "results.jsonl"
+    with results.open("w") as out:
+        for path in sorted((tmp_path / "batch").glob("requests-*.jsonl")):
+            for line in path.read_text().splitlines():
+                req = json.loads(line)
+                content, _ = _completion(req["body"])
+                out.write(json.dumps({"custom_id": req["custom_id"], "error": None, "response": {
+                    "status_code": 200, "body": {"choices": [{"message": {"content": content}}], "usage": {}}}}) + "\n")
+    assert results.stat().st_size
+    return tmp_path, results
+
+
+def _processed(tmp_path: Path) -> int:
+    with sqlite3.connect(tmp_path / "state.sqlite") as conn:
+        return conn.execute("SELECT COUNT(*) FROM processed").fetchone()[0]
+
+
+def test_import_batch_finishes_reports_offline(batched):
+    tmp_path, results = batched
+    assert _processed(tmp_path) == 0
+    res = CliRunner().invoke(app, ["import-batch", str(results), "--workers", "1"])
+    assert res.exit_code == 0, res.output
+    assert _processed(tmp_path) == 1
+    assert list((tmp_path / "out").glob("*.html"))
+
+
+def test_import_batch_leaves_uncached_pdfs_for_ingest(batched):
+    tmp_path, results = batched
+    for p in (tmp_path / "cache").glob("*.pdf"):
+        p.unlink()
+    res = CliRunner().invoke(app, ["import-batch", str(results), "--workers", "1"])
+    assert res.exit_code == 0, res.output
+    assert "run `ingest`" in " ".join(res.output.split())
+    assert _processed(tmp_path) == 0
+    with sqlite3.connect(tmp_path / "state.sqlite") as conn:
+        assert conn.execute("SELECT status FROM stages WHERE stage='analysis'").fetchone()[0] == "done"
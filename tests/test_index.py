@@ -0,0 +1,44 @@
+import json
+import sqlite3
+
+from typer.testing import CliRunner
+
+from app.cli import app
+
+
+def _run(*args):
+    res = CliRunner().invoke(app, list(args))
+    assert res.exit_code == 0, res.output
+    return res
+
+
+def _cards(out):
+    (shard,) = (out / "index").glob("shard-*.json")
+    return {e["id"]: e["f"] for e in json.loads(shard.read_text())}
+
+
+def test_index_cards_have_their_own_thumbnails(services, workdir, chart_pdf):
+    drive, _ = services
+    ids = [drive.upload(f"report-{i}.pdf", chart_pdf(seed=i)) for i in range(2)]
+    _run("ingest", "--no-response-cache", "--workers", "2")
+    out = workdir / "out"
+    cards = _cards(out)
+    assert [cards[fid] for fid in ids] == [f"index/thumbs/{fid}/chart-0-0.webp" for fid in ids]
+    a, b = ((out / cards[fid]).read_bytes() for fid in ids)
+    assert a != b
+
+
+def test_rebuild_replaces_a_thumbnail_made_from_a_shared_crop(services, workdir, chart_pdf):
+    drive, _ = services
+    fid = drive.upload("report.pdf", chart_pdf(seed=1))
+    _run("ingest", "--no-response-cache", "--workers", "1")
+    out = workdir / "out"
+    with sqlite3.connect(workdir / "state.sqlite") as conn:
+        payload = json.loads(conn.execute("SELECT payload FROM reports WHERE file_id=?", (fid,)).fetchone()[0])
+        payload["data"].update(_figure_gallery=["slices/chart-0-0.webp"], _figure_top="slices/chart-0-0.webp")
+        conn.execute("UPDATE reports SET payload=? WHERE file_id=?", (json.dumps(payload), fid))
+
+    _run("build-index")
+    figure = payload["data"]["_figure_image"].rsplit("/", 1)[-1].rsplit(".", 1)[0]
+    assert _cards(out)[fid] == f"index/thumbs/{fid}/{figure}.webp"
+    assert [p.name for p in (out / "index" / "thumbs" / fid).iterdir()] == [f"{figure}.webp"]
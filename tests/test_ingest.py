@@ -0,0 +1,107 @@
+import re
+import sqlite3
+
+from typer.testing import CliRunner
+
+from app.cli import app
+
+
+def _ingest(*args):
+    res = CliRunner().invoke(app, ["ingest", "--no-response-cache", *args])
+    assert res.exit_code == 0, res.output
+    return res
+
+
+def _html(out, fid) -> str:
+    (page,) = out.glob(f"{fid}_*.html")
+    return page.read_text()
+
+
+def test_concurrent_reports_keep_their_assets_apart(services, workdir, chart_pdf):
+    drive, _ = services
+    ids = [drive.upload(f"report-{i}.pdf", chart_pdf(seed=i)) for i in range(2)]
+    _ingest("--workers", "2")
+
+    out = workdir / "out"
+    for fid in ids:
+        assert sorted(p.name for p in (out / "thumbs" / fid).iterdir()) == ["chart-0-0.webp", "chart-1-0.webp"]
+        srcs = re.findall(r'src="(slices/[^"]+)"', _html(out, fid))
+        assert srcs and all(s.startswith(f"slices/{fid}/") for s in srcs)
+        assert all((out / s).exists() for s in srcs)
+    a, b = (out / "thumbs" / fid / "chart-0-0.webp" for fid in ids)
+    assert a.read_bytes() != b.read_bytes()
+    a, b = (out / "slices" / fid / "chart-0-0.webp" for fid in ids)
+    assert a.read_bytes() != b.read_bytes()
+
+
+def test_failure_is_recorded_against_the_stage_that_raised(services, workdir, chart_pdf, monkeypatch):
+    import app.pipeline as pipeline
+
+    def broken(*args, **kwargs):
+        raise RuntimeError("template exploded")
+
+    monkeypatch.setattr(pipeline, "rank_reports", lambda reports, **kw: {})   # ranking fails: no "ranks" checkpoint
+    monkeypatch.setattr(pipeline, "render_payload", broken)
+    drive, _ = services
+    fid = drive.upload("report.pdf", chart_pdf(seed=1))
+    res = CliRunner().invoke(app, ["ingest", "--no-response-cache", "--workers", "1"])
+    assert "template exploded" in res.output
+
+    with sqlite3.connect(workdir / "state.sqlite") as conn:
+        rows = dict(conn.execute("SELECT stage, status FROM stages WHERE file_id=?", (fid,)).fetchall())
+    assert rows["render"] == "failed"
+    assert "ranks" not in rows
+
+
+def test_resume_reuses_checkpoints_but_not_another_reports_assets(services, workdir, chart_pdf, monkeypatch):
+    import app.pipeline as pipeline
+
+    real, broken = pipeline.render_payload, {"on": True}
+
+    def render(*args, **kwargs):
+        if broken["on"]:
+            raise RuntimeError("template exploded")
+        return real(*args, **kwargs)
+
+    monkeypatch.setattr(pipeline, "render_payload", render)
+    drive, ai = services
+    a, b = (drive.upload(f"report-{i}.pdf", chart_pdf(seed=i)) for i in range(2))
+    CliRunner().invoke(app, ["ingest", "--no-response-cache", "--workers", "1"])
+    calls = ai.calls
+
+    db = workdir / "state.sqlite"
+    with sqlite3.connect(db) as conn:
+        stages = lambda fid: dict(conn.execute("SELECT stage, status FROM stages WHERE file_id=?", (fid,)).fetchall())
+        assert stages(a)["crops"] == "done" and stages(a)["render"] == "failed"
+        # A checkpoint that points at files of another report (as shared asset names once allowed).
+        conn.execute("UPDATE stages SET output=(SELECT output FROM stages WHERE file_id=? AND stage='crops') "
+                     "WHERE file_id=? AND stage='crops'", (b, a))
+
+    broken["on"] = False
+    res = _ingest("--workers", "1")
+    out = " ".join(res.output.split())
+    assert "report-0.pdf: resuming at crops" in out and "report-1.pdf: resuming at render" in out
+    assert ai.calls == calls   # analysis and ranking came from the checkpoints
+    for fid in (a, b):
+        srcs = re.findall(r'src="(slices/[^"]+)"', _html(workdir / "out", fid))
+        assert srcs and all(s.startswith(f"slices/{fid}/") for s in srcs)
+
+
+def test_unchanged_files_are_skipped_from_listing_metadata_without_downloading(services, workdir, chart_pdf):
+    drive, ai = services
+    fid = drive.upload("report.pdf", chart_pdf(seed=1))
+    _ingest("--no-incremental")
+    cache = workdir / "cache"
+    for p in cache.glob("*.pdf"):
+        p.unlink()
+    calls = ai.calls
+
+    res = _ingest("--no-incremental")
+    assert "already processed, skipping" in res.output
+    assert not list(cache.glob("*.pdf")) and ai.calls == calls
+
+    drive.modify(fid, chart_pdf(seed=2))   # an edit is a new revision: fetched again, under its own md5
+    _ingest("--no-incremental")
+    (cached,) = cache.glob("*.pdf")
+    assert cached.name == f"{fid}.{drive.metas[0]['md5Checksum']}.pdf"
+    assert ai.calls > calls
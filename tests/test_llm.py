@@ -0,0 +1,64 @@
+import asyncio
+import time
+
+import pytest
+
+from app.llm import LLMClient
+from bench.fakes import FakeOpenAI, Faults
+
+MSG = {"model": "fake", "messages": [{"role": "user", "content": "hello"}]}
+
+
+class RateLimitFirst(Faults):
+    """Answers the first `n` requests with 429 and Retry-After: 1 (see _Handler._fault)."""
+
+    def __init__(self, n: int):
+        super().__init__()
+        self.n = n
+
+    def decide(self):
+        with self._lock:
+            self.stats["requests"] += 1
+            if self.stats["requests"] > self.n:
+                return None
+            self.stats["429"] += 1
+        return 429
+
+
+@pytest.fixture
+def ai():
+    with FakeOpenAI() as server:
+        yield server
+
+
+def _client(ai, **kw) -> LLMClient:
+    return LLMClient("fake", base_url=ai.base_url, backoff_base=0.0, **kw)
+
+
+def test_achat_works_from_separate_event_loops_and_shares_the_buckets(ai):
+    client = _client(ai, rpm=600, max_in_flight=1)
+    reserved = []
+    reserve = client.limiter.reserve
+    client.limiter.reserve = lambda tokens: reserved.append(tokens) or reserve(tokens)
+
+    async def two():
+        return await asyncio.gather(client.achat(**MSG), client.achat(**MSG))
+
+    for _ in range(2):   # a second asyncio.run used to fail on the first loop's semaphore/pool
+        assert all(r.choices[0].message.content for r in asyncio.run(two()))
+    client.chat(**MSG)
+    assert len(reserved) == 5 and ai.calls == 5    # sync and async calls draw from one RPM/TPM bucket
+
+
+@pytest.mark.parametrize("use_async", [False, True])
+def test_429_backoff_honours_retry_after(use_async):
+    with FakeOpenAI(RateLimitFirst(1)) as ai:
+        client = _client(ai, max_retries=2)
+        t0 = time.monotonic()
+        resp = asyncio.run(client.achat(**MSG)) if use_async else client.chat(**MSG)
+        waited = time.monotonic() - t0
+    assert resp.choices[0].message.content
+    assert ai.faults.stats["429"] == 1 and ai.calls == 1
+    assert 1.0 <= waited < 5.0    # full-jitter backoff alone would be ~0s with backoff_base=0
+    assert client.limiter._paused_until > 0    # the whole bucket waited, not just this caller
+
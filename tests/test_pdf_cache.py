@@ -0,0 +1,57 @@
+import os
+
+import pytest
+
+from app.pdf_cache import PdfCache
+from app.state import State
+
+MD5 = "0123456789abcdef0123456789abcdef"
+
+
+@pytest.fixture
+def cache(tmp_path):
+    state = State(str(tmp_path / "state.sqlite"))
+    pc = PdfCache(state, str(tmp_path / "cache"), max_bytes=3000)
+    pc.cache_dir.mkdir()
+    yield pc
+    state.close()
+
+
+def _add(pc, name, at, size=1000):
+    p = pc.cache_dir / f"{name}.{MD5}.pdf"
+    p.write_bytes(b"x" * size)
+    pc.state.cache_touch(pc._key(str(p)), name, MD5, size, at=at)
+    return str(p)
+
+
+def test_evicts_least_recently_used_until_within_budget(cache):
+    a, b, c, d = (_add(cache, n, at) for n, at in (("a", 100), ("b", 300), ("c", 200), ("d", 400)))
+    assert cache.evict() == [cache._key(a)]
+    assert not os.path.exists(a) and all(os.path.exists(p) for p in (b, c, d))
+    cache.touch(c, "c", MD5)                  # a use makes it the most recently used
+    assert cache.evict(1000) == [cache._key(b), cache._key(d)]
+    assert cache.stats() == {"files": 1, "bytes": 1000, "pinned": 0}
+
+
+def test_pinned_files_are_never_evicted(cache):
+    a, b = _add(cache, "a", 100), _add(cache, "b", 200)
+    cache.pin(a)
+    assert cache.evict(0) == [cache._key(b)]
+    assert os.path.exists(a)
+    cache.unpin(a)
+    assert cache.evict(0) == [cache._key(a)]
+
+
+def test_pins_of_another_live_process_count_and_dead_ones_do_not(cache):
+    a, b = _add(cache, "a", 100), _add(cache, "b", 200)
+    host = cache.owner.rpartition(":")[0]
+    cache.state.cache_pin(cache._key(a), f"{host}:{os.getppid()}")     # e.g. a concurrent ingest
+    cache.state.cache_pin(cache._key(b), f"{host}:999999999")          # a crashed one
+    assert cache.evict(0) == [cache._key(b)]
+    assert cache.state.cache_pins() and all(o.endswith(f":{os.getppid()}") for _, o, _ in cache.state.cache_pins())
+
+
+def test_scan_adopts_untracked_pdfs(cache):
+    (cache.cache_dir / f"x.{MD5}.pdf").write_bytes(b"x" * 10)
+    assert cache.scan() == 1 and cache.scan() == 0
+    assert cache.state.cache_entries()[0][1:4] == ("x", MD5, 10)
@@ -0,0 +1,58 @@
+import json
+import re
+import sqlite3
+
+from typer.testing import CliRunner
+
+from app.cli import app
+
+
+def _run(*args):
+    res = CliRunner().invoke(app, list(args))
+    assert res.exit_code == 0, res.output
+    return res
+
+
+def _pages(out):
+    return {p.name: p.read_text() for p in out.glob("*.html") if p.name != "index.html"}
+
+
+def test_render_all_matches_ingest_and_keeps_reports_apart(services, workdir, chart_pdf):
+    drive, ai = services
+    a, b = (drive.upload(f"report-{i}.pdf", chart_pdf(seed=i)) for i in range(2))
+    _run("ingest", "--no-response-cache", "--workers", "2")
+    out = workdir / "out"
+    ingested = _pages(out)
+    assert len(ingested) == 2
+    for p in out.glob("*.html"):
+        p.unlink()
+
+    calls = ai.calls
+    res = _run("render-all", "--workers", "1")
+    assert "2 report(s) to render" in res.output
+    assert _pages(out) == ingested
+    assert ai.calls == calls
+
+    # Both reports have a "chart-0-0"; each page shows its own crop.
+    for fid in (a, b):
+        (html,) = [h for name, h in ingested.items() if name.startswith(f"{fid}_")]
+        srcs = re.findall(r'src="(slices/[^"]+)"', html)
+        assert f"slices/{fid}/chart-0-0.webp" in srcs
+        assert all(s.startswith(f"slices/{fid}/") for s in srcs)
+
+
+def test_render_all_drops_crops_stored_under_shared_names(services, workdir, chart_pdf):
+    drive, _ = services
+    fid = drive.upload("report.pdf", chart_pdf(seed=1))
+    _run("ingest", "--no-response-cache", "--workers", "1")
+    db = workdir / "state.sqlite"
+    with sqlite3.connect(db) as conn:
+        payload = json.loads(conn.execute("SELECT payload FROM reports WHERE file_id=?", (fid,)).fetchone()[0])
+        legacy = [p.replace(f"slices/{fid}/", "slices/") for p in payload["data"]["_figure_gallery"]]
+        payload["data"].update(_figure_gallery=legacy, _figure_top=legacy[0])
+        conn.execute("UPDATE reports SET payload=? WHERE file_id=?", (json.dumps(payload), fid))
+
+    _run("render-all", "--force", "--workers", "1")
+    (html,) = _pages(workdir / "out").values()
+    assert not re.findall(r'src="slices/', html)
+    assert f'src="{payload["data"]["_figure_image"]}"' in html
@@ -0,0 +1,56 @@
+import json
+import os
+import time
+
+from app.response_cache import ResponseCache, request_key
+
+KEY = request_key("analyze", "fake", 0.2, [{"role": "user", "content": "hello"}])
+
+
+def _age(cache, key, created_s_ago):
+    """Backdate an entry's write time while leaving its mtime (last use) current."""
+    p = cache._path(key)
+    entry = json.loads(p.read_text())
+    entry["created"] = int(time.time() - created_s_ago)
+    p.write_text(json.dumps(entry))
+
+
+def test_hit_returns_content_and_refreshes_last_use(tmp_path):
+    cache = ResponseCache(str(tmp_path), max_age_s=3600)
+    assert cache.get(KEY) is None
+    cache.put(KEY, '{"tldr": "x"}', kind="analyze", model="fake")
+    p = cache._path(KEY)
+    os.utime(p, (0, 0))
+    assert cache.get(KEY) == '{"tldr": "x"}'
+    assert time.time() - p.stat().st_mtime < 60
+    assert request_key("analyze", "fake", 0.3, [{"role": "user", "content": "hello"}]) != KEY
+
+
+def test_entries_expire_by_write_time_even_when_hit(tmp_path):
+    cache = ResponseCache(str(tmp_path), max_age_s=3600)
+    cache.put(KEY, "old", kind="analyze")
+    _age(cache, KEY, 7200)
+    assert cache.get(KEY) is None            # recently used (mtime is now) but written too long ago
+    assert not cache._path(KEY).exists()
+
+    cache.put(KEY, "fresh")
+    _age(cache, KEY, 600)
+    assert cache.get(KEY) == "fresh"
+
+
+def test_prune_drops_expired_then_least_recently_used(tmp_path):
+    cache = ResponseCache(str(tmp_path), max_bytes=0, max_age_s=3600)
+    keys = [request_key("rank", "fake", 0.0, [{"role": "user", "content": str(i)}]) for i in range(4)]
+    for i, k in enumerate(keys):
+        cache.put(k, "x" * 1000)
+        os.utime(cache._path(k), (time.time() - 100 + i, time.time() - 100 + i))
+    _age(cache, keys[3], 7200)               # newest by use, but expired by write time
+    assert cache.prune() == 1
+    assert [cache._path(k).exists() for k in keys] == [True, True, True, False]
+
+    size = cache._path(keys[0]).stat().st_size
+    cache.max_bytes = size * 2
+    cache.get(keys[0])                       # a hit makes the oldest one the most recently used
+    assert cache.prune() == 1
+    assert [cache._path(k).exists() for k in keys[:3]] == [True, False, True]
+    assert cache.stats() == {"entries": 2, "bytes": size * 2}
@@ -0,0 +1,40 @@
+import fitz
+
+from app.text import budgeted_text, estimate_tokens
+
+WORDS = ("revenue margin pricing volume demand supply capacity freight lithium copper steel cement "
+         "retail wholesale export import tariff subsidy battery solar grid storage fleet charging").split()
+
+
+def _pdf(tmp_path, pages: int) -> str:
+    doc = fitz.open()
+    cover = doc.new_page()
+    cover.insert_text((72, 100), "Global Widgets Outlook 2026", fontsize=20)
+    cover.insert_text((72, 140), "Full report at https://example.com/widgets.", fontsize=10)
+    for pno in range(1, pages):
+        page = doc.new_page()
+        page.insert_text((72, 40), "Confidential - Acme Research", fontsize=8)
+        page.insert_text((72, 800), f"Page {pno + 1} of {pages}", fontsize=8)
+        y = 100
+        for n in range(20):
+            w = [WORDS[(pno * 7 + n * 3 + k) % len(WORDS)] for k in range(8)]
+            page.insert_text((40, y), f"{' '.join(w)} rose {pno}.{n}% to ${n}{pno} million.", fontsize=7)
+            y += 12
+    path = str(tmp_path / f"report-{pages}.pdf")
+    doc.save(path)
+    doc.close()
+    return path
+
+
+def test_budgeted_text_fits_the_budget_and_drops_running_boilerplate(tmp_path):
+    text = budgeted_text(_pdf(tmp_path, 12), token_budget=1500)
+    assert estimate_tokens(text) <= 1500
+    assert "Global Widgets Outlook 2026" in text.split("\n\n")[0]   # the cover's title block leads
+    assert "Confidential" not in text and "of 12" not in text
+    assert text.rstrip().endswith("https://example.com/widgets")
+    assert 0 < text.count("[Page ") < 11
+
+
+def test_budgeted_text_keeps_every_page_when_it_fits(tmp_path):
+    text = budgeted_text(_pdf(tmp_path, 4), token_budget=100_000)
+    assert [f"[Page {n}]" in text for n in range(2, 5)] == [True] * 3
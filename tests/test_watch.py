@@ -0,0 +1,74 @@
+import threading
+
+import pytest
+
+from app.config import load_settings
+from app.drive import drive_client
+from app.pipeline import StageWorkers
+from app.state import State
+from app.watch import Watcher
+from bench.fakes import FakeDrive
+
+PDF = b"%PDF-1.4\n%fake\n"
+
+
+@pytest.fixture
+def watcher(workdir):
+    docs = {f"{c}.pdf": PDF + c.encode() for c in "abcde"}
+    with FakeDrive(docs, folder_id="f") as fake:
+        s = load_settings(require_credentials=False)
+        state = State(s.state_db)
+        calls = []
+
+        def factory():
+            calls.append(1)
+            return drive_client("", endpoint=fake.endpoint)
+
+        w = Watcher(s, state, factory(), "f", None, factory, StageWorkers.uniform(2), interval=1, batch=2,
+                    queue_max=3, max_attempts=3, retry_s=1)
+        calls.clear()
+        yield fake, w, calls
+        state.close()
+
+
+def test_poll_caps_enqueue_and_keeps_token_for_leftovers(watcher):
+    fake, w, _ = watcher
+    assert w.poll() == 3
+    assert w.state.job_counts()["queued"] == 3
+    assert w.state.get_page_token("f") is None        # two listed files did not fit
+    assert w.poll() == 0                               # queue full: Drive is not listed
+
+    first = {f["id"] for f in w.state.job_claim(3)}
+    new = fake.upload("f.pdf", PDF + b"f")
+    assert w.poll() == 3                               # relisted; the running three are not queued again
+    queued = {f["id"] for f in w.state.job_claim(3)}
+    assert len(first | queued) == 6 and new in queued
+    assert w.state.get_page_token("f") is not None     # everything fitted this time
+
+    fake.upload("g.pdf", PDF + b"g")
+    assert w.poll() == 1                               # incremental from the stored token
+
+
+def test_cycles_share_one_download_manager_and_its_clients(watcher, workdir):
+    fake, w, calls = watcher
+    p1, p2 = w.pipeline(1), w.pipeline(1)
+    assert p1.downloads is p2.downloads is w.downloads
+    assert p1.llm_client is p2.llm_client
+
+    metas = fake.metas
+    for m in metas[:3]:   # one fresh thread per "cycle", like a new pipeline's stage threads
+        t = threading.Thread(target=w.downloads.fetch, args=(m,))
+        t.start(); t.join()
+    assert len(calls) == 1
+    assert len(list((workdir / "cache").glob("*.pdf"))) == 3
+
+
+def test_work_marks_files_skipped_as_processed_done(watcher):
+    fake, w, _ = watcher
+    meta = dict(fake.metas[0])
+    w.state.record(meta["id"], meta.pop("md5Checksum"), None)   # listed without a checksum, already processed
+    w.state.job_enqueue([meta])
+
+    assert w.work()
+    assert w.processed == 1 and w.failed == 0
+    assert w.state.job_counts() == {"queued": 0, "running": 0, "failed": 0}